@@ -0,0 +1,75 @@
+"""Concurrent follow-up drafting for many leads at once.
+
+The lead card drafts one follow-up at a time: relevance check, sentiment
+check and the draft itself, three sequential LLM calls per click. For a rep
+with dozens of "Follow Up Required" leads, ``draft_all`` runs that whole
+per-lead pipeline for every selected lead on a bounded thread pool, so the
+wall time is close to one lead's latency rather than N times it (the
+process-wide LLM scheduler still enforces rate limits and priorities).
+
+``draft_fn`` must not touch Streamlit (no ``st.spinner``/``st.error``): it
+runs on worker threads without a script context. It returns
+``{"subject", "body"}`` or raises ``SkipDraft`` for leads that should not
+get a draft, e.g. notes the relevance check rejects. Results come back in
+input order, ready for the review queue.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+DEFAULT_MAX_WORKERS = int(os.getenv("BULK_DRAFT_WORKERS", "8"))
+
+READY = "ready"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+class SkipDraft(Exception):
+    """The lead is not eligible for an AI draft; the message is shown to the rep."""
+
+
+@dataclass
+class DraftResult:
+    request_id: str
+    status: str
+    subject: Optional[str] = None
+    body: Optional[str] = None
+    reason: Optional[str] = None
+    seconds: float = 0.0
+
+
+def _draft_one(row, draft_fn) -> DraftResult:
+    started = time.perf_counter()
+    request_id = row["request_id"]
+    try:
+        draft = draft_fn(row)
+        if not draft or not draft.get("subject") or not draft.get("body"):
+            raise ValueError("empty draft")
+        return DraftResult(request_id, READY, draft["subject"], draft["body"],
+                           seconds=time.perf_counter() - started)
+    except SkipDraft as e:
+        return DraftResult(request_id, SKIPPED, reason=str(e), seconds=time.perf_counter() - started)
+    except Exception as e:
+        logging.error(f"Bulk follow-up draft failed for {request_id}: {e}", exc_info=True)
+        return DraftResult(request_id, FAILED, reason=str(e), seconds=time.perf_counter() - started)
+
+
+def draft_all(rows, draft_fn, max_workers=DEFAULT_MAX_WORKERS) -> list:
+    """Draft every row concurrently (at most ``max_workers`` at a time); one ``DraftResult`` per row, in order."""
+    rows = list(rows)
+    if not rows:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(rows))), thread_name_prefix="bulk-draft") as pool:
+        return list(pool.map(lambda row: _draft_one(row, draft_fn), rows))
+
+
+def summarize(results) -> str:
+    counts = {status: sum(1 for r in results if r.status == status) for status in (READY, SKIPPED, FAILED)}
+    slowest = max((r.seconds for r in results), default=0.0)
+    return (
+        f"{counts[READY]} drafted, {counts[SKIPPED]} skipped, {counts[FAILED]} failed "
+        f"(slowest lead {slowest:.1f}s)"
+    )
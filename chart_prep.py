@@ -0,0 +1,150 @@
+"""Downsampling and caching for analytics chart payloads.
+
+The analytics service returns raw chart data: a multi-year daily trend is
+thousands of ``x`` points per series, and a breakdown can have hundreds of
+bar labels. Both used to go straight into ``st.line_chart``/``st.bar_chart``
+and were re-serialised to the browser on every rerun.
+
+* Line series are reduced with Largest-Triangle-Three-Buckets (LTTB), which
+  keeps peaks, troughs and the first/last point, to ``CHART_MAX_POINTS`` (a
+  chart is only ever a few hundred pixels wide). With several series each
+  gets an equal share of the budget and the union of the chosen points is
+  kept, so the series stay aligned on one index.
+* Bars beyond ``CHART_MAX_BARS`` are folded into a single "Other" bar after
+  the largest ones.
+* Prepared frames are kept in a process-wide LRU keyed by a hash of the
+  payload, so reruns and other sessions showing the same answer skip the work.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "800"))
+MAX_BARS = int(os.getenv("CHART_MAX_BARS", "25"))
+CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "64"))
+
+
+def lttb_indices(x, y, threshold):
+    """Indices of the ``threshold`` points LTTB keeps from ``x``/``y`` (both sorted by ``x``)."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)  # buckets between the fixed endpoints
+    chosen = np.empty(threshold, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        chosen[i + 1] = a
+    return chosen
+
+
+def prepare_line(x, series, max_points=MAX_POINTS) -> pd.DataFrame:
+    """Line-chart frame (datetime index where ``x`` parses) with at most about ``max_points`` rows."""
+    index = pd.to_datetime(pd.Series(list(x)), errors="coerce")
+    columns = {name: pd.to_numeric(pd.Series(list(values)[:len(index)]), errors="coerce") for name, values in series.items()}
+    frame = pd.DataFrame(columns)
+    frame = frame.reindex(range(len(index)))
+    if index.notna().any():
+        keep = index.notna().to_numpy()
+        frame, index = frame[keep], index[keep]
+        order = np.argsort(index.to_numpy(), kind="stable")
+        frame, index = frame.iloc[order], index.iloc[order]
+        position = index.astype("int64").to_numpy()
+    else:
+        index = pd.Series(list(x))
+        position = np.arange(len(index))
+    frame.index = pd.Index(index.to_numpy())
+    if len(frame) > max_points and len(frame.columns):
+        per_series = max(3, max_points // len(frame.columns))
+        keep = np.unique(np.concatenate([
+            lttb_indices(position, frame[name].to_numpy(), per_series) for name in frame.columns
+        ]))
+        frame = frame.iloc[keep]
+    return frame
+
+
+def prepare_bars(labels, values, max_bars=MAX_BARS, other_label="Other") -> pd.DataFrame:
+    """Bar-chart frame (``Label`` index, ``Count`` column); the tail beyond ``max_bars`` becomes one bar."""
+    frame = pd.DataFrame({"Label": [str(label) for label in labels], "Count": pd.to_numeric(pd.Series(list(values)), errors="coerce").fillna(0)})
+    if len(frame) > max_bars:
+        frame = frame.groupby("Label", sort=False, as_index=False)["Count"].sum()
+        frame = frame.sort_values("Count", ascending=False, kind="stable")
+        head, tail = frame.iloc[:max_bars - 1], frame.iloc[max_bars - 1:]
+        if len(tail):
+            other = pd.DataFrame({"Label": [f"{other_label} ({len(tail)})"], "Count": [tail["Count"].sum()]})
+            frame = pd.concat([head, other], ignore_index=True)
+    return frame.set_index("Label")
+
+
+def payload_key(payload, *budget) -> str:
+    raw = json.dumps([payload, budget], sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+class ChartCache:
+    """Small LRU of prepared chart frames keyed by payload hash."""
+
+    def __init__(self, max_items=CACHE_SIZE):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def prepare(self, payload, max_points=MAX_POINTS, max_bars=MAX_BARS):
+        """Frame ready for ``st.bar_chart``/``st.line_chart``, or ``None`` for an empty or unknown payload."""
+        key = payload_key(payload, max_points, max_bars)
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return self._frames[key]
+        frame = self._build(payload, max_points, max_bars)
+        with self._lock:
+            self.misses += 1
+            self._frames[key] = frame
+            while len(self._frames) > self.max_items:
+                self._frames.popitem(last=False)
+        return frame
+
+    @staticmethod
+    def _build(payload, max_points, max_bars):
+        kind = payload.get("kind")
+        if kind == "bar":
+            labels, values = payload.get("labels") or [], payload.get("values") or []
+            if not labels or len(labels) != len(values):
+                return None
+            return prepare_bars(labels, values, max_bars)
+        if kind == "line":
+            x, series = payload.get("x") or [], payload.get("series") or {}
+            if not x or not series:
+                return None
+            return prepare_line(x, series, max_points)
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"frames": len(self._frames), "hits": self.hits, "misses": self.misses}
+
+
+_cache = ChartCache()
+
+
+def get_cache() -> ChartCache:
+    """Process-wide prepared-frame cache shared by all sessions."""
+    return _cache
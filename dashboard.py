@@ -9,7 +9,30 @@ import requests # For making API calls to the new agent service
 from datetime import datetime, date, timedelta, timezone
 import json
 import logging
-import sys
+
+import bulk_drafts
+import chart_prep
+import duplicates
+import freshness
+import interaction_queue
+import interval_cache
+import lead_details
+import lead_export
+import lead_table
+import llm_scheduler
+import logging_setup
+import mail_pipeline
+import partitioned_fetch
+import precompute
+import priority_index
+import service_client
+import session_artifacts
+import shared_cache
+import similar_leads
+import simulator
+import single_flight
+import swr_cache
+import warmup
 
 #helper funciton
 def label_from_numeric(score) -> str:
@@ -19,10 +42,6 @@ def label_from_numeric(score) -> str:
         n = 0
     return "Hot" if n >= 10 else ("Warm" if n >= 5 else "Cold")
 
-# ADDED SendGrid imports (retained for individual email sends from dashboard)
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-
 # ADDED markdown_it for Markdown to HTML conversion
 import markdown_it # Ensure 'markdown-it-py' is in your requirements.txt
 
@@ -41,26 +60,43 @@ def set_expanded_lead(request_id):
     else:
         st.session_state.expanded_lead_id = request_id
 
+def open_lead(request_id):
+    """Open this request_id's card (never closes it, unlike the toggle)."""
+    st.session_state.expanded_lead_id = request_id
+
 # 3. Define the rolling summary function
-@st.cache_data(ttl=30)
+def query_ai_insights_map(request_ids):
+    """One Supabase round-trip for all IDs; raises on failure. rolling_summary is loaded per card (fetch_lead_details)."""
+    resp = (
+        supabase
+        .from_(AI_LEAD_INSIGHTS_TABLE_NAME)
+        .select("request_id, engagement_counters, updated_at, last_engaged_at")
+        .in_("request_id", list(request_ids))
+        .execute()
+    )
+    rows = resp.data or []
+    return {r["request_id"]: r for r in rows}
+
+
 def fetch_ai_insights_map(request_ids):
     """
-    Returns {request_id: {rolling_summary, engagement_counters, updated_at, last_engaged_at}}
+    Returns {request_id: {engagement_counters, updated_at, last_engaged_at}}
     for all IDs in one round-trip.
     """
     if not request_ids:
         return {}
 
     try:
-        resp = (
-            supabase
-            .from_(AI_LEAD_INSIGHTS_TABLE_NAME)
-            .select("request_id, rolling_summary, engagement_counters, updated_at, last_engaged_at")
-            .in_("request_id", list(set(request_ids)))
-            .execute()
+        request_ids = tuple(sorted(set(request_ids)))
+        # Served stale-while-revalidate; a version bump from another replica also triggers a background refresh
+        return swr_cache.get_cache("ai_insights").get(
+            request_ids,
+            lambda: shared_cache.get_cache().get_or_compute(
+                "ai_insights", request_ids, data_cache_ttl("ai_insights"), lambda: query_ai_insights_map(request_ids)
+            ),
+            data_cache_ttl("ai_insights"),
+            version=shared_cache.get_cache().version("ai_insights"),
         )
-        rows = resp.data or []
-        return {r["request_id"]: r for r in rows}
     except Exception as e:
         logging.error(f"Error fetching ai_lead_insights: {e}", exc_info=True)
         return {}
@@ -73,9 +109,18 @@ except ImportError:
     ZoneInfo = None # Fallback or handle differently
 
 load_dotenv()
+# BACKEND_SIMULATOR=1 (or the URL of `python -m simulator`) points every backend below at the local simulator
+simulator.activate()
 
 # --- Logging Setup ---
-logging.basicConfig(stream=sys.stdout, level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+# Queue-backed JSON logging, configured once per process (LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_DEBUG_PER_SECOND)
+logging_setup.configure()
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    _run_ctx = get_script_run_ctx()
+    logging_setup.bind(session_id=_run_ctx.session_id if _run_ctx else None)
+except ImportError:
+    pass
 
 # --- GLOBAL CONFIGURATIONS ---
 supabase_url = os.getenv("SUPABASE_URL")
@@ -96,10 +141,13 @@ if not openai_api_key:
     logging.error("OpenAI API Key not found. Please ensure it is set as an environment variable (e.g., in Render Environment Variables or locally in a .env file).")
     st.error("OpenAI API Key not found. Please ensure it is set as an environment variable (e.g., in Render Environment Variables or locally in a .env file).")
     st.stop()
-openai_client = OpenAI(api_key=openai_api_key)
+# All completions go through the process-wide scheduler (rate limits, priority, 429 retries)
+openai_client = llm_scheduler.GovernedClient(OpenAI(api_key=openai_api_key), llm_scheduler.get_scheduler())
+background_openai_client = openai_client.with_priority(llm_scheduler.BACKGROUND)
 
 # --- Email Configuration (for SendGrid - for individual sends from this dashboard) ---
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+SENDGRID_API_HOST = os.getenv("SENDGRID_API_HOST", "https://api.sendgrid.com")
 email_address = os.getenv("EMAIL_ADDRESS")
 
 ENABLE_EMAIL_SENDING = all([SENDGRID_API_KEY, email_address])
@@ -117,6 +165,59 @@ PERSONALIZED_AD_SERVICE_URL = os.getenv("PERSONALIZED_AD_SERVICE_URL")
 if not PERSONALIZED_AD_SERVICE_URL:
     st.warning("PERSONALIZED_AD_SERVICE_URL is not set. The 'Send Personalized Ad' button will not function.")
 
+# Resilient clients (circuit breaker + adaptive timeouts), shared by all sessions in this process
+agent_service = service_client.get_client("Agent service", AUTOMOTIVE_AGENT_SERVICE_URL) if AUTOMOTIVE_AGENT_SERVICE_URL else None
+ad_service = service_client.get_client("Personalized ad service", PERSONALIZED_AD_SERVICE_URL) if PERSONALIZED_AD_SERVICE_URL else None
+AGENT_SERVICE_CLIENTS = [c for c in (agent_service, ad_service) if c is not None]
+
+# Batch dispatches are idempotent for a window: the same action over the same leads, clicked twice
+# (by two reps, on any replica, or a double click) reaches the agent service once
+DISPATCH_DEDUP_SECONDS = int(os.getenv("DISPATCH_DEDUP_SECONDS", "300"))
+
+class DuplicateDispatch(Exception):
+    """The same batch action was already dispatched within DISPATCH_DEDUP_SECONDS."""
+
+def dispatch_once(action, payload, send):
+    """Return ``send()`` unless ``action`` with this ``payload`` was already dispatched in the window.
+
+    Raises DuplicateDispatch for a repeat. A request that failed outright gives the claim back so it can
+    be retried; a timeout keeps it, since the service may still be working on it.
+    """
+    cache = shared_cache.get_cache()
+    if not cache.claim("dispatch", (action, payload), DISPATCH_DEDUP_SECONDS):
+        raise DuplicateDispatch(f"{action} was already dispatched in the last {DISPATCH_DEDUP_SECONDS // 60} min.")
+    try:
+        return send()
+    except requests.exceptions.Timeout:
+        raise
+    except requests.exceptions.RequestException:
+        cache.release_claim("dispatch", (action, payload))
+        raise
+
+# Analytics answers are shared by every rep asking the same question over the same dates until data changes
+# (a bookings change bumps the "analytics" namespace too). Answers stored by the warm-up live for two warm-up
+# intervals so they are renewed before they expire; answers computed for a rep keep ANALYTICS_CACHE_TTL.
+ANALYTICS_CACHE_TTL = int(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+ANALYTICS_WARM_TTL = max(ANALYTICS_CACHE_TTL, int(2 * warmup.INTERVAL_SECONDS))
+
+def fetch_analytics(question, start_date, end_date, refresh=False):
+    """The agent service's /analyze-query answer (dict), cached per normalized question and dates; raises.
+
+    ``refresh`` asks the service again and replaces the cached answer for ANALYTICS_WARM_TTL (the warm-up's renewal).
+    """
+    question = warmup.normalize_question(question)
+    payload = {"query_text": question, "start_date": start_date.strftime("%Y-%m-%d"), "end_date": end_date.strftime("%Y-%m-%d")}
+
+    def ask():
+        r = agent_service.post("/analyze-query", json=payload, timeout=15, coalesce=True)
+        r.raise_for_status()
+        return r.json()
+    ttl = ANALYTICS_WARM_TTL if refresh else ANALYTICS_CACHE_TTL
+    return shared_cache.get_cache().get_or_compute("analytics", payload, ttl, ask, refresh=refresh)
+
+def warm_analytics(question, start_date, end_date):
+    fetch_analytics(question, start_date, end_date, refresh=True)
+
 BACKEND_API_URL = "https://aoe-agentic-demo.onrender.com" # This might be the old main.py URL, ensure it's still needed or remove
 
 
@@ -171,32 +272,254 @@ ACTION_STATUS_MAP = {
 
 # --- ALL FUNCTION DEFINITIONS ---
 
-@st.cache_data(ttl=30)
-def fetch_bookings_data(location_filter=None, start_date_filter=None, end_date_filter=None):
-    """Fetches all booking data from Supabase, with optional filters."""
+# Default seconds a fetched bookings/insights result stays valid; the freshness controller adapts it per cache
+DATA_CACHE_TTL = 30
+
+def probe_latest(table, column):
+    """Latest value of ``column`` in ``table``: one row read through the column's index, exact, no scan."""
+    resp = supabase.from_(table).select(column).order(column, desc=True).limit(1).execute()
+    return resp.data[0][column] if resp.data else None
+
+# Booking days touched since a bookings marker; past this many rows a change counts as touching every day
+CHANGED_ROWS_LIMIT = 1000
+
+def changed_booking_days(since):
+    """ISO days of bookings updated after ``since``, or None if there are too many to list."""
+    if since is None:
+        return None
+    resp = (
+        supabase.from_(SUPABASE_TABLE_NAME).select("booking_timestamp")
+        .gt("updated_at", since).limit(CHANGED_ROWS_LIMIT + 1).execute()
+    )
+    rows = resp.data or []
+    if len(rows) > CHANGED_ROWS_LIMIT:
+        return None
+    return {str(r["booking_timestamp"])[:10] for r in rows if r.get("booking_timestamp")}
+
+def publish_bookings_change(signature):
+    """Bump bookings (scoped to the changed days) and analytics, once across replicas per change."""
+    cache = shared_cache.get_cache()
+    previous = cache.advance_marker("bookings", signature)
+    if previous is None:
+        return
+    cache.invalidate("bookings", "analytics", changed=changed_booking_days(previous[0]))
+
+def publish_insights_change(signature):
+    if shared_cache.get_cache().advance_marker("ai_insights", signature) is not None:
+        shared_cache.get_cache().invalidate("ai_insights")
+
+# Shared-tier entries keep the expiry they were written with, so a detected change bumps the namespace version.
+# The probes read bookings.updated_at / ai_lead_insights.updated_at, which move on every insert and in-place edit
+# (email events bump lead scores on bookings, so they show up there too); analytics answers are computed from
+# bookings, so they go stale with them.
+freshness_controller = freshness.get_controller()
+freshness_controller.register(
+    "bookings", lambda: (probe_latest(SUPABASE_TABLE_NAME, "updated_at"),), DATA_CACHE_TTL,
+    on_change=publish_bookings_change,
+)
+freshness_controller.register(
+    "ai_insights", lambda: (probe_latest(AI_LEAD_INSIGHTS_TABLE_NAME, "updated_at"),), DATA_CACHE_TTL,
+    on_change=publish_insights_change,
+)
+freshness_controller.start()
+
+def data_cache_ttl(namespace):
+    """Current refresh interval for the ``bookings`` or ``ai_insights`` cache."""
+    return freshness_controller.ttl(namespace, DATA_CACHE_TTL)
+
+def invalidate_data_caches():
+    """Drops cached bookings/insights/analytics here and, via the shared version bump, on every replica."""
+    shared_cache.get_cache().invalidate("bookings", "ai_insights", "analytics")
+    interval_cache.get_cache("bookings").invalidate()
+    swr_cache.get_cache("bookings").invalidate()
+    swr_cache.get_cache("ai_insights").invalidate()
+    lead_details.get_cache().invalidate()
+    st.cache_data.clear()
+
+# Narrow list projection; the large text fields are fetched per lead by fetch_lead_details when a card opens
+BOOKING_COLUMNS = "request_id, full_name, email, vehicle, booking_date, current_vehicle, location, time_frame, action_status, lead_score, numeric_lead_score, booking_timestamp"
+
+def query_lead_details(request_ids):
+    """{request_id: {sales_notes, rolling_summary}} in one query per table; raises on failure."""
+    request_ids = list(request_ids)
+    details = {rid: {"sales_notes": None, "rolling_summary": None} for rid in request_ids}
+    notes = supabase.from_(SUPABASE_TABLE_NAME).select("request_id, sales_notes").in_("request_id", request_ids).execute()
+    for r in notes.data or []:
+        details[r["request_id"]]["sales_notes"] = r.get("sales_notes")
+    summaries = supabase.from_(AI_LEAD_INSIGHTS_TABLE_NAME).select("request_id, rolling_summary").in_("request_id", request_ids).execute()
+    for r in summaries.data or []:
+        details[r["request_id"]]["rolling_summary"] = r.get("rolling_summary")
+    return details
+
+def fetch_lead_details(request_ids):
+    """Cached {request_id: {sales_notes, rolling_summary}}; only ids not cached are queried. None on failure."""
+    if not request_ids:
+        return {}
+    shared = shared_cache.get_cache()
     try:
-        query = supabase.from_(SUPABASE_TABLE_NAME).select(
-            "request_id, full_name, email, vehicle, booking_date, current_vehicle, location, time_frame, action_status, sales_notes, lead_score, numeric_lead_score, booking_timestamp"
-        ).order('booking_timestamp', desc=True)
+        details = lead_details.get_cache().get_many(
+            request_ids,
+            lambda missing: single_flight.get_group("lead_details").do(
+                single_flight.request_key(set(missing)), lambda: query_lead_details(missing)
+            ),
+            min(data_cache_ttl("bookings"), data_cache_ttl("ai_insights")),
+            version=(shared.version("bookings"), shared.version("ai_insights")),
+        )
+    except Exception as e:
+        logging.error(f"Error fetching lead details: {e}", exc_info=True)
+        return None
+    # Whatever text gets loaded also feeds the similar-leads index
+    similar_leads.get_index().apply_bookings([{"request_id": rid, "sales_notes": d.get("sales_notes")} for rid, d in details.items()])
+    similar_leads.get_index().apply_insights({rid: d for rid, d in details.items() if d.get("rolling_summary") is not None})
+    return details
 
-        if location_filter and location_filter != "All Locations":
-            query = query.eq('location', location_filter)
-        if start_date_filter:
-            query = query.gte('booking_timestamp', start_date_filter.isoformat())
-        if end_date_filter:
-            query = query.lte('booking_timestamp', (end_date_filter + timedelta(days=1)).isoformat())
+# Ids per detail query when text is loaded for a whole view (keeps the in.(...) filter short)
+LEAD_DETAILS_BATCH = 200
 
-        response = query.execute()
+def load_similarity_text(request_ids):
+    """Loads notes/summaries for ``request_ids`` in batches so the similar-leads index covers them.
 
-        if response.data:
-            return response.data
-        else:
-            return []
+    The list query no longer carries the text, so without this the index would only know the
+    cards opened so far. Cached ids cost nothing; returns False if a batch failed.
+    """
+    request_ids = list(dict.fromkeys(request_ids))
+    ok = True
+    for i in range(0, len(request_ids), LEAD_DETAILS_BATCH):
+        ok = fetch_lead_details(request_ids[i:i + LEAD_DETAILS_BATCH]) is not None and ok
+    return ok
+
+def with_lead_details(rows):
+    """Copies of booking rows with sales_notes filled in from fetch_lead_details (one batch for all rows)."""
+    details = fetch_lead_details([r["request_id"] for r in rows])
+    if details is None:
+        raise RuntimeError("Could not load sales notes for the selected leads.")
+    return [dict(r, sales_notes=(details.get(r["request_id"]) or {}).get("sales_notes")) for r in rows]
+
+def query_bookings(location_filter=None, start_date_filter=None, end_date_filter=None):
+    """Runs the bookings query against Supabase; raises on failure."""
+    query = (
+        supabase.from_(SUPABASE_TABLE_NAME).select(BOOKING_COLUMNS)
+        .is_('merged_into', 'null')
+        .order('booking_timestamp', desc=True)
+    )
+
+    if location_filter and location_filter != "All Locations":
+        query = query.eq('location', location_filter)
+    if start_date_filter:
+        query = query.gte('booking_timestamp', start_date_filter.isoformat())
+    if end_date_filter:
+        query = query.lte('booking_timestamp', (end_date_filter + timedelta(days=1)).isoformat())
+
+    response = query.execute()
+    return response.data or []
+
+# Cities with their own fetch partition; anything else (or unset) falls into one catch-all partition
+BOOKING_LOCATIONS = ["New York", "Los Angeles", "Chicago", "Houston", "Miami"]
+# Split wide fetches into per-location (and per-N-day) partitions fetched concurrently; 0 disables date shards.
+# Ranges shorter than PARTITION_MIN_DAYS are one request: fanning them out costs more requests than it saves.
+PARTITIONED_FETCH = os.getenv("BOOKINGS_PARTITIONED_FETCH", "1") != "0"
+PARTITION_SHARD_DAYS = int(os.getenv("BOOKINGS_SHARD_DAYS", "7"))
+PARTITION_MIN_DAYS = int(os.getenv("BOOKINGS_PARTITION_MIN_DAYS", "14"))
+
+def query_bookings_days(first_day, last_day, location="All Locations"):
+    """Bookings whose timestamp falls on first_day..last_day, newest first; raises on failure.
+
+    location limits the query to one city; None means every city not in
+    BOOKING_LOCATIONS (including unset).
+    """
+    query = (
+        supabase.from_(SUPABASE_TABLE_NAME).select(BOOKING_COLUMNS)
+        .is_('merged_into', 'null')
+        .gte('booking_timestamp', first_day.isoformat())
+        .lt('booking_timestamp', (last_day + timedelta(days=1)).isoformat())
+    )
+    if location is None:
+        listed = ",".join(f'"{city}"' for city in BOOKING_LOCATIONS)
+        query = query.or_(f"location.is.null,location.not.in.({listed})")
+    elif location != "All Locations":
+        query = query.eq('location', location)
+    response = query.order('booking_timestamp', desc=True).execute()
+    return response.data or []
+
+def fetch_bookings_days(first_day, last_day):
+    """All locations for first_day..last_day; wide ranges as concurrent per-partition queries merged newest first.
+
+    Each partition is cached on its own in the shared tier, so overlapping
+    requests (and other replicas) reuse shards that are already there.
+    """
+    shared = shared_cache.get_cache()
+    if not PARTITIONED_FETCH or (last_day - first_day).days + 1 < PARTITION_MIN_DAYS:
+        return shared.get_or_compute(
+            "bookings", ("days", first_day, last_day), data_cache_ttl("bookings"), lambda: query_bookings_days(first_day, last_day)
+        )
+    locations = BOOKING_LOCATIONS + [None]
+    shard_days = partitioned_fetch.shard_days_for(first_day, last_day, len(locations), PARTITION_SHARD_DAYS)
+    parts = partitioned_fetch.partitions(first_day, last_day, locations, shard_days)
+    return partitioned_fetch.fetch_all(
+        parts,
+        lambda part: shared.get_or_compute(
+            "bookings", ("days", part.first_day, part.last_day, part.location), data_cache_ttl("bookings"),
+            lambda: query_bookings_days(part.first_day, part.last_day, part.location),
+        ),
+        sort_key=lambda r: str(r.get('booking_timestamp') or ""),
+    )
+
+def load_bookings(location_filter=None, start_date_filter=None, end_date_filter=None):
+    """Bookings for the filters, fetching only the days this process does not hold yet.
+
+    Day ranges are fetched for all locations and the location is filtered
+    locally, so switching city or nudging a date reuses rows already loaded.
+    Open-ended ranges bypass the interval cache.
+    """
+    shared = shared_cache.get_cache()
+    if start_date_filter is None or end_date_filter is None:
+        key = (location_filter, start_date_filter, end_date_filter)
+        return shared.get_or_compute(
+            "bookings", key, data_cache_ttl("bookings"),
+            lambda: query_bookings(location_filter, start_date_filter, end_date_filter),
+        )
+    match = None if location_filter in (None, "All Locations") else {"location": location_filter}
+    return interval_cache.get_cache("bookings").get(
+        start_date_filter,
+        end_date_filter,
+        fetch_bookings_days,
+        data_cache_ttl("bookings"),
+        version=shared.version("bookings"),
+        match=match,
+        changes=lambda old, new: shared.changed_since("bookings", old, new),
+    )
+
+def get_bookings(location_filter=None, start_date_filter=None, end_date_filter=None):
+    """fetch_bookings_data without the Streamlit error handling; raises. Safe on background threads."""
+    key = (location_filter, start_date_filter, end_date_filter)
+    return swr_cache.get_cache("bookings").get(
+        key,
+        lambda: load_bookings(location_filter, start_date_filter, end_date_filter),
+        data_cache_ttl("bookings"),
+        version=shared_cache.get_cache().version("bookings"),
+    )
+
+def fetch_bookings_data(location_filter=None, start_date_filter=None, end_date_filter=None):
+    """Fetches all booking data from Supabase, with optional filters.
+
+    Served stale-while-revalidate: once older than the bookings TTL the last good
+    result is returned immediately and refreshed in the background. Only a cold
+    miss waits on Supabase, and then only for the days not already held.
+    """
+    try:
+        return get_bookings(location_filter, start_date_filter, end_date_filter)
     except Exception as e:
         logging.error(f"Error fetching data from Supabase: {e}", exc_info=True)
         st.session_state.error_message = f"Error fetching data from Supabase: {e}"
         return []
 
+def warm_view(location_filter, start_date_filter, end_date_filter):
+    """Load a sidebar view into the shared caches as a session would: bookings, the lead frame, insights."""
+    rows = get_bookings(location_filter, start_date_filter, end_date_filter)
+    if rows:
+        lead_table.get_table((location_filter, start_date_filter, end_date_filter), rows)
+        fetch_ai_insights_map([r["request_id"] for r in rows])
+
 def update_booking_field(request_id, field_name, new_value):
     """Updates a specific field for a booking in Supabase using request_id."""
     try:
@@ -204,7 +527,9 @@ def update_booking_field(request_id, field_name, new_value):
         if response.data:
             logging.info(f"Successfully updated {field_name} for {request_id}!")
             st.session_state.success_message = f"Successfully updated {field_name} for {request_id}!"
-            st.cache_data.clear()
+            invalidate_data_caches()
+            priority_index.get_index().apply_bookings(response.data)
+            similar_leads.get_index().apply_bookings(response.data)
         else:
             logging.error(f"Failed to update {field_name} for {request_id}. Response: {response}")
             st.session_state.error_message = f"Failed to update {field_name} for {request_id}. Response: {response}"
@@ -212,57 +537,119 @@ def update_booking_field(request_id, field_name, new_value):
         logging.error(f"Error updating {field_name} in Supabase: {e}", exc_info=True)
         st.session_state.error_message = f"Error updating {field_name} in Supabase: {e}"
 
+# Bulk status change for many leads in one round-trip
+def update_bookings_status(request_ids, new_status):
+    """Sets action_status for all request_ids with a single UPDATE ... WHERE request_id IN (...)."""
+    if not request_ids:
+        return []
+    try:
+        response = supabase.from_(SUPABASE_TABLE_NAME).update({"action_status": new_status}).in_('request_id', list(request_ids)).execute()
+        updated_ids = [r["request_id"] for r in (response.data or [])]
+        logging.info(f"Bulk-updated action_status to {new_status} for {len(updated_ids)} leads.")
+        invalidate_data_caches()
+        priority_index.get_index().apply_bookings(response.data or [])
+        return updated_ids
+    except Exception as e:
+        logging.error(f"Error bulk-updating action_status in Supabase: {e}", exc_info=True)
+        st.session_state.error_message = f"Error updating lead statuses in Supabase: {e}"
+        return []
+
+def load_duplicate_clusters(limit=10):
+    """Largest duplicate clusters; members seen only through the narrow list get their notes checked first.
+
+    A booking merged away (by another session or before a restart) is only recognisable from its
+    sales_notes, which the list query does not load.
+    """
+    index = duplicates.get_index()
+    clusters = index.clusters(limit=limit)
+    unchecked = [m["request_id"] for members in clusters for m in members if "sales_notes" not in m]
+    details = fetch_lead_details(unchecked) if unchecked else None
+    if details:
+        index.apply_bookings([{"request_id": rid, "sales_notes": d.get("sales_notes")} for rid, d in details.items()])
+        clusters = index.clusters(limit=limit)
+    return clusters
+
+def merge_duplicate_leads(primary, members):
+    """Folds duplicate bookings into primary.
+
+    The kept booking gets the best score and every distinct sales note, email
+    interactions of the others are re-pointed to it, and the others get
+    merged_into set to the kept booking (plus a note naming it). Their status is
+    left alone so they do not count as lost deals; every bookings read skips
+    merged rows (nothing is deleted).
+    """
+    duplicate_ids = [m["request_id"] for m in members if m["request_id"] != primary["request_id"]]
+    if not duplicate_ids:
+        return False
+    try:
+        members = with_lead_details(members)
+        primary = next(m for m in members if m["request_id"] == primary["request_id"])
+        supabase.from_(SUPABASE_TABLE_NAME).update(duplicates.merged_fields(primary, members)).eq('request_id', primary["request_id"]).execute()
+        supabase.from_(EMAIL_INTERACTIONS_TABLE_NAME).update({"request_id": primary["request_id"]}).in_('request_id', duplicate_ids).execute()
+        response = supabase.from_(SUPABASE_TABLE_NAME).update({
+            "merged_into": primary["request_id"],
+            "sales_notes": f"{duplicates.MERGED_NOTE_PREFIX}{primary['request_id']}",
+        }).in_('request_id', duplicate_ids).execute()
+        logging.info(f"Merged {len(duplicate_ids)} duplicate booking(s) into {primary['request_id']}.")
+        invalidate_data_caches()
+        duplicates.get_index().remove(duplicate_ids)
+        priority_index.get_index().apply_bookings(response.data or [])
+        return True
+    except Exception as e:
+        logging.error(f"Error merging duplicates into {primary['request_id']}: {e}", exc_info=True)
+        st.session_state.error_message = f"Error merging duplicate leads: {e}"
+        return False
+
+# Sink for the interaction write-ahead queue (runs on its background worker); idempotent on event_id
+insert_email_interaction_rows = interaction_queue.supabase_sink(supabase, EMAIL_INTERACTIONS_TABLE_NAME)
+
 # ADDED: Function to log email interactions to email_interactions table
-def log_email_interaction(request_id, event_type):
+def log_email_interactions(events):
+    """Queues (request_id, event_type) pairs locally; a background worker bulk-inserts them."""
+    if not events:
+        return
+    now_iso = datetime.now(timezone.utc).isoformat()
+    rows = [{"request_id": request_id, "event_type": event_type, "timestamp": now_iso} for request_id, event_type in events]
     try:
-        data = {
-            "request_id": request_id,
-            "event_type": event_type,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-        response = supabase.from_(EMAIL_INTERACTIONS_TABLE_NAME).insert(data).execute()
-        if response.data:
-            logging.info(f"Logged email interaction: {event_type} for {request_id}.")
-        else:
-            logging.error(f"Failed to log email interaction {event_type} for {request_id}. Response: {response}")
+        queued = interaction_queue.get_queue(insert_email_interaction_rows).append(rows)
+        logging.info(f"Queued {queued} email interaction(s) for logging.")
     except Exception as e:
-        logging.error(f"Error logging email interaction for {request_id}: {e}", exc_info=True)
+        logging.error(f"Error queueing {len(rows)} email interaction(s): {e}", exc_info=True)
 
-# send_email function uses SendGrid API (for individual sends from this dashboard)
-def send_email(recipient_email, subject, body, request_id=None, event_type="email_sent_dashboard"): # Added request_id, event_type
+def log_email_interaction(request_id, event_type):
+    log_email_interactions([(request_id, event_type)])
+
+# Batched SendGrid sends (one reused client, personalizations per recipient)
+def send_emails_bulk(emails):
+    """Sends mail_pipeline.OutboundEmail items in batches and bulk-logs the delivered ones.
+
+    Returns the DeliveryReport, or None if email sending is not configured.
+    """
     if not ENABLE_EMAIL_SENDING:
         logging.error("SendGrid API Key or sender email not fully configured. Email sending is disabled.")
         st.session_state.error_message = "Email sending is disabled. Please ensure SendGrid API Key and Sender Email are configured."
-        return False
+        return None
+    report = mail_pipeline.get_pipeline(SENDGRID_API_KEY, email_address, host=SENDGRID_API_HOST).send(emails)
+    log_email_interactions([(o.email.request_id, o.email.event_type) for o in report.sent if o.email.request_id])
+    for outcome in report.failed:
+        logging.error(f"Failed to send email to {outcome.email.to}: {outcome.error}")
+    return report
 
-    message = Mail(
-        from_email=email_address, # Your verified sender email
-        to_emails=recipient_email,
-        subject=subject,
-        html_content=body # Ensure body is HTML with <p> tags for proper rendering
-    )
-    try:
-        sendgrid_client = SendGridAPIClient(SENDGRID_API_KEY)
-        response = sendgrid_client.send(message)
-        
-        # Check SendGrid's API response status code
-        if response.status_code >= 200 and response.status_code < 300:
-            logging.info(f"Email successfully sent via SendGrid to {recipient_email}! Status Code: {response.status_code}")
-            st.session_state.success_message = f"Email successfully sent to {recipient_email}!"
-            # Log the email sent event
-            if request_id:
-                log_email_interaction(request_id, event_type)
-            return True
-        else:
-            logging.error(f"Failed to send email via SendGrid. Status Code: {response.status_code}, Body: {response.body.decode('utf-8') if response.body else 'No body'}")
-            st.session_state.error_message = f"Failed to send email. SendGrid Status: {response.status_code}"
-            return False
-    except Exception as e:
-        logging.error(f"Error sending email via SendGrid: {e}", exc_info=True)
-        st.session_state.error_message = f"Error sending email: {e}"
+# send_email function uses SendGrid API (for individual sends from this dashboard)
+def send_email(recipient_email, subject, body, request_id=None, event_type="email_sent_dashboard"): # Added request_id, event_type
+    # Ensure body is HTML with <p> tags for proper rendering
+    report = send_emails_bulk([mail_pipeline.OutboundEmail(recipient_email, subject, body, request_id, event_type)])
+    if report is None:
         return False
-
-def analyze_sentiment(text):
+    if report.sent:
+        logging.info(f"Email successfully sent via SendGrid to {recipient_email}!")
+        st.session_state.success_message = f"Email successfully sent to {recipient_email}!"
+        return True
+    st.session_state.error_message = f"Failed to send email. {report.failed[0].error}"
+    return False
+
+def classify_sentiment(text, client=None):
+    """Sentiment of ``text``; raises on API errors. No Streamlit calls, safe on worker threads."""
     if not text.strip():
         return "NEUTRAL"
 
@@ -271,26 +658,30 @@ def analyze_sentiment(text):
 
     Text: "{text}"
     """
+    completion = (client or openai_client).chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You are a sentiment analysis AI. Your only output is 'POSITIVE', 'NEUTRAL', or 'NEGATIVE'."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.0,
+        max_tokens=10
+    )
+    sentiment = completion.choices[0].message.content.strip().upper()
+    if sentiment in ["POSITIVE", "NEUTRAL", "NEGATIVE"]:
+        return sentiment
+    return "NEUTRAL"
+
+def analyze_sentiment(text):
     try:
-        completion = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a sentiment analysis AI. Your only output is 'POSITIVE', 'NEUTRAL', or 'NEGATIVE'."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.0,
-            max_tokens=10
-        )
-        sentiment = completion.choices[0].message.content.strip().upper()
-        if sentiment in ["POSITIVE", "NEUTRAL", "NEGATIVE"]:
-            return sentiment
-        return "NEUTRAL"
+        return classify_sentiment(text)
     except Exception as e:
         logging.error(f"Error analyzing sentiment: {e}", exc_info=True)
         st.error(f"Error analyzing sentiment: {e}")
         return "NEUTRAL"
 
-def check_notes_relevance(sales_notes):
+def classify_notes_relevance(sales_notes, client=None):
+    """'RELEVANT' or 'IRRELEVANT' for ``sales_notes``; raises on API errors. No Streamlit calls, safe on worker threads."""
     if not sales_notes.strip():
         return "IRRELEVANT"
 
@@ -307,27 +698,30 @@ def check_notes_relevance(sales_notes):
 
     Sales Notes: "{sales_notes}"
     """
+    completion = (client or openai_client).chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You are an AI assistant that evaluates the relevance of sales notes for email generation. Your only output is 'RELEVANT' or 'IRRELEVANT'."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.0,
+        max_tokens=10
+    )
+    relevance = completion.choices[0].message.content.strip().upper()
+    if relevance in ["RELEVANT", "IRRELEVANT"]:
+        return relevance
+    return "IRRELEVANT"
+
+def check_notes_relevance(sales_notes):
     try:
-        completion = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an AI assistant that evaluates the relevance of sales notes for email generation. Your only output is 'RELEVANT' or 'IRRELEVANT'."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.0,
-            max_tokens=10
-        )
-        relevance = completion.choices[0].message.content.strip().upper()
-        if relevance in ["RELEVANT", "IRRELEVANT"]:
-            return relevance
-        return "IRRELEVANT"
+        return classify_notes_relevance(sales_notes)
     except Exception as e:
         logging.error(f"Error checking notes relevance: {e}", exc_info=True)
         st.error(f"Error checking notes relevance: {e}")
         return "IRRELEVANT"
 
 # MODIFIED: generate_followup_email to request HTML and generate <p> tags
-def generate_followup_email(customer_name, customer_email, vehicle_name, sales_notes, vehicle_details, current_vehicle_brand=None, sentiment=None):
+def generate_followup_email(customer_name, customer_email, vehicle_name, sales_notes, vehicle_details, current_vehicle_brand=None, sentiment=None, client=None):
     features_str = vehicle_details.get("features", "cutting-edge technology and a luxurious experience.")
     vehicle_type = vehicle_details.get("type", "vehicle")
     powertrain = vehicle_details.get("powertrain", "advanced Inference")
@@ -496,36 +890,35 @@ def generate_followup_email(customer_name, customer_email, vehicle_name, sales_n
     """
 
     try:
-        with st.spinner("Drafting email with AI..."): # This spinner is for dashboard UI, not agent service
-            completion = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful and persuasive sales assistant for AOE Motors."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.0,
-                max_tokens=800
-            )
-            draft = completion.choices[0].message.content.strip()
-            if "Subject:" in draft:
-                parts = draft.split("Subject:", 1)
-                subject_line = parts[1].split("\n", 1)[0].strip()
-                body_content = parts[1].split("\n", 1)[1].strip()
-            else:
-                subject_line = f"Following up on your {vehicle_name} Test Drive"
-                body_content = draft
-            
-            # Post-processing to convert Markdown to HTML for sending
-            if body_content.strip() and not ("<p>" in body_content):
-                paragraphs = body_content.split('\n\n')
-                html_body_for_sending = "".join(f"<p>{p.strip()}</p>" for p in paragraphs if p.strip())
-            else:
-                html_body_for_sending = body_content
-            
-            logging.debug(f"Final Generated Body (Markdown for UI, partial): {body_content[:100]}...")
-            logging.debug(f"Final HTML Body (for sending, partial): {html_body_for_sending[:100]}...")
-            
-            return subject_line, body_content, html_body_for_sending # MODIFIED return tuple
+        completion = (client or openai_client).chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are a helpful and persuasive sales assistant for AOE Motors."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.0,
+            max_tokens=800
+        )
+        draft = completion.choices[0].message.content.strip()
+        if "Subject:" in draft:
+            parts = draft.split("Subject:", 1)
+            subject_line = parts[1].split("\n", 1)[0].strip()
+            body_content = parts[1].split("\n", 1)[1].strip()
+        else:
+            subject_line = f"Following up on your {vehicle_name} Test Drive"
+            body_content = draft
+        
+        # Post-processing to convert Markdown to HTML for sending
+        if body_content.strip() and not ("<p>" in body_content):
+            paragraphs = body_content.split('\n\n')
+            html_body_for_sending = "".join(f"<p>{p.strip()}</p>" for p in paragraphs if p.strip())
+        else:
+            html_body_for_sending = body_content
+        
+        logging.debug("Final Generated Body (Markdown for UI, partial): %.100s...", body_content)
+        logging.debug("Final HTML Body (for sending, partial): %.100s...", html_body_for_sending)
+        
+        return subject_line, body_content, html_body_for_sending # MODIFIED return tuple
 
     except Exception as e:
         logging.error(f"Error drafting email with AI: {e}", exc_info=True)
@@ -561,7 +954,7 @@ def generate_welcome_email_html(customer_name, vehicle_name): # Renamed for clar
 
 
 # NEW: Function to suggest offer for automation agent
-def suggest_offer_llm(lead_details: dict, vehicle_data: dict) -> tuple: # Returns (text_output, html_output)
+def suggest_offer_llm(lead_details: dict, vehicle_data: dict, client=None) -> tuple: # Returns (text_output, html_output)
     customer_name = lead_details.get("customer_name", "customer")
     vehicle_name = lead_details.get("vehicle_name", "vehicle")
     current_vehicle = lead_details.get("current_vehicle", "N/A")
@@ -601,7 +994,7 @@ def suggest_offer_llm(lead_details: dict, vehicle_data: dict) -> tuple: # Return
     """
 
     try:
-        completion = openai_client.chat.completions.create(
+        completion = (client or openai_client).chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are a highly analytical AI Sales Advisor. Provide concise, actionable offer suggestions."},
@@ -622,7 +1015,7 @@ def suggest_offer_llm(lead_details: dict, vehicle_data: dict) -> tuple: # Return
 
 
 # NEW: Function to generate call talking points for automation agent
-def generate_call_talking_points_llm(lead_details: dict, vehicle_data: dict) -> str:
+def generate_call_talking_points_llm(lead_details: dict, vehicle_data: dict, client=None) -> str:
     customer_name = lead_details.get("customer_name", "customer")
     vehicle_name = lead_details.get("vehicle_name", "vehicle")
     current_vehicle = lead_details.get("current_vehicle", "N/A")
@@ -657,7 +1050,7 @@ def generate_call_talking_points_llm(lead_details: dict, vehicle_data: dict) ->
     """
 
     try:
-        completion = openai_client.chat.completions.create(
+        completion = (client or openai_client).chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are an AI Sales Advisor that provides clear, actionable talking points for sales calls."},
@@ -679,6 +1072,53 @@ def generate_call_talking_points_llm(lead_details: dict, vehicle_data: dict) ->
         logging.error(f"Error generating talking points: {e}", exc_info=True)
         return "Error generating talking points. Please try again."
 
+# Lead profile passed to the offer / talking-points prompts
+def lead_ai_details(row, sales_notes=None) -> dict:
+    numeric_lead_score = row.get('numeric_lead_score', 0)
+    return {
+        "customer_name": row['full_name'],
+        "vehicle_name": row['vehicle'],
+        "current_vehicle": row['current_vehicle'],
+        "lead_score_text": label_from_numeric(numeric_lead_score),
+        "numeric_lead_score": numeric_lead_score,
+        "sales_notes": row['sales_notes'] if sales_notes is None else sales_notes,
+    }
+
+# Generators used by the background precompute job (no Streamlit calls inside).
+# The LLM helpers return an "Error generating ..." message instead of raising;
+# returning None makes the job count it as a failure rather than caching it.
+def precompute_offer(row, client=None):
+    text, _ = suggest_offer_llm(lead_ai_details(row), AOE_VEHICLE_DATA.get(row['vehicle'], {}), client=client or background_openai_client)
+    return None if text.startswith("Error generating") else text
+
+def precompute_talking_points(row, client=None):
+    text = generate_call_talking_points_llm(lead_ai_details(row), AOE_VEHICLE_DATA.get(row['vehicle'], {}), client=client or background_openai_client)
+    return None if text.startswith("Error generating") else text
+
+PRECOMPUTE_GENERATORS = {
+    precompute.OFFER: precompute_offer,
+    precompute.TALKING_POINTS: precompute_talking_points,
+}
+
+# Per-lead pipeline of the card's "Draft Follow-up Email" flow, for bulk_drafts (runs on worker threads)
+def draft_followup_for_row(row, client=None):
+    sales_notes = (row.get('sales_notes') or "").strip()
+    if not sales_notes:
+        raise bulk_drafts.SkipDraft("No sales notes.")
+    vehicle_details = AOE_VEHICLE_DATA.get(row['vehicle'], {})
+    if not vehicle_details:
+        raise bulk_drafts.SkipDraft(f"No vehicle details for {row['vehicle']}.")
+    if classify_notes_relevance(sales_notes, client=client) == "IRRELEVANT":
+        raise bulk_drafts.SkipDraft("Sales notes are unclear or irrelevant.")
+    sentiment = classify_sentiment(sales_notes, client=client)
+    current_vehicle = row.get('current_vehicle')
+    current_vehicle_brand_val = current_vehicle.split(' ')[0] if isinstance(current_vehicle, str) and current_vehicle else None
+    subject, body_markdown, _ = generate_followup_email(
+        row['full_name'], row['email'], row['vehicle'], sales_notes, vehicle_details,
+        current_vehicle_brand=current_vehicle_brand_val, sentiment=sentiment, client=client,
+    )
+    return {"subject": subject, "body": body_markdown}
+
 # --- Removed interpret_and_query from here, it's now in the new service ---
 
 
@@ -695,6 +1135,8 @@ if 'info_message' not in st.session_state:
     st.session_state.info_message = None
 if 'success_message' not in st.session_state:
     st.session_state.success_message = None
+if 'pending_ai_action' not in st.session_state:
+    st.session_state.pending_ai_action = None
 if 'error_message' not in st.session_state:
     st.session_state.error_message = None # Corrected typo in key name from 'error' to 'error_message'
 
@@ -713,7 +1155,7 @@ if st.session_state.error_message: # Corrected typo in key name from 'error' to
 # Filters Section
 st.sidebar.header("Filters")
 
-all_locations = ["All Locations", "New York", "Los Angeles", "Chicago", "Houston", "Miami"]
+all_locations = ["All Locations"] + BOOKING_LOCATIONS
 selected_location = st.sidebar.selectbox("Filter by Location", all_locations)
 
 col_sidebar1, col_sidebar2 = st.sidebar.columns(2)
@@ -724,6 +1166,168 @@ with col_sidebar2:
     end_date = st.date_input("End Date (Booking Timestamp)", value=datetime.today().date() + timedelta(days=1))
     st.session_state['sidebar_end_date'] = end_date # Store for NLQ context
 
+selected_tiers = st.sidebar.multiselect("Filter by Lead Tier", ["Hot", "Warm", "Cold"], help="Leave empty for all tiers.")
+selected_statuses = st.sidebar.multiselect("Filter by Action Status", ACTION_STATUS_MAP["New"], help="Leave empty for all statuses.")
+
+# "Call next" list; filled in once bookings/insights for this rerun have been applied to the index
+CALL_NEXT_COUNT = 5
+call_next_slot = st.sidebar.container()
+
+# Export the current filter without loading it into the page: keyset-paged from Supabase and
+# spooled to a temp file only when the download button is clicked. Streamlit keeps the finished
+# file in memory while it is offered, so exports are capped at EXPORT_MAX_ROWS; a capped file ends
+# with a TRUNCATED row and the download stays disabled until the rep confirms the cut.
+with st.sidebar.expander("Export Leads", expanded=False):
+    export_format = st.radio("Format", ["csv", "parquet"], horizontal=True, key="export_format")
+    export_filters = dict(
+        location=selected_location, start_date=start_date, end_date=end_date,
+        tiers=selected_tiers, statuses=selected_statuses,
+    )
+    try:
+        export_matches = shared_cache.get_cache().get_or_compute(
+            "bookings", ("export_count", export_filters), data_cache_ttl("bookings"),
+            lambda: lead_export.count_leads(supabase, SUPABASE_TABLE_NAME, **export_filters),
+        )
+    except Exception as e:
+        logging.error(f"Error counting leads for export: {e}", exc_info=True)
+        export_matches = None
+    export_truncated = export_matches is None or export_matches > lead_export.EXPORT_MAX_ROWS
+    if export_truncated:
+        matched_note = "an unknown number of" if export_matches is None else f"{export_matches:,}"
+        st.warning(
+            f"This filter matches {matched_note} leads; the export stops at the newest "
+            f"{lead_export.EXPORT_MAX_ROWS:,} and ends with a TRUNCATED row. Narrow the filters to get everything."
+        )
+        export_confirmed = st.checkbox("Export the truncated file anyway", key="export_truncated_ok")
+    else:
+        export_confirmed = True
+    st.download_button(
+        f"Download {export_format.upper()}",
+        data=lambda: lead_export.build_export(
+            export_format,
+            lead_export.iter_lead_pages(supabase, SUPABASE_TABLE_NAME, **export_filters),
+        ),
+        file_name=f"leads_{start_date.isoformat()}_{end_date.isoformat()}.{export_format}",
+        mime=lead_export.WRITERS[export_format][1],
+        key="export_download_btn",
+        disabled=not export_confirmed,
+    )
+    if not export_truncated:
+        st.caption(f"{export_matches:,} matching leads.")
+
+# Interaction events that cannot be written because of the table setup are kept, not dropped; say so loudly
+interaction_stats = interaction_queue.get_queue(insert_email_interaction_rows).stats()
+if interaction_stats["misconfigured"]:
+    st.sidebar.error(
+        f"⚠️ Email interactions are not being saved ({interaction_stats['pending']} queued): "
+        f"{interaction_stats['misconfigured']}. Check the email_interactions migrations."
+    )
+
+# Instrumentation (process-wide, shared by all sessions on this server)
+with st.sidebar.expander("Instrumentation", expanded=False):
+    st.markdown("**Email interaction queue**")
+    st.caption(
+        f"Pending: {interaction_stats['pending']} • Flushed: {interaction_stats['flushed_total']} • "
+        f"Quarantined: {interaction_stats['quarantined_total']} • Failed attempts: {interaction_stats['failed_attempts']}"
+    )
+    llm_metrics = llm_scheduler.get_scheduler().metrics()
+    st.markdown("**OpenAI scheduler**")
+    st.caption(
+        f"Queue depth: {llm_metrics['queue_depth']} • In flight: {llm_metrics['in_flight']} • "
+        f"Completed: {llm_metrics['completed']} • Failed: {llm_metrics['failed']}"
+    )
+    st.caption(
+        f"Wait p50/p95: {llm_metrics['wait_p50_s']:.2f}s / {llm_metrics['wait_p95_s']:.2f}s • "
+        f"Interactive p95: {llm_metrics['interactive_wait_p95_s']:.2f}s • "
+        f"Background p95: {llm_metrics['background_wait_p95_s']:.2f}s"
+    )
+    st.caption(f"429 retries: {llm_metrics['retries_429']} • Rejected (queue full): {llm_metrics['rejected']}")
+
+    st.markdown("**Logging**")
+    st.caption(f"Debug records dropped by sampling: {logging_setup.dropped_debug_records()}")
+
+    artifact_stats = session_artifacts.get_store(st.session_state).stats()
+    artifact_totals = session_artifacts.process_totals()
+    st.markdown("**AI artifacts**")
+    st.caption(
+        f"This session: {artifact_stats['items']}/{artifact_stats['max_items']} items • "
+        f"{artifact_stats['bytes'] / 1024:.1f}/{artifact_stats['max_bytes'] / 1024:.0f} KB • "
+        f"evictions {artifact_stats['evictions']} • restores {artifact_stats['restores']}"
+    )
+    st.caption(
+        f"All sessions: {artifact_totals['sessions']} sessions • {artifact_totals['items']} items • "
+        f"{artifact_totals['bytes'] / 1024:.1f} KB"
+    )
+
+    cache_stats = shared_cache.get_cache().stats()
+    st.markdown("**Shared data cache**")
+    st.caption(f"Backend: {cache_stats['backend']} • Hits: {cache_stats['hits']} • Misses: {cache_stats['misses']} • Waited on another replica: {cache_stats['waited']}")
+    flight_stats = single_flight.all_stats()
+    if flight_stats:
+        st.caption("Coalesced identical calls: " + " • ".join(
+            f"{name} {s['shared']}/{s['calls'] + s['shared']}" for name, s in flight_stats.items()
+        ) + f" • duplicate dispatches dropped: {cache_stats['duplicates']}")
+    for swr_name in ("bookings", "ai_insights"):
+        swr_stats = swr_cache.get_cache(swr_name).stats()
+        st.caption(
+            f"{swr_name}: fresh {swr_stats['hits']} • stale-served {swr_stats['stale_hits']} • "
+            f"cold {swr_stats['cold_loads']} • refreshes {swr_stats['refreshes']} (failed {swr_stats['refresh_failures']})"
+        )
+    for cache_name, fresh in freshness_controller.metrics().items():
+        st.caption(
+            f"{cache_name} refresh every {fresh['ttl_s']:.0f}s • {fresh['changes_per_min']:.1f} changes/min • "
+            f"probe p50 {fresh['probe_p50_ms']:.0f} ms (max {fresh['probe_max_ms']:.0f}) • "
+            f"{fresh['probes']} probes, {fresh['failures']} failed"
+        )
+    range_stats = interval_cache.get_cache("bookings").stats()
+    st.caption(
+        f"bookings days held: {range_stats['days']} ({range_stats['rows']} rows) • "
+        f"covered {range_stats['hits']} • partial {range_stats['partial_hits']} • cold {range_stats['misses']} • "
+        f"days fetched {range_stats['fetched_days']}"
+    )
+    detail_stats = lead_details.get_cache().stats()
+    st.caption(
+        f"lead notes/summaries held: {detail_stats['leads']} • hits {detail_stats['hits']} • "
+        f"misses {detail_stats['misses']} • fetches {detail_stats['fetches']}"
+    )
+
+    table_stats = lead_table.stats()
+    st.caption(
+        f"Shared lead frames: {table_stats['tables']} ({table_stats['rows']} rows) • "
+        f"built {table_stats['builds']} • reused {table_stats['reuses']}"
+    )
+
+    warmer = warmup.current()
+    if warmer is not None and warmer.last_run:
+        st.caption(
+            f"Warm-up: {warmer.last_run['views']} view(s), {warmer.last_run['questions']} question(s), "
+            f"{warmer.last_run['failed']} failed, {int(time.time() - warmer.last_run['finished_at'])}s ago • "
+            f"{warmer.skipped} idle cycle(s) skipped"
+        )
+
+    chart_stats = chart_prep.get_cache().stats()
+    st.markdown("**Analytics charts**")
+    st.caption(
+        f"Prepared frames cached: {chart_stats['frames']} • hits {chart_stats['hits']} • misses {chart_stats['misses']} • "
+        f"budget {chart_prep.MAX_POINTS} points / {chart_prep.MAX_BARS} bars"
+    )
+
+    for svc in AGENT_SERVICE_CLIENTS:
+        svc_health = svc.health()
+        probe_state = {True: "up", False: "down", None: "not probed yet"}[svc_health["probe_ok"]]
+        st.markdown(f"**{svc_health['name']}** ({'degraded' if svc_health['degraded'] else 'ok'}, probe: {probe_state})")
+        for path, ep in svc_health["endpoints"].items():
+            learned = f"{ep['learned_timeout_s']:.1f}s" if ep["learned_timeout_s"] else "default"
+            st.caption(f"`{path}` breaker: {ep['state']} • failures: {ep['failures']} • timeout: {learned}")
+
+# Background warm-up of common views and analytics answers (started once per process, then on a schedule)
+warmup.start(warm_view, warm_analytics if agent_service else None, all_locations)
+warmup.get_usage().touch()
+# Each view a session switches to counts toward the views the warm-up learns to prefetch
+if st.session_state.get("warmup_last_view") != (selected_location, start_date, end_date):
+    st.session_state.warmup_last_view = (selected_location, start_date, end_date)
+    warmup.get_usage().record_view(selected_location, start_date, end_date)
+
 # Fetch all data needed for the dashboard with filters
 bookings_data = fetch_bookings_data(selected_location, start_date, end_date)
 
@@ -732,16 +1336,55 @@ if not bookings_data:
     st.stop()
     
 else:
-    df = pd.DataFrame(bookings_data)
-    df['booking_timestamp'] = pd.to_datetime(df['booking_timestamp'])
-    df = df.sort_values(by='booking_timestamp', ascending=False)
-
-
-# Prefetch AI rolling summaries for all currently visible leads
+    bookings_key = (selected_location, start_date, end_date)
+    bookings_age = swr_cache.get_cache("bookings").age(bookings_key)
+    if bookings_age is not None:
+        refresh_note = " • refreshing…" if swr_cache.get_cache("bookings").is_refreshing(bookings_key) else ""
+        refresh_error = swr_cache.get_cache("bookings").last_error(bookings_key)
+        if refresh_error:
+            refresh_note += " • last refresh failed, showing previous data"
+        st.caption(f"Data as of {int(bookings_age)}s ago (refreshes every {data_cache_ttl('bookings'):.0f}s){refresh_note}")
+
+    # Parsed, sorted frame shared by every session viewing this data; df is a read-only (possibly shared) view
+    df = lead_table.get_table(bookings_key, bookings_data).view(selected_tiers, selected_statuses)
+    if df.empty:
+        st.info("No leads match the selected tier/status filters.")
+
+
+# Prefetch AI insight counters for all currently visible leads (summaries load with the card)
     insights_map = fetch_ai_insights_map(df['request_id'].tolist())
 
+    # Feed the process-wide call priority index; unchanged leads are skipped, so this is cheap per rerun
+    call_index = priority_index.get_index()
+    call_index.apply_bookings(bookings_data)
+    call_index.apply_insights(insights_map)
+    similar_leads.get_index().apply_bookings(bookings_data)
+    similar_leads.get_index().apply_insights(insights_map)
+    duplicates.get_index().apply_bookings(bookings_data)
+    with call_next_slot:
+        st.markdown("**📞 Call next**")
+        # Only leads of the view just loaded: their rows are fresh, while other entries may be stale
+        call_next = call_index.top(
+            CALL_NEXT_COUNT, location=selected_location, start=start_date, end=end_date,
+            tiers=selected_tiers, statuses=selected_statuses,
+        )
+        if not call_next:
+            st.caption("No open leads in this view.")
+        for lead in call_next:
+            st.button(
+                f"{lead.get('full_name') or lead['request_id']} · {lead.get('vehicle') or ''}",
+                key=f"call_next_{lead['request_id']}",
+                on_click=open_lead,
+                args=(lead['request_id'],),
+                use_container_width=True,
+            )
+            st.caption(f"{lead['reason']} • {lead.get('action_status')}")
+
     # --- NEW: Batch Automation Agent Triggers ---
     st.subheader("Automated Agent Actions")
+    for svc in AGENT_SERVICE_CLIENTS:
+        if svc.degraded():
+            st.warning(f"⚠️ {svc.name} is degraded. Its actions will fail fast until it recovers.")
     st.markdown("Use these buttons to trigger agents to process leads in the **current filtered view**.")
     
     col_batch_buttons = st.columns(4)#added 4 buttons
@@ -754,20 +1397,27 @@ else:
                     st.session_state.info_message = "No leads with 'Follow Up Required' status in the current filtered view."
                 else:
                     st.session_state.info_message = f"Dispatching agent to send follow-up emails for {len(leads_to_process)} leads..."
+                    batch_payload = {
+                        "lead_ids": leads_to_process,
+                        "selected_location": selected_location, # Pass context
+                        "start_date": start_date.isoformat(),
+                        "end_date": end_date.isoformat()
+                    }
                     try:
-                        response = requests.post(
-                            f"{AUTOMOTIVE_AGENT_SERVICE_URL}/trigger-batch-followup-email-agent",
-                            json={
-                                "lead_ids": leads_to_process,
-                                "selected_location": selected_location, # Pass context
-                                "start_date": start_date.isoformat(),
-                                "end_date": end_date.isoformat()
-                            },
-                            timeout=120 # Give agents more time
-                        )
-                        response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
+                        def send_batch_followup():
+                            response = agent_service.post(
+                                "/trigger-batch-followup-email-agent",
+                                json=batch_payload,
+                                timeout=120, # Give agents more time
+                                adaptive=False, # not idempotent: never cut short and retried
+                            )
+                            response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
+                            return response
+                        response = dispatch_once("Batch follow-up", dict(batch_payload, lead_ids=sorted(leads_to_process)), send_batch_followup)
                         result = response.json()
                         st.session_state.success_message = result.get("message", "Batch follow-up agent triggered successfully.")
+                    except DuplicateDispatch as e:
+                        st.session_state.info_message = f"{e} Not sent again."
                     except requests.exceptions.Timeout:
                         st.session_state.error_message = "Batch follow-up agent timed out. Please check service logs."
                     except requests.exceptions.RequestException as e:
@@ -791,20 +1441,27 @@ else:
                     st.session_state.info_message = "No leads with score > 12 (and not Lost/Converted) in the current filtered view."
                 else:
                     st.session_state.info_message = f"Dispatching agent to send offers for {len(leads_to_process)} leads..."
+                    batch_payload = {
+                        "lead_ids": leads_to_process,
+                        "selected_location": selected_location, # Pass context
+                        "start_date": start_date.isoformat(),
+                        "end_date": end_date.isoformat()
+                    }
                     try:
-                        response = requests.post(
-                            f"{AUTOMOTIVE_AGENT_SERVICE_URL}/trigger-batch-offer-agent",
-                            json={
-                                "lead_ids": leads_to_process,
-                                "selected_location": selected_location, # Pass context
-                                "start_date": start_date.isoformat(),
-                                "end_date": end_date.isoformat()
-                            },
-                            timeout=120
-                        )
-                        response.raise_for_status()
+                        def send_batch_offer():
+                            response = agent_service.post(
+                                "/trigger-batch-offer-agent",
+                                json=batch_payload,
+                                timeout=120,
+                                adaptive=False,
+                            )
+                            response.raise_for_status()
+                            return response
+                        response = dispatch_once("Batch offer", dict(batch_payload, lead_ids=sorted(leads_to_process)), send_batch_offer)
                         result = response.json()
                         st.session_state.success_message = result.get("message", "Batch offer agent triggered successfully.")
+                    except DuplicateDispatch as e:
+                        st.session_state.info_message = f"{e} Not sent again."
                     except requests.exceptions.Timeout:
                         st.session_state.error_message = "Batch offer agent timed out. Please check service logs."
                     except requests.exceptions.RequestException as e:
@@ -829,15 +1486,26 @@ else:
                 else:
                     st.session_state.info_message = f"Dispatching agent to send personalized ads to {len(leads_to_process)} leads..."
                     try:
-                        # Call the new personalized ad service for each lead
+                        # Call the new personalized ad service for each lead; each lead's ad is dispatched once per window
+                        already_sent = 0
                         for lead_id in leads_to_process:
-                            response = requests.post(
-                                f"{PERSONALIZED_AD_SERVICE_URL}/send-ad-email",
-                                json={"request_id": lead_id},
-                                timeout=60
-                            )
-                            response.raise_for_status()
-                        st.session_state.success_message = f"Personalized ad emails triggered successfully for {len(leads_to_process)} leads."
+                            def send_ad(lead_id=lead_id):
+                                response = ad_service.post(
+                                    "/send-ad-email",
+                                    json={"request_id": lead_id},
+                                    timeout=60,
+                                    adaptive=False,
+                                )
+                                response.raise_for_status()
+                                return response
+                            try:
+                                dispatch_once("Personalized ad", lead_id, send_ad)
+                            except DuplicateDispatch:
+                                already_sent += 1
+                        sent_count = len(leads_to_process) - already_sent
+                        st.session_state.success_message = f"Personalized ad emails triggered successfully for {sent_count} leads."
+                        if already_sent:
+                            st.session_state.info_message = f"Skipped {already_sent} lead(s) whose ad was already sent in the last {DISPATCH_DEDUP_SECONDS // 60} min."
                     except requests.exceptions.Timeout:
                         st.session_state.error_message = "Personalized ad agent timed out. Please check service logs."
                     except requests.exceptions.RequestException as e:
@@ -854,11 +1522,15 @@ else:
                 st.warning("Automated Agent Service URL not configured.")
             else:
                 try:
-                    resp = requests.post(
-                    f"{AUTOMOTIVE_AGENT_SERVICE_URL}/ops/mark-testdrives-due",
-                    timeout=60,
-                    )
-                    resp.raise_for_status()
+                    def send_mark_due():
+                        resp = agent_service.post(
+                        "/ops/mark-testdrives-due",
+                        timeout=60,
+                        adaptive=False,
+                        )
+                        resp.raise_for_status()
+                        return resp
+                    resp = dispatch_once("Test-drive reminder run", None, send_mark_due)
                     result = resp.json()
                     st.session_state.success_message = (
                         "✅ Test-drive reminders run complete — "
@@ -868,12 +1540,211 @@ else:
                         f"Emails sent: {result.get('emails_sent', 0)} • "
                         f"Skipped (already due): {result.get('skipped_already_due', 0)}"
                     )
+                except DuplicateDispatch as e:
+                    st.session_state.info_message = f"{e} Not run again."
                 except requests.exceptions.Timeout:
                     st.session_state.error_message = "⏳ Test-drive reminder call timed out."
                 except requests.exceptions.RequestException as e:
                     st.session_state.error_message = f"❌ Failed to call the agent service: {e}"
             st.rerun()
 
+    # --- Bulk pre-generation of offers / talking points for the current view ---
+    col_precompute_btn, col_precompute_status = st.columns([1, 3])
+    with col_precompute_btn:
+        if st.button("Precompute AI Suggestions", key="precompute_ai_btn",
+                     help="Generate offers (score > 12) and talking points (Call Scheduled) in the background so lead cards show them instantly."):
+            # Only eligible leads need their sales notes for the prompts; one details query covers them all
+            precompute_rows = [r for r in df.to_dict("records") if precompute.eligible_kinds(r)]
+            try:
+                precompute.start_background(with_lead_details(precompute_rows), PRECOMPUTE_GENERATORS)
+            except RuntimeError as e:
+                st.session_state.error_message = f"❌ {e}"
+            st.rerun()
+    with col_precompute_status:
+        precompute_job = precompute.current_job()
+        if precompute_job is not None:
+            state = "Running" if precompute_job.running else "Last run"
+            st.caption(f"{state}: {precompute_job.summary()}")
+
+    # --- Bulk status transitions (one UPDATE, batched Lost/Converted emails, one interactions insert) ---
+    with st.expander("Bulk Status Update", expanded=False):
+        bulk_labels = {
+            f"{r['full_name']} - {r['vehicle']} ({r['action_status']})": r['request_id']
+            for r in df[['request_id', 'full_name', 'vehicle', 'action_status']].to_dict("records")
+        }
+        with st.form("bulk_status_form"):
+            bulk_selected = st.multiselect("Leads", options=list(bulk_labels.keys()))
+            bulk_status = st.selectbox("New Action Status", options=ACTION_STATUS_MAP["New"])
+            bulk_apply = st.form_submit_button("Apply to Selected Leads")
+
+        if bulk_apply:
+            rows_by_id = df.set_index('request_id')
+            changing_ids = [
+                bulk_labels[label] for label in bulk_selected
+                if rows_by_id.at[bulk_labels[label], 'action_status'] != bulk_status
+            ]
+            if not changing_ids:
+                st.session_state.info_message = "No selected leads need a status change."
+            else:
+                updated_ids = update_bookings_status(changing_ids, bulk_status)
+                message = f"Updated {len(updated_ids)} lead(s) to '{bulk_status}'."
+                if bulk_status in ('Lost', 'Converted') and updated_ids and ENABLE_EMAIL_SENDING:
+                    email_builder = generate_lost_email_html if bulk_status == 'Lost' else generate_welcome_email_html
+                    event_type = "email_lost_sent" if bulk_status == 'Lost' else "email_converted_sent"
+                    outbound = []
+                    for rid in updated_ids:
+                        subject, body = email_builder(rows_by_id.at[rid, 'full_name'], rows_by_id.at[rid, 'vehicle'])
+                        outbound.append(mail_pipeline.OutboundEmail(rows_by_id.at[rid, 'email'], subject, body, rid, event_type))
+                    report = send_emails_bulk(outbound)
+                    if report is not None:
+                        message += f" Emails: {report.summary()}."
+                        if report.failed:
+                            st.session_state.error_message = "Failed to email: " + ", ".join(
+                                f"{o.email.to} ({o.error})" for o in report.failed
+                            )
+                st.session_state.success_message = message
+            st.rerun()
+
+    # --- Bulk follow-up drafting: the card's draft pipeline for many leads at once, then review and send ---
+    with st.expander("Bulk Follow-up Drafts", expanded=False):
+        followup_rows = df[df['action_status'] == 'Follow Up Required'].to_dict("records")
+        followup_labels = {f"{r['full_name']} - {r['vehicle']}": r['request_id'] for r in followup_rows}
+        with st.form("bulk_draft_form"):
+            draft_selected = st.multiselect(
+                "Follow Up Required leads", options=list(followup_labels.keys()), default=list(followup_labels.keys())
+            )
+            draft_submit = st.form_submit_button("Draft Follow-ups for Selected Leads")
+
+        if draft_submit:
+            selected_ids = {followup_labels[label] for label in draft_selected}
+            rows_to_draft = [r for r in followup_rows if r['request_id'] in selected_ids]
+            if not rows_to_draft:
+                st.session_state.info_message = "Select at least one lead to draft."
+            else:
+                try:
+                    rows_to_draft = with_lead_details(rows_to_draft)
+                except RuntimeError as e:
+                    st.session_state.error_message = f"❌ {e}"
+                    st.rerun()
+                with st.spinner(f"Drafting {len(rows_to_draft)} follow-up email(s) in parallel..."):
+                    draft_results = bulk_drafts.draft_all(rows_to_draft, draft_followup_for_row)
+                review_artifacts = session_artifacts.get_store(st.session_state)
+                for result in draft_results:
+                    if result.status == bulk_drafts.READY:
+                        # Same session storage as a card draft, so this rep's lead card shows it too
+                        review_artifacts.set(
+                            precompute.FOLLOWUP_DRAFT, result.request_id, {"subject": result.subject, "body": result.body}
+                        )
+                st.session_state.followup_review_queue = [
+                    {"request_id": r.request_id, "status": r.status, "reason": r.reason} for r in draft_results
+                ]
+                st.session_state.success_message = f"Bulk drafting: {bulk_drafts.summarize(draft_results)}."
+            st.rerun()
+
+        review_queue = st.session_state.get("followup_review_queue") or []
+        review_artifacts = session_artifacts.get_store(st.session_state)
+        leads_by_rid = {r['request_id']: r for r in followup_rows}
+        ready_items = []
+        for item in review_queue:
+            lead = leads_by_rid.get(item["request_id"])
+            if item["status"] != bulk_drafts.READY or lead is None:
+                continue
+            draft = review_artifacts.get(precompute.FOLLOWUP_DRAFT, item["request_id"])
+            if draft:
+                ready_items.append((lead, draft))
+
+        if review_queue:
+            st.markdown(f"**Review queue** — {len(ready_items)} draft(s) awaiting approval")
+        for item in review_queue:
+            if item["status"] != bulk_drafts.READY:
+                lead = leads_by_rid.get(item["request_id"], {})
+                st.caption(f"{lead.get('full_name', item['request_id'])}: {item['status']} — {item['reason']}")
+
+        def _drop_from_review(request_id):
+            session_artifacts.get_store(st.session_state).pop(precompute.FOLLOWUP_DRAFT, request_id)
+            st.session_state.followup_review_queue = [
+                i for i in st.session_state.get("followup_review_queue") or [] if i["request_id"] != request_id
+            ]
+
+        if ready_items and ENABLE_EMAIL_SENDING:
+            if st.button(f"Approve and Send All ({len(ready_items)})", key="review_send_all_btn"):
+                outbound = [
+                    mail_pipeline.OutboundEmail(
+                        lead['email'], st.session_state.get(f"review_subject_{lead['request_id']}", draft["subject"]),
+                        md_converter.render(draft["body"]), lead['request_id'], "email_followup_sent",
+                    )
+                    for lead, draft in ready_items
+                ]
+                report = send_emails_bulk(outbound)
+                if report is not None:
+                    for outcome in report.sent:
+                        _drop_from_review(outcome.email.request_id)
+                    st.session_state.success_message = f"Follow-ups: {report.summary()}."
+                    if report.failed:
+                        st.session_state.error_message = "Failed to email: " + ", ".join(
+                            f"{o.email.to} ({o.error})" for o in report.failed
+                        )
+                st.rerun()
+
+        for lead, draft in ready_items:
+            rid = lead['request_id']
+            st.markdown(f"---\n**{lead['full_name']}** ({lead['email']}) — {lead['vehicle']}")
+            review_subject = st.text_input("Subject:", value=draft["subject"], key=f"review_subject_{rid}")
+            st.markdown(draft["body"], unsafe_allow_html=True)
+            col_review_send, col_review_discard = st.columns(2)
+            with col_review_send:
+                if ENABLE_EMAIL_SENDING and st.button("Approve and Send", key=f"review_send_{rid}"):
+                    if send_email(lead['email'], review_subject, md_converter.render(draft["body"]), request_id=rid, event_type="email_followup_sent"):
+                        _drop_from_review(rid)
+                    st.rerun()
+            with col_review_discard:
+                if st.button("Discard", key=f"review_discard_{rid}"):
+                    _drop_from_review(rid)
+                    st.rerun()
+
+    # Duplicate bookings of the same customer, found by email / name+location blocking keys
+    with st.expander("Duplicate Leads", expanded=False):
+        st.caption("Leads in the loaded date range are checked automatically; scan to include every booking.")
+        if st.button("Scan All Bookings for Duplicates", key="scan_duplicates_btn"):
+            scanned = 0
+            try:
+                for page in lead_export.iter_lead_pages(supabase, SUPABASE_TABLE_NAME):
+                    duplicates.get_index().apply_bookings(page)
+                    scanned += len(page)
+                st.session_state.info_message = f"Scanned {scanned} booking(s) for duplicates."
+            except Exception as e:
+                logging.error(f"Error scanning bookings for duplicates: {e}", exc_info=True)
+                st.session_state.error_message = f"Error scanning bookings for duplicates: {e}"
+            st.rerun()
+
+        duplicate_clusters = load_duplicate_clusters(limit=10)
+        duplicate_count = duplicates.get_index().cluster_count()
+        if not duplicate_count:
+            st.info("No duplicate leads found.")
+        else:
+            st.write(f"{duplicate_count} group(s) of possible duplicates; largest shown first.")
+        for members in duplicate_clusters:
+            cluster_id = min(m["request_id"] for m in members)
+            st.markdown(f"**{members[0].get('full_name')}** — {len(members)} bookings")
+            st.dataframe(
+                pd.DataFrame(members).reindex(columns=[
+                    "request_id", "full_name", "email", "vehicle", "location", "action_status",
+                    "numeric_lead_score", "booking_timestamp",
+                ]),
+                use_container_width=True, hide_index=True,
+            )
+            member_ids = [m["request_id"] for m in members]
+            keep_id = st.selectbox(
+                "Keep", options=member_ids,
+                index=member_ids.index(duplicates.pick_primary(members)["request_id"]),
+                key=f"dup_primary_{cluster_id}",
+            )
+            if st.button("Merge Into Kept Lead", key=f"dup_merge_{cluster_id}"):
+                primary = next(m for m in members if m["request_id"] == keep_id)
+                if merge_duplicate_leads(primary, members):
+                    st.session_state.success_message = f"Merged {len(members) - 1} duplicate(s) into {keep_id}."
+                st.rerun()
+
 
 # --- Analytics session defaults (must exist before first read) ---
 if "analytics_last_query" not in st.session_state:
@@ -919,17 +1790,8 @@ if ask:
             if not AUTOMOTIVE_AGENT_SERVICE_URL:
                 st.warning("Analytics service URL not configured.")
             else:
-                r = requests.post(
-                    f"{AUTOMOTIVE_AGENT_SERVICE_URL}/analyze-query",
-                    json={
-                        "query_text": q,
-                        "start_date": st.session_state["sidebar_start_date"].strftime("%Y-%m-%d"),
-                        "end_date":   st.session_state["sidebar_end_date"].strftime("%Y-%m-%d"),
-                    },
-                    timeout=15,
-                )
-                r.raise_for_status()
-                resp_json = r.json()
+                warmup.get_usage().record_question(q, st.session_state["sidebar_start_date"], st.session_state["sidebar_end_date"])
+                resp_json = fetch_analytics(q, st.session_state["sidebar_start_date"], st.session_state["sidebar_end_date"])
                 st.session_state["analytics_last_result"]   = resp_json.get("result_message", "No result.")
                 st.session_state["analytics_last_type"]     = resp_json.get("result_type", "TEXT")
                 st.session_state["analytics_last_payload"]  = resp_json.get("payload", None)
@@ -949,17 +1811,13 @@ payload = st.session_state.get("analytics_last_payload")
 
 if rtype == "CHART" and isinstance(payload, dict):
     kind = payload.get("kind")
+    # Downsampled (LTTB lines, top-N bars) and cached per payload hash, so long spans stay cheap to render
+    chart_df = chart_prep.get_cache().prepare(payload)
     if kind == "bar":
-        labels = payload.get("labels", [])
-        values = payload.get("values", [])
-        if labels and values and len(labels)==len(values):
-            chart_df = pd.DataFrame({"Label": labels, "Count": values}).set_index("Label")
+        if chart_df is not None:
             st.bar_chart(chart_df["Count"])
     elif kind == "line":
-        x = payload.get("x", [])
-        series = payload.get("series", {})
-        if x and series:
-            chart_df = pd.DataFrame(series, index=pd.to_datetime(x, errors="coerce"))
+        if chart_df is not None:
             st.line_chart(chart_df)
         else:
             st.info("No conversion or loss activity found in this period.")
@@ -998,7 +1856,9 @@ elif rtype == "RANK" and isinstance(payload, dict):
             st.dataframe(others[show_cols] if show_cols else others,use_container_width=True, hide_index=True)
 
 # else: COUNT/TEXT are already shown via the banner
+artifacts = session_artifacts.get_store(st.session_state)
 for index, row in df.iterrows():
+    logging_setup.bind(request_id=row['request_id']) # Correlate log records with the lead being rendered
     current_action = row['action_status']
     current_numeric_lead_score = row.get('numeric_lead_score', 0)
     current_lead_score_text = label_from_numeric(current_numeric_lead_score)
@@ -1037,6 +1897,27 @@ for index, row in df.iterrows():
         f"(Score: {current_lead_score_text} - {current_numeric_lead_score} points){score_trend_indicator}",
         expanded=is_expanded,
     ):
+        # Sales notes and the rolling summary are not in the list query; they are fetched (and cached) for the
+        # opened card only. Collapsed cards render from the list row, so a page of leads costs no text fields.
+        lead_text = fetch_lead_details([row['request_id']]) if is_expanded else None
+        if lead_text is None:
+            st.button(
+                "Toggle Details",
+                key=f"toggle_{row['request_id']}",
+                on_click=set_expanded_lead,
+                args=(row['request_id'],),
+            )
+            st.write(f"**Email:** {row['email']}")
+            st.write(f"**Location:** {row['location']}")
+            st.write(f"**Booking Date:** {row['booking_date']}")
+            if is_expanded:
+                st.error("Could not load sales notes and the AI summary for this lead. Please try again shortly.")
+            else:
+                st.caption("Toggle Details to load sales notes, the AI summary and actions.")
+            continue
+        lead_text = lead_text.get(row['request_id']) or {}
+        row['sales_notes'] = lead_text.get("sales_notes")
+
         # Two-column layout *inside* the expander
         col_main, col_rail = st.columns([3, 2], gap="large")
 
@@ -1143,7 +2024,7 @@ for index, row in df.iterrows():
                     unsafe_allow_html=True,
                 )
 
-                summary_text = (insight.get("rolling_summary") or "").strip()
+                summary_text = (lead_text.get("rolling_summary") or "").strip()
                 if not summary_text:
                     st.caption("No summary text yet.")
                 else:
@@ -1154,24 +2035,55 @@ for index, row in df.iterrows():
                 if updated_at:
                     st.caption(f"Updated: {updated_at}")          
 
+            # Similar leads by notes + rolling summary (local TF-IDF index) and how they ended up
+            if st.button("🔎 Find similar leads", key=f"similar_btn_{row['request_id']}"):
+                # Index the notes/summaries of every lead in the current view first (cached after the first click)
+                with st.spinner("Loading lead notes for matching..."):
+                    if not load_similarity_text(df['request_id'].tolist()):
+                        st.session_state.error_message = "Some lead notes could not be loaded; similar leads may be incomplete."
+                artifacts.set(similar_leads.SIMILAR, row['request_id'], similar_leads.get_index().similar(row['request_id'], k=5))
+                st.session_state.expanded_lead_id = row['request_id'] # Keep expanded
+            similar_matches = artifacts.get(similar_leads.SIMILAR, row['request_id'])
+            if similar_matches is not None:
+                if not similar_matches:
+                    st.caption("No similar leads found (add sales notes to improve matching).")
+                else:
+                    st.dataframe(
+                        pd.DataFrame(similar_matches).reindex(
+                            columns=["full_name", "current_vehicle", "vehicle", "action_status", "similarity"]
+                        ).rename(columns={
+                            "full_name": "Lead", "current_vehicle": "Current Vehicle", "vehicle": "Interested In",
+                            "action_status": "Outcome", "similarity": "Similarity",
+                        }),
+                        use_container_width=True, hide_index=True,
+                    )
+
         # --- START AI BUTTONS OUTSIDE THE FORM (Manual Triggers to Local Dashboard Logic) ---
         # These buttons are not tied to the form submission,
         # allowing immediate actions without saving other form inputs.
-        # Initialize session state keys for each button click status for this row
-        offer_button_clicked_key = f'offer_button_clicked_{row["request_id"]}'
-        talking_points_button_clicked_key = f'talking_points_button_clicked_{row["request_id"]}'
-
-        if offer_button_clicked_key not in st.session_state:
-            st.session_state[offer_button_clicked_key] = False
-        if talking_points_button_clicked_key not in st.session_state:
-            st.session_state[talking_points_button_clicked_key] = False
-            
+        # A click is recorded as the single pending AI action (kind, request_id) for the next rerun,
+        # instead of per-lead *_button_clicked_* keys that would pile up in session state.
+        pending_ai_action = st.session_state.get("pending_ai_action")
+
+        # Generated artifacts live in the bounded per-session store; anything evicted (or produced by
+        # the background precompute job) is restored from the process-wide LLM result cache, which is
+        # only valid for the notes/score/vehicle the result was generated from.
+        lead_fingerprint = precompute.context_fingerprint(new_sales_notes, current_numeric_lead_score, row['vehicle'])
+        suggested_offer = artifacts.get(
+            precompute.OFFER, row['request_id'],
+            restore=lambda: precompute.get_store().get(row['request_id'], precompute.OFFER, lead_fingerprint),
+        )
+        call_talking_points = artifacts.get(
+            precompute.TALKING_POINTS, row['request_id'],
+            restore=lambda: precompute.get_store().get(row['request_id'], precompute.TALKING_POINTS, lead_fingerprint),
+        )
+
         ai_individual_buttons_cols = st.columns([1,1]) # Create new columns for these two buttons outside the form
 
         with ai_individual_buttons_cols[0]:
             if selected_action not in ['Lost', 'Converted']: # Only show if not Lost/Converted
                 if st.button("Suggest Offer (AI)", key=f"suggest_offer_btn_outside_{row['request_id']}"):
-                    st.session_state[offer_button_clicked_key] = True # Set clicked state for this specific row
+                    st.session_state.pending_ai_action = (precompute.OFFER, row['request_id']) # Set clicked state for this specific row
                     st.session_state.expanded_lead_id = row['request_id'] # Keep expanded
                     st.rerun() # Immediately rerun to process click
             else:
@@ -1180,7 +2092,7 @@ for index, row in df.iterrows():
         with ai_individual_buttons_cols[1]:
             if selected_action == 'Call Scheduled': # Only show if status is Call Scheduled
                 if st.button("Generate Talking Points (AI)", key=f"generate_talking_points_btn_outside_{row['request_id']}"):
-                    st.session_state[talking_points_button_clicked_key] = True # Set clicked state for this specific row
+                    st.session_state.pending_ai_action = (precompute.TALKING_POINTS, row['request_id']) # Set clicked state for this specific row
                     st.session_state.expanded_lead_id = row['request_id'] # Keep expanded
                     st.rerun() # Immediately rerun
             
@@ -1229,15 +2141,16 @@ for index, row in df.iterrows():
                         
                 if vehicle_details:
                     # draft_subject and draft_body will be Markdown from now on
-                    followup_subject, followup_body_markdown, _ = generate_followup_email( # ADDED                         
-                        row['full_name'], row['email'], row['vehicle'], new_sales_notes, vehicle_details,
-                        current_vehicle_brand=current_vehicle_brand_val,
-                        sentiment=notes_sentiment
-                    )
+                    with st.spinner("Drafting email with AI..."):
+                        followup_subject, followup_body_markdown, _ = generate_followup_email( # ADDED                         
+                            row['full_name'], row['email'], row['vehicle'], new_sales_notes, vehicle_details,
+                            current_vehicle_brand=current_vehicle_brand_val,
+                            sentiment=notes_sentiment
+                        )
                     if followup_subject and followup_body_markdown:
-                        st.session_state[f"draft_subject_{row['request_id']}"] = followup_subject
-                            # Store Markdown in session state for UI display
-                        st.session_state[f"draft_body_{row['request_id']}"] = followup_body_markdown
+                        # Store Markdown for UI display; drafts stay in this rep's session only
+                        followup_draft = {"subject": followup_subject, "body": followup_body_markdown}
+                        artifacts.set(precompute.FOLLOWUP_DRAFT, row['request_id'], followup_draft)
                         st.session_state.expanded_lead_id = row['request_id']
                         st.session_state.info_message = None 
                         st.rerun()
@@ -1248,10 +2161,11 @@ for index, row in df.iterrows():
                     st.session_state.error_message = f"Vehicle details for {row['vehicle']} not found in hardcoded data. Cannot draft email."
                     st.session_state.info_message = None 
 
-        if selected_action == 'Follow Up Required' and f"draft_subject_{row['request_id']}" in st.session_state and f"draft_body_{row['request_id']}" in st.session_state:
-            draft_subject = st.session_state[f"draft_subject_{row['request_id']}"]
+        followup_draft = artifacts.get(precompute.FOLLOWUP_DRAFT, row['request_id'])
+        if selected_action == 'Follow Up Required' and followup_draft:
+            draft_subject = followup_draft["subject"]
             # Retrieve Markdown body for UI display
-            draft_body_markdown = st.session_state[f"draft_body_{row['request_id']}"]
+            draft_body_markdown = followup_draft["body"]
 
             st.subheader("Review Drafted Email:")
             edited_subject = st.text_input("Subject:", value=draft_subject, key=f"reviewed_subject_{row['request_id']}")
@@ -1268,60 +2182,50 @@ for index, row in df.iterrows():
                 # Send button will use the converted HTML
                 if st.button(f"Click to Send Drafted Email to {row['full_name']}", key=f"send_draft_email_btn_{row['request_id']}"):
                     if send_email(row['email'], edited_subject, edited_body_html_for_sending, request_id=row['request_id'], event_type="email_followup_sent"):
-                        st.session_state.pop(f"draft_subject_{row['request_id']}", None)
-                        st.session_state.pop(f"draft_body_{row['request_id']}", None)
+                        artifacts.pop(precompute.FOLLOWUP_DRAFT, row['request_id'])
                         st.session_state.expanded_lead_id = row['request_id']
                         st.rerun()
             else:
                 st.warning("Email sending is not configured. Please add SMTP credentials to secrets.")
 
             # NEW: Logic for Dynamic Offer Suggestion (triggered by button_clicked from outside form)
-        if st.session_state.get(offer_button_clicked_key, False): # Check session state for click
+        if pending_ai_action == (precompute.OFFER, row['request_id']): # Check session state for click
             st.session_state.info_message = "Generating personalized offer suggestion..."
-            offer_suggestion_details = {
-                "customer_name": row['full_name'],
-                "vehicle_name": row['vehicle'],
-                "current_vehicle": row['current_vehicle'],
-                "lead_score_text": current_lead_score_text,
-                "numeric_lead_score": current_numeric_lead_score,
-                "sales_notes": new_sales_notes # Use the latest notes
-            }
+            offer_suggestion_details = lead_ai_details(row, sales_notes=new_sales_notes) # Use the latest notes
             suggested_offer_text, _ = suggest_offer_llm(offer_suggestion_details, AOE_VEHICLE_DATA.get(row['vehicle'], {}))
-            st.session_state[f"suggested_offer_{row['request_id']}"] = suggested_offer_text
+            artifacts.set(precompute.OFFER, row['request_id'], suggested_offer_text)
+            if not suggested_offer_text.startswith("Error generating"):
+                precompute.get_store().put(row['request_id'], precompute.OFFER, lead_fingerprint, suggested_offer_text)
             st.session_state.expanded_lead_id = row['request_id'] # Keep expanded
             st.session_state.info_message = None # Clear info message
-            st.session_state[offer_button_clicked_key] = False # Reset click state
+            st.session_state.pending_ai_action = None # Reset click state
             st.rerun()
             
-        # Display suggested offer if available in session state
-        if f"suggested_offer_{row['request_id']}" in st.session_state:
+        # Display suggested offer if generated in this session or precomputed for this context
+        if suggested_offer and selected_action not in ['Lost', 'Converted']:
             st.subheader("AI-Suggested Offer:")
-            st.markdown(st.session_state[f"suggested_offer_{row['request_id']}"])
+            st.markdown(suggested_offer)
             st.markdown("---")
 
 
         # NEW: Logic for Talking Points (triggered by button_clicked from outside form)
-        if st.session_state.get(talking_points_button_clicked_key, False): # Check session state for click
+        if pending_ai_action == (precompute.TALKING_POINTS, row['request_id']): # Check session state for click
             st.session_state.info_message = "Generating talking points..."
-            talking_points_details = {
-                "customer_name": row['full_name'],
-                "vehicle_name": row['vehicle'],
-                "current_vehicle": row['current_vehicle'],
-                "lead_score_text": current_lead_score_text,
-                "numeric_lead_score": current_numeric_lead_score,
-                "sales_notes": new_sales_notes # Use the latest notes
-            }
+            talking_points_details = lead_ai_details(row, sales_notes=new_sales_notes) # Use the latest notes
             generated_points = generate_call_talking_points_llm(talking_points_details, AOE_VEHICLE_DATA.get(row['vehicle'], {}))
-            st.session_state[f"call_talking_points_{row['request_id']}"] = generated_points
+            artifacts.set(precompute.TALKING_POINTS, row['request_id'], generated_points)
+            if not generated_points.startswith("Error generating"):
+                precompute.get_store().put(row['request_id'], precompute.TALKING_POINTS, lead_fingerprint, generated_points)
             st.session_state.expanded_lead_id = row['request_id']
             st.session_state.info_message = None
-            st.session_state[talking_points_button_clicked_key] = False # Reset click state
+            st.session_state.pending_ai_action = None # Reset click state
             st.rerun()
             
-            # Display talking points if available in session state
-        if f"call_talking_points_{row['request_id']}" in st.session_state:
+            # Display talking points if generated in this session or precomputed for this context
+        if call_talking_points and selected_action == 'Call Scheduled':
             st.subheader("AI-Generated Talking Points:")
-            st.markdown(st.session_state[f"call_talking_points_{row['request_id']}"])
+            st.markdown(call_talking_points)
             st.markdown("---")
            
+logging_setup.bind(request_id=None)
 st.markdown("---")
\ No newline at end of file
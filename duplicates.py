@@ -0,0 +1,246 @@
+"""Duplicate-lead detection over bookings with blocking keys and union-find.
+
+Customers who book twice show up as separate leads with separate scores and
+separate emails. Comparing every pair is O(N^2); instead each booking emits
+a couple of blocking keys and bookings sharing a key are unioned:
+
+* ``email:<normalised email>`` - lower-cased, Gmail dots and ``+tags``
+  removed;
+* ``name:<normalised full name>|<location>`` - accents, punctuation and
+  token order ignored; only for names with at least two tokens, so a lone
+  first name never links leads. A name key shared by more than
+  ``MAX_NAME_BLOCK`` bookings is treated as a common name and links nothing.
+
+Keys live in a hash map to the first booking that produced them, so adding
+a booking costs O(keys) and a full build is linear in the number of
+bookings. Union-find cannot split clusters, so a booking whose keys change
+(edited email, merged away) marks the index dirty and clusters are rebuilt
+from the retained keys on the next read, still linear.
+
+Merged-away bookings have ``merged_into`` set (older ones only carry
+``MERGED_NOTE_PREFIX`` in their sales notes) and are ignored. Rows may come without ``sales_notes`` (the dashboard's lead
+list does not load them); a booking once seen as merged stays ignored until
+a row with different notes says otherwise.
+"""
+import heapq
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+MERGED_NOTE_PREFIX = "Merged duplicate of "
+MAX_NAME_BLOCK = 5
+GMAIL_DOMAINS = ("gmail.com", "googlemail.com")
+MEMBER_FIELDS = (
+    "full_name", "email", "vehicle", "location", "action_status", "numeric_lead_score",
+    "booking_timestamp", "sales_notes",
+)
+
+
+def normalize_email(email):
+    email = (email or "").strip().lower()
+    local, _, domain = email.partition("@")
+    if not local or not domain:
+        return None
+    local = local.split("+", 1)[0]
+    if domain in GMAIL_DOMAINS:
+        local = local.replace(".", "")
+        domain = "gmail.com"
+    return f"{local}@{domain}"
+
+
+def normalize_name(name):
+    """Sorted lower-case ASCII tokens, e.g. ``"Dr. José  Smith"`` -> ``"dr jose smith"``."""
+    text = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join(sorted(re.findall(r"[a-z]+", text)))
+
+
+def blocking_keys(row) -> tuple:
+    keys = []
+    email = normalize_email(row.get("email"))
+    if email:
+        keys.append(f"email:{email}")
+    name = normalize_name(row.get("full_name"))
+    if name.count(" ") >= 1:
+        keys.append(f"name:{name}|{(row.get('location') or '').strip().lower()}")
+    return tuple(keys)
+
+
+def is_merged(row) -> bool:
+    return bool(row.get("merged_into")) or (row.get("sales_notes") or "").startswith(MERGED_NOTE_PREFIX)
+
+
+class DuplicateIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}  # request_id -> blocking keys
+        self._rows = {}  # request_id -> member fields for display/merge
+        self._key_owner = {}  # blocking key -> first request_id seen with it
+        self._key_counts = Counter()
+        self._parent = {}
+        self._members = {}  # root -> request_ids in its cluster
+        self._multi = set()  # roots of clusters with more than one booking
+        self._merged = set()  # request_ids seen with a merged-away note
+        self._dirty = False
+        self._last_rows = None
+
+    def _find(self, request_id):
+        parent = self._parent
+        root = request_id
+        while parent[root] != root:
+            root = parent[root]
+        while parent[request_id] != root:  # path compression
+            parent[request_id], request_id = root, parent[request_id]
+        return root
+
+    def _union(self, a, b):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return
+        if len(self._members[root_a]) < len(self._members[root_b]):
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._members[root_a].extend(self._members.pop(root_b))
+        self._multi.discard(root_b)
+        self._multi.add(root_a)
+
+    def _usable(self, key):
+        return not (key.startswith("name:") and self._key_counts[key] > MAX_NAME_BLOCK)
+
+    def _count(self, keys, delta):
+        for key in keys:
+            self._key_counts[key] += delta
+            if delta > 0 and key.startswith("name:") and self._key_counts[key] == MAX_NAME_BLOCK + 1:
+                self._dirty = True  # became a common name; undo the links it made
+            if self._key_counts[key] <= 0:
+                del self._key_counts[key]
+
+    def _link(self, request_id, keys):
+        if request_id not in self._parent:
+            self._parent[request_id] = request_id
+            self._members[request_id] = [request_id]
+        for key in keys:
+            if not self._usable(key):
+                continue
+            owner = self._key_owner.setdefault(key, request_id)
+            if owner != request_id:
+                self._union(request_id, owner)
+
+    def _rebuild(self):
+        self._key_owner.clear()
+        self._parent.clear()
+        self._members.clear()
+        self._multi.clear()
+        for request_id, keys in self._keys.items():
+            self._link(request_id, keys)
+        self._dirty = False
+
+    def apply_bookings(self, rows) -> int:
+        """Add or update booking rows; the same list object twice in a row is a no-op."""
+        with self._lock:
+            if rows is self._last_rows:
+                return 0
+            changed = 0
+            for row in rows:
+                request_id = row["request_id"]
+                if "sales_notes" in row or row.get("merged_into"):
+                    if is_merged(row):
+                        self._merged.add(request_id)
+                        if request_id in self._keys:
+                            self._forget(request_id)
+                            changed += 1
+                        continue
+                    self._merged.discard(request_id)
+                elif request_id in self._merged:
+                    continue
+                member = self._rows.setdefault(request_id, {"request_id": request_id})
+                member.update({name: row[name] for name in MEMBER_FIELDS if name in row})
+                keys = blocking_keys(member)
+                old_keys = self._keys.get(request_id)
+                if old_keys == keys:
+                    continue
+                if old_keys is not None:
+                    self._dirty = True
+                    self._count(old_keys, -1)
+                self._keys[request_id] = keys
+                self._count(keys, +1)
+                if not self._dirty:
+                    self._link(request_id, keys)
+                changed += 1
+            self._last_rows = rows
+            return changed
+
+    def _forget(self, request_id):
+        self._count(self._keys.pop(request_id, ()), -1)
+        self._rows.pop(request_id, None)
+        self._dirty = True
+
+    def remove(self, request_ids):
+        with self._lock:
+            for request_id in request_ids:
+                self._forget(request_id)
+
+    def clusters(self, limit=None) -> list:
+        """Duplicate groups (lists of member rows), largest first, newest booking first within a group.
+
+        Only the ``limit`` largest groups are materialised.
+        """
+        with self._lock:
+            if self._dirty:
+                self._rebuild()
+            roots = self._multi
+            if limit is not None:
+                roots = heapq.nlargest(limit, roots, key=lambda root: len(self._members[root]))
+            result = []
+            for root in roots:
+                rows = [dict(self._rows[rid]) for rid in self._members[root]]
+                rows.sort(key=lambda r: str(r.get("booking_timestamp") or ""), reverse=True)
+                result.append(rows)
+            result.sort(key=len, reverse=True)
+            return result
+
+    def cluster_count(self) -> int:
+        with self._lock:
+            if self._dirty:
+                self._rebuild()
+            return len(self._multi)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"bookings": len(self._keys), "keys": len(self._key_owner), "dirty": self._dirty}
+
+
+def pick_primary(rows):
+    """The member to keep: highest score, then most recent booking."""
+    def _rank(row):
+        try:
+            score = int(row.get("numeric_lead_score") or 0)
+        except (TypeError, ValueError):
+            score = 0
+        return (score, str(row.get("booking_timestamp") or ""))
+
+    return max(rows, key=_rank)
+
+
+def merged_fields(primary, rows) -> dict:
+    """Fields to write on the kept booking: the best score and every distinct sales note."""
+    best = pick_primary(rows)
+    notes = []
+    for row in [primary] + [r for r in rows if r["request_id"] != primary["request_id"]]:
+        note = (row.get("sales_notes") or "").strip()
+        if note and note not in notes and not note.startswith(MERGED_NOTE_PREFIX):
+            notes.append(note)
+    score = int(best.get("numeric_lead_score") or 0)
+    return {
+        "numeric_lead_score": score,
+        "lead_score": "Hot" if score >= 10 else ("Warm" if score >= 5 else "Cold"),
+        "sales_notes": "\n".join(notes),
+    }
+
+
+_index = DuplicateIndex()
+
+
+def get_index() -> DuplicateIndex:
+    """Process-wide index shared by all sessions."""
+    return _index
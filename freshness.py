@@ -0,0 +1,168 @@
+"""Adaptive refresh intervals for the dashboard's data caches.
+
+Both data caches used a fixed ``DATA_CACHE_TTL`` of 30 s: too slow during a
+campaign, when email events bump lead scores every second, and wasted
+refreshes at night when nothing changes. ``FreshnessController`` runs a
+cheap change probe per cache on a background thread every
+``FRESHNESS_PROBE_SECONDS``. A probe returns one marker per table behind the
+cache: the latest value of an indexed column that moves on every insert and
+update (``updated_at``), read as a single row. Unlike a row-count estimate
+this is exact and also sees in-place edits. From the probes it keeps a
+decaying estimate of changes per second and picks the cache's TTL as the
+time in which about one change is expected, bounded by
+``FRESHNESS_MIN_TTL`` / ``FRESHNESS_MAX_TTL``.
+
+Process-local caches read the TTL when a cached value is looked up, so a
+change seen after a quiet spell shortens it at once. Entries in the shared
+tier have their expiry fixed when written, so a cache can also be registered
+with ``on_change(signature)``, called from the probe thread with the first
+signature and whenever a probe sees it move. The dashboard publishes it
+through ``shared_cache.SharedCache.advance_marker`` there, so of all the
+replicas only the first to see a change bumps the shared namespace version.
+A write at night is then picked up within about one probe interval rather
+than the long night-time TTL. Until the first probes, and when a probe
+fails, a cache keeps its previous TTL (initially the default).
+``FRESHNESS_ENABLED=0`` keeps the defaults and runs no probes.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+DEFAULT_MIN_TTL = float(os.getenv("FRESHNESS_MIN_TTL", "5"))
+DEFAULT_MAX_TTL = float(os.getenv("FRESHNESS_MAX_TTL", "300"))
+DEFAULT_PROBE_SECONDS = float(os.getenv("FRESHNESS_PROBE_SECONDS", "10"))
+ENABLED = os.getenv("FRESHNESS_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+RATE_SMOOTHING = 0.3  # weight of the newest probe in the change-rate estimate
+PROBE_SAMPLES = 50
+
+
+class CacheFreshness:
+    """Change-rate estimate and TTL for one cache, fed by its probe."""
+
+    def __init__(self, name, probe, default_ttl, min_ttl=DEFAULT_MIN_TTL, max_ttl=DEFAULT_MAX_TTL, on_change=None):
+        self.name = name
+        self.probe = probe  # () -> tuple of the latest marker value per table
+        self.on_change = on_change  # (signature) -> None, called after the first probe and each change
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.ttl = default_ttl
+        self.rate = None  # changes per second
+        self._signature = None
+        self._probed_at = None
+        self._lock = threading.Lock()
+        self._costs = deque(maxlen=PROBE_SAMPLES)
+        self.probes = 0
+        self.failures = 0
+        self.changes = 0
+
+    @staticmethod
+    def _changes(old, new) -> int:
+        """Number of probed tables whose marker moved."""
+        return sum(1 for o, n in zip(old, new) if o != n)
+
+    def observe(self, signature, now=None):
+        """Fold one probe result into the rate estimate and recompute the TTL.
+
+        Returns the changes seen, or None for the first probe (nothing to compare with).
+        """
+        now = time.monotonic() if now is None else now
+        changes = None
+        with self._lock:
+            if self._signature is not None and now > self._probed_at:
+                changes = self._changes(self._signature, signature)
+                self.changes += changes
+                observed = changes / (now - self._probed_at)
+                self.rate = observed if self.rate is None else (
+                    RATE_SMOOTHING * observed + (1 - RATE_SMOOTHING) * self.rate
+                )
+                expected_gap = 1.0 / self.rate if self.rate > 0 else self.max_ttl
+                self.ttl = min(self.max_ttl, max(self.min_ttl, expected_gap))
+            self._signature = signature
+            self._probed_at = now
+        return changes
+
+    def run_probe(self):
+        started = time.perf_counter()
+        try:
+            signature = tuple(self.probe())
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            logging.warning(f"Freshness probe for {self.name} failed, keeping TTL {self.ttl:.0f}s: {e}")
+            return
+        cost = time.perf_counter() - started
+        with self._lock:
+            self.probes += 1
+            self._costs.append(cost)
+        changes = self.observe(signature)
+        if (changes is None or changes > 0) and self.on_change is not None:
+            try:
+                self.on_change(signature)
+            except Exception as e:
+                logging.warning(f"Freshness change handler for {self.name} failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            costs = sorted(self._costs)
+            return {
+                "ttl_s": self.ttl,
+                "changes_per_min": (self.rate or 0.0) * 60,
+                "changes": self.changes,
+                "probes": self.probes,
+                "failures": self.failures,
+                "probe_p50_ms": costs[len(costs) // 2] * 1000 if costs else 0.0,
+                "probe_max_ms": costs[-1] * 1000 if costs else 0.0,
+            }
+
+
+class FreshnessController:
+    def __init__(self, probe_seconds=DEFAULT_PROBE_SECONDS):
+        self.probe_seconds = probe_seconds
+        self._caches = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self, name, probe, default_ttl, **bounds) -> CacheFreshness:
+        """Track cache ``name`` with ``probe``; registering a name again keeps the first one."""
+        with self._lock:
+            cache = self._caches.get(name)
+            if cache is None:
+                cache = CacheFreshness(name, probe, default_ttl, **bounds)
+                self._caches[name] = cache
+            return cache
+
+    def ttl(self, name, default):
+        with self._lock:
+            cache = self._caches.get(name)
+        return default if cache is None else cache.ttl
+
+    def start(self):
+        """Start the probe loop once per process (not at all when ``FRESHNESS_ENABLED`` is off)."""
+        with self._lock:
+            if self._thread is not None or not ENABLED:
+                return
+            self._thread = threading.Thread(target=self._loop, name="freshness", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                caches = list(self._caches.values())
+            for cache in caches:
+                cache.run_probe()
+            time.sleep(self.probe_seconds)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            caches = dict(self._caches)
+        return {name: cache.stats() for name, cache in caches.items()}
+
+
+_controller = FreshnessController()
+
+
+def get_controller() -> FreshnessController:
+    """Process-wide controller shared by all sessions."""
+    return _controller
@@ -0,0 +1,386 @@
+"""Crash-safe, buffered logging of email interaction events.
+
+The UI path only appends the event to a local append-only write-ahead log
+(one JSON object per line, fsynced). A daemon worker drains pending events
+into ``email_interactions`` in bulk writes, retrying with jittered
+exponential backoff while Supabase is slow or down. Events are deduplicated
+by ``(request_id, event_type, timestamp)``: keys that made it to the
+database are appended to a ``.done`` file, so a restart replays only what
+was never flushed. Once everything is flushed both files are truncated.
+
+Each process writes its own ``interactions-<pid>-<id>.wal`` / ``.done``
+pair and holds an exclusive ``flock`` on the matching ``.lock`` file for as
+long as it runs, so replicas sharing the queue directory never truncate or
+replay each other's files. On startup a process adopts the files of
+processes that are gone (their lock can be taken) and removes them.
+
+Every event carries an ``event_id`` derived from its dedup key, and the
+sink is expected to write idempotently on it (an upsert ignoring
+duplicates), so a crash between the write and the ``.done`` append cannot
+duplicate rows. A sink that raises ``RejectedRows`` (a non-retryable
+error such as a foreign key violation) gets the batch split in halves until
+the offending rows are isolated; those are moved to
+``interactions.quarantine`` instead of being retried forever. Schema or
+configuration errors (a missing column or constraint, a bad request) are
+not about the rows: ``supabase_sink`` raises ``SinkMisconfigured`` for them,
+which is retried like an outage and logged as an error, and the queue's
+``stats()`` report it so the dashboard can alert.
+
+The ``event_id`` column and its unique constraint come from
+``supabase/migrations/*_email_interactions_event_id.sql``.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+
+DEFAULT_QUEUE_DIR = os.getenv("INTERACTION_QUEUE_DIR", ".queue")
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 2.0
+MAX_BACKOFF_SECONDS = 60.0
+RECENT_KEYS_LIMIT = 10000
+EVENT_ID_NAMESPACE = uuid.UUID("6f1c3a52-5e0b-4a9e-9a51-0d7f3c2b8e41")
+
+
+# SQLSTATE classes that mean the rows themselves were refused: data exceptions (22) and
+# integrity violations such as a missing booking (23).
+REJECTED_ROW_ERRORS = ("22", "23")
+# Undefined column/constraint (42) and PostgREST request/schema-cache errors: the setup is wrong, not the rows.
+MISCONFIGURED_ERRORS = ("42", "PGRST1", "PGRST2")
+
+
+class RejectedRows(Exception):
+    """Raised by a sink when the rows themselves were refused and retrying cannot help."""
+
+
+class SinkMisconfigured(Exception):
+    """Raised by a sink when the table or request is wrong; retried, and reported as an alert."""
+
+
+def supabase_sink(client, table):
+    """``insert_rows`` writing idempotently to ``table`` (unique ``event_id``), classifying PostgREST errors."""
+    def insert_rows(rows):
+        try:
+            client.from_(table).upsert(
+                rows, on_conflict="event_id", ignore_duplicates=True, returning=ReturnMethod.minimal
+            ).execute()
+        except APIError as e:
+            code = e.code or ""
+            if code.startswith(REJECTED_ROW_ERRORS):
+                raise RejectedRows(f"{code}: {e.message}") from e
+            if code.startswith(MISCONFIGURED_ERRORS):
+                raise SinkMisconfigured(f"{table} rejected the write ({code}: {e.message})") from e
+            raise
+    return insert_rows
+
+
+def event_key(event):
+    return (str(event.get("request_id")), str(event.get("event_type")), str(event.get("timestamp")))
+
+
+def event_id(event) -> str:
+    """Stable id of an event, the same on every replay; the table's unique key."""
+    return str(uuid.uuid5(EVENT_ID_NAMESPACE, "\x1f".join(event_key(event))))
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _read_jsonl(path):
+    """Yield parsed lines, skipping a torn last line left by a crash mid-write."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping unreadable line in {path}")
+
+
+class InteractionQueue:
+    """Write-ahead queue flushed to Supabase by a background worker.
+
+    ``insert_rows`` is called with a list of row dicts and must raise on
+    failure (``RejectedRows`` when the rows can never be written); it is the
+    only place that touches the network.
+    """
+
+    def __init__(self, insert_rows, queue_dir=DEFAULT_QUEUE_DIR, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, start_worker=True):
+        self.insert_rows = insert_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        os.makedirs(queue_dir, exist_ok=True)
+        self.queue_dir = queue_dir
+        base = os.path.join(queue_dir, f"interactions-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        self.wal_path = base + ".wal"
+        self.done_path = base + ".done"
+        self.lock_path = base + ".lock"
+        self.quarantine_path = os.path.join(queue_dir, "interactions.quarantine")
+        self._lock_fd = self._acquire_lock()
+
+        self._lock = threading.Lock()          # guards files and in-memory state
+        self._flush_lock = threading.Lock()    # one flush at a time
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._recent = OrderedDict()           # flushed keys, survives compaction
+        self._pending = OrderedDict()          # key -> event, in append order
+
+        self.flushed_total = 0
+        self.quarantined_total = 0
+        self.failed_attempts = 0
+        self.last_flush_at = None
+        self.last_error = None
+        self.misconfigured = None  # message of the last SinkMisconfigured, cleared by a good flush
+        self._backoff = 0.0
+
+        self._recover()
+        self._worker = None
+        if start_worker:
+            self._worker = threading.Thread(target=self._run, name="interaction-queue", daemon=True)
+            self._worker.start()
+            atexit.register(self.close)
+
+    # --- UI path -----------------------------------------------------------
+    def append(self, events):
+        """Durably record events locally; never touches the network."""
+        events = [e for e in events if e]
+        if not events:
+            return 0
+        added = 0
+        with self._lock:
+            lines = []
+            for event in events:
+                key = event_key(event)
+                if key in self._pending or key in self._recent:
+                    continue
+                event = dict(event, event_id=event.get("event_id") or event_id(event))
+                self._pending[key] = event
+                lines.append(json.dumps(event, default=str))
+                added += 1
+            if lines:
+                self._append_lines(lines)
+        if added:
+            self._wake.set()
+        return added
+
+    # --- worker ------------------------------------------------------------
+    def flush(self):
+        """Write pending events in bulk; returns the number flushed or quarantined."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending.items())[: self.batch_size]
+            if not batch:
+                return 0
+            try:
+                flushed, rejected = self._write(batch)
+            except Exception as e:
+                with self._lock:
+                    self.failed_attempts += 1
+                    self.last_error = str(e)
+                    self._backoff = min(MAX_BACKOFF_SECONDS, max(1.0, self._backoff * 2))
+                    if isinstance(e, SinkMisconfigured):
+                        self.misconfigured = str(e)
+                if isinstance(e, SinkMisconfigured):
+                    logging.error(f"Interaction queue cannot write ({len(batch)} pending, kept for retry): {e}")
+                else:
+                    logging.warning(f"Interaction queue flush failed ({len(batch)} pending), will retry: {e}")
+                return 0
+            with self._lock:
+                keys = [key for key, _ in flushed + rejected]
+                with open(self.done_path, "a", encoding="utf-8") as fh:
+                    fh.write("\n".join(json.dumps(list(k)) for k in keys) + "\n")
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                for key in keys:
+                    self._pending.pop(key, None)
+                    self._remember(key)
+                self.flushed_total += len(flushed)
+                self.quarantined_total += len(rejected)
+                self.last_flush_at = time.time()
+                self.last_error = None
+                self.misconfigured = None
+                self._backoff = 0.0
+                if not self._pending:
+                    self._compact()
+            logging.info(f"Flushed {len(flushed)} email interaction(s) to Supabase.")
+            return len(keys)
+
+    def _write(self, batch):
+        """Write ``batch`` as (flushed, rejected) lists, bisecting around rejected rows.
+
+        A retryable error propagates; halves already written are sent again on
+        the retry, which the idempotent sink absorbs.
+        """
+        try:
+            self.insert_rows([event for _, event in batch])
+            return batch, []
+        except RejectedRows as e:
+            if len(batch) == 1:
+                self._quarantine(batch[0][1], e)
+                return [], batch
+        middle = len(batch) // 2
+        first_flushed, first_rejected = self._write(batch[:middle])
+        second_flushed, second_rejected = self._write(batch[middle:])
+        return first_flushed + second_flushed, first_rejected + second_rejected
+
+    def _quarantine(self, event, error):
+        logging.error(f"Quarantining email interaction {event_key(event)} rejected by Supabase: {error}")
+        line = json.dumps({"event": event, "error": str(error), "quarantined_at": time.time()}, default=str)
+        with open(self.quarantine_path, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def flush_all(self):
+        while self.flush():
+            pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                backoff = self._backoff
+            if backoff:
+                # Jittered backoff so replicas don't retry in lockstep.
+                self._stop.wait(backoff * random.uniform(0.5, 1.0))
+            else:
+                self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush_all()
+            except Exception as e:
+                logging.error(f"Interaction queue worker error: {e}", exc_info=True)
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        try:
+            self.flush_all()
+        except Exception:
+            pass
+        # Leave unflushed files for the next process to adopt; remove them when empty.
+        with self._lock:
+            if not self._pending:
+                for path in (self.wal_path, self.done_path, self.lock_path):
+                    _unlink(path)
+
+    # --- recovery ----------------------------------------------------------
+    def _acquire_lock(self):
+        """Lock this process's files; the lock is created under a temp name so it is never seen unlocked."""
+        tmp_path = self.lock_path + ".tmp"
+        fd = os.open(tmp_path, os.O_CREAT | os.O_RDWR, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.rename(tmp_path, self.lock_path)
+        return fd
+
+    def _recover(self):
+        """Adopt the unflushed events of processes that are gone, then remove their files."""
+        orphans, held = [], []
+        try:
+            for lock_path in sorted(glob.glob(os.path.join(self.queue_dir, "interactions-*.lock"))):
+                if lock_path == self.lock_path:
+                    continue
+                try:
+                    fd = os.open(lock_path, os.O_RDWR)
+                except FileNotFoundError:
+                    continue
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    os.close(fd)  # owner still running
+                    continue
+                held.append(fd)
+                base = lock_path[: -len(".lock")]
+                orphans.append((base + ".wal", base + ".done", lock_path))
+            # The single shared pair written by earlier versions; the rename makes one process its owner.
+            legacy = os.path.join(self.queue_dir, "interactions")
+            claimed = self.wal_path[: -len(".wal")] + "-legacy"
+            for suffix in (".wal", ".done"):
+                try:
+                    os.rename(legacy + suffix, claimed + suffix)
+                except FileNotFoundError:
+                    pass
+            orphans.append((claimed + ".wal", claimed + ".done", None))
+
+            for wal_path, done_path, _ in orphans:
+                self._adopt(wal_path, done_path)
+            self._compact()
+            if self._pending:
+                self._append_lines(json.dumps(event, default=str) for event in self._pending.values())
+                logging.info(f"Recovered {len(self._pending)} unflushed email interaction(s) into {self.wal_path}.")
+            # Only now that the events are in this process's WAL can the orphans go.
+            for paths in orphans:
+                for path in paths:
+                    if path:
+                        _unlink(path)
+        finally:
+            for fd in held:
+                os.close(fd)
+
+    def _adopt(self, wal_path, done_path):
+        done = {tuple(k) for k in _read_jsonl(done_path)}
+        for event in _read_jsonl(wal_path):
+            key = event_key(event)
+            if key not in done and key not in self._pending:
+                self._pending[key] = dict(event, event_id=event.get("event_id") or event_id(event))
+        for key in done:
+            self._remember(key)
+
+    def _append_lines(self, lines):
+        with open(self.wal_path, "a", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def _compact(self):
+        for path in (self.wal_path, self.done_path):
+            with open(path, "w", encoding="utf-8"):
+                pass
+
+    def _remember(self, key):
+        self._recent[key] = None
+        while len(self._recent) > RECENT_KEYS_LIMIT:
+            self._recent.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "flushed_total": self.flushed_total,
+                "quarantined_total": self.quarantined_total,
+                "failed_attempts": self.failed_attempts,
+                "last_flush_at": self.last_flush_at,
+                "last_error": self.last_error,
+                "misconfigured": self.misconfigured,
+            }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue(insert_rows, **kwargs) -> InteractionQueue:
+    """Process-wide queue; the first caller's ``insert_rows`` becomes the sink."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = InteractionQueue(insert_rows, **kwargs)
+        return _queue
@@ -0,0 +1,257 @@
+"""Date-range-aware cache for bookings.
+
+``fetch_bookings_data`` used to cache on the exact ``(location, start, end)``
+tuple, so moving the end date by one day or switching between "All
+Locations" and a city refetched rows the process already had.
+``IntervalCache`` instead remembers which booking days it holds (for all
+locations) and when each was fetched. A request for ``start..end``:
+
+* works out the missing or expired days and coalesces them into as few
+  contiguous sub-intervals as possible;
+* fetches only those, through the caller's ``fetch_range(first_day, last_day)``;
+* answers from the merged rows, applying equality filters (the location)
+  locally.
+
+Concurrent requests only wait for each other where their days overlap: a
+caller claims the missing days nobody is fetching yet, fetches those, and
+waits for the days another caller already has in flight. Eviction never
+drops a day of a request that is still being served.
+
+Rows are bucketed by the UTC day of ``booking_timestamp``. A change of data
+version (a write on any replica, see ``shared_cache``) drops the days the
+caller's ``changes(old_version, new_version)`` names, or everything held
+when it cannot say.
+"""
+import threading
+import time
+from datetime import date, timedelta
+
+DEFAULT_MAX_ROWS = 200_000
+
+
+def booking_day(row, column="booking_timestamp"):
+    value = row.get(column)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def missing_intervals(days, start, end, ttl, now=None):
+    """Contiguous (first, last) day ranges in ``start..end`` not fetched within ``ttl``."""
+    now = time.time() if now is None else now
+    gaps, gap_start = [], None
+    day = start
+    while day <= end:
+        fetched_at = days.get(day)
+        fresh = fetched_at is not None and now - fetched_at < ttl
+        if not fresh and gap_start is None:
+            gap_start = day
+        elif fresh and gap_start is not None:
+            gaps.append((gap_start, day - timedelta(days=1)))
+            gap_start = None
+        day += timedelta(days=1)
+    if gap_start is not None:
+        gaps.append((gap_start, end))
+    return gaps
+
+
+class IntervalCache:
+    def __init__(self, name, max_rows=DEFAULT_MAX_ROWS, column="booking_timestamp"):
+        self.name = name
+        self.max_rows = max_rows
+        self.column = column
+        self._days = {}  # day -> fetched_at
+        self._rows = {}  # day -> {request_id: row}
+        self._version = None
+        self._scope = None  # (held version, new version, changed days) looked up for the next version change
+        self._in_flight = {}  # day -> Event set when the caller fetching it is done
+        self._serving = []  # (start, end) of requests in progress; never evicted
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.fetched_days = 0
+        self.fetched_rows = 0
+
+    def get(self, start, end, fetch_range, ttl, version=None, match=None, changes=None):
+        """Rows with a booking day in ``start..end`` (inclusive), newest first.
+
+        ``match`` is an optional ``{column: value}`` filter applied locally.
+        ``changes(old_version, new_version)`` returns the days (dates or ISO
+        strings) that changed between two versions, or None for all of them.
+        Exceptions from ``fetch_range`` propagate; days already held stay cached.
+        """
+        held = self._version
+        scope = None
+        if changes is not None and version is not None and held is not None and version != held:
+            changed = changes(held, version)  # may hit the shared backend, so outside the lock
+            scope = (held, version, None if changed is None else {date.fromisoformat(str(d)[:10]) for d in changed})
+        with self._lock:
+            if scope is not None:
+                self._scope = scope
+            self._serving.append((start, end))
+        try:
+            counted = False
+            while True:
+                with self._lock:
+                    self._check_version(version)
+                    gaps = missing_intervals(self._days, start, end, ttl)
+                    if not counted:
+                        self._count(start, end, gaps)
+                        counted = True
+                    owned, waits, done = self._claim(gaps)
+                    current = self._version
+                try:
+                    for first, last in owned:
+                        self._store(first, last, fetch_range(first, last), current)
+                finally:
+                    if owned:
+                        with self._lock:
+                            for day in [d for d, event in self._in_flight.items() if event is done]:
+                                del self._in_flight[day]
+                        done.set()
+                for event in waits:
+                    event.wait()
+                rows = self._select(start, end, match)
+                if rows is not None:
+                    return rows
+                # A day was invalidated, or another caller's fetch failed; look again.
+        finally:
+            with self._lock:
+                self._serving.remove((start, end))
+
+    def _count(self, start, end, gaps):
+        requested = (end - start).days + 1
+        missing = sum((last - first).days + 1 for first, last in gaps)
+        if not gaps:
+            self.hits += 1
+        elif missing == requested:
+            self.misses += 1
+        else:
+            self.partial_hits += 1
+
+    def _claim(self, gaps):
+        """Split ``gaps`` into ranges this caller fetches and events of days already in flight.
+
+        Called with ``_lock`` held.
+        """
+        done = threading.Event()
+        owned, waits = [], set()
+        for first, last in gaps:
+            run_start = None
+            day = first
+            while day <= last:
+                event = self._in_flight.get(day)
+                if event is None:
+                    self._in_flight[day] = done
+                    if run_start is None:
+                        run_start = day
+                else:
+                    waits.add(event)
+                    if run_start is not None:
+                        owned.append((run_start, day - timedelta(days=1)))
+                        run_start = None
+                day += timedelta(days=1)
+            if run_start is not None:
+                owned.append((run_start, last))
+        return owned, waits, done
+
+    def _check_version(self, version):
+        if version is None or version == self._version:
+            return
+        held, new, changed = self._scope or (None, None, None)
+        if changed is not None and held == self._version and new == version:
+            for day in changed:
+                self._days.pop(day, None)
+                self._rows.pop(day, None)
+        else:
+            self._days.clear()
+            self._rows.clear()
+        self._version = version
+        self._scope = None
+
+    def _store(self, first, last, rows, version=None):
+        buckets = {}
+        for row in rows:
+            day = booking_day(row, self.column)
+            if day is not None and first <= day <= last:
+                buckets.setdefault(day, {})[row["request_id"]] = row
+        fetched_at = time.time()
+        with self._lock:
+            if version == self._version:  # otherwise the data changed while fetching
+                day = first
+                while day <= last:
+                    self._days[day] = fetched_at
+                    self._rows[day] = buckets.get(day, {})
+                    day += timedelta(days=1)
+                self._evict()
+        self.fetches += 1
+        self.fetched_days += (last - first).days + 1
+        self.fetched_rows += len(rows)
+
+    def _evict(self):
+        """Drop the longest-held days until under ``max_rows``, never a day of a request being served."""
+        total = sum(len(bucket) for bucket in self._rows.values())
+        if total <= self.max_rows:
+            return
+        for day in sorted(self._days, key=self._days.get):
+            if any(first <= day <= last for first, last in self._serving):
+                continue
+            total -= len(self._rows.pop(day, {}))
+            del self._days[day]
+            if total <= self.max_rows:
+                break
+
+    def _select(self, start, end, match):
+        """Rows of ``start..end``, or None if a day of the range is not held (evicted or invalidated)."""
+        with self._lock:
+            rows = []
+            day = start
+            while day <= end:
+                bucket = self._rows.get(day)
+                if bucket is None:
+                    return None
+                rows.extend(bucket.values())
+                day += timedelta(days=1)
+        if match:
+            rows = [r for r in rows if all(r.get(col) == value for col, value in match.items())]
+        rows.sort(key=lambda r: str(r.get(self.column) or ""), reverse=True)
+        return [dict(r) for r in rows]
+
+    def invalidate(self):
+        with self._lock:
+            self._days.clear()
+            self._rows.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            days = len(self._days)
+            rows = sum(len(bucket) for bucket in self._rows.values())
+        return {
+            "days": days,
+            "rows": rows,
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "fetches": self.fetches,
+            "fetched_days": self.fetched_days,
+            "fetched_rows": self.fetched_rows,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name) -> IntervalCache:
+    """Process-wide interval cache per name, shared by all sessions."""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = IntervalCache(name)
+            _caches[name] = cache
+        return cache
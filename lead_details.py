@@ -0,0 +1,90 @@
+"""Per-lead cache for the heavy text fields kept out of the lead list.
+
+The list query used to carry ``bookings.sales_notes`` and
+``ai_lead_insights.rolling_summary`` for every lead in view, although both
+are only shown inside an opened card. The list now selects narrow columns
+and the text lives here: ``get_many`` returns cached details and fetches
+only the missing or expired ids, in one batch, so opening a card costs one
+small query and bulk actions (precompute, bulk drafts) one query for the
+leads they touch.
+
+Entries are dropped when the caller's ``version`` changes (the shared cache
+version of the underlying tables, bumped on every write) and are otherwise
+valid for ``ttl`` seconds. The map is an LRU bounded by ``max_items``.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ITEMS = int(os.getenv("LEAD_DETAILS_MAX_ITEMS", "5000"))
+
+
+class DetailCache:
+    def __init__(self, max_items=DEFAULT_MAX_ITEMS):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # request_id -> (fetched_at, details)
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    def _check_version(self, version):
+        if version is not None and version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get_many(self, request_ids, fetch, ttl, version=None) -> dict:
+        """``{request_id: details}``; ``fetch(missing_ids)`` returns the same shape for the ids it finds.
+
+        Ids ``fetch`` does not return are cached as ``{}`` so they are not asked for again until expiry.
+        """
+        request_ids = list(dict.fromkeys(request_ids))
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            self._check_version(version)
+            for request_id in request_ids:
+                entry = self._entries.get(request_id)
+                if entry is not None and now - entry[0] < ttl:
+                    self._entries.move_to_end(request_id)
+                    found[request_id] = entry[1]
+                else:
+                    missing.append(request_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        if not missing:
+            return found
+        fetched = fetch(missing)
+        with self._lock:
+            self.fetches += 1
+            self._check_version(version)
+            for request_id in missing:
+                details = fetched.get(request_id) or {}
+                self._entries[request_id] = (now, details)
+                self._entries.move_to_end(request_id)
+                found[request_id] = details
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+        return found
+
+    def invalidate(self, request_ids=None):
+        with self._lock:
+            if request_ids is None:
+                self._entries.clear()
+            else:
+                for request_id in request_ids:
+                    self._entries.pop(request_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"leads": len(self._entries), "hits": self.hits, "misses": self.misses, "fetches": self.fetches}
+
+
+_cache = DetailCache()
+
+
+def get_cache() -> DetailCache:
+    """Process-wide detail cache shared by all sessions."""
+    return _cache
@@ -0,0 +1,206 @@
+"""Export of the filtered lead view to CSV or Parquet.
+
+Rows are paged out of Supabase with keyset pagination on
+``(booking_timestamp DESC, request_id DESC)``, so each page is an indexed
+range scan rather than a growing OFFSET. Each page is written straight to a
+temporary file and dropped, so building the file holds one page at a time.
+The finished file is handed over as bytes, though: ``st.download_button``
+keeps the whole payload in Streamlit's in-memory media storage, and the app
+has no separate file endpoint to stream from, so an export costs its full
+size in server memory while the download is offered. Exports are therefore
+capped at ``EXPORT_MAX_ROWS`` rows (default 50000), newest first. A capped
+file ends with a ``TRUNCATED`` marker row saying where it stopped, and
+``count_leads`` lets the dashboard warn before the download and ask the rep
+to confirm a truncated export. The dashboard hands ``build_export`` to
+``st.download_button`` as a callable, so the file is only built when the rep
+clicks download.
+"""
+import csv
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+EXPORT_COLUMNS = [
+    "request_id", "full_name", "email", "vehicle", "booking_date", "current_vehicle", "location",
+    "time_frame", "action_status", "sales_notes", "lead_score", "numeric_lead_score", "booking_timestamp",
+]
+PAGE_SIZE = 1000
+EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", "50000"))
+
+# numeric_lead_score ranges per tier, matching label_from_numeric (Hot >= 10, Warm >= 5).
+TIER_RANGES = {"Cold": (None, 5), "Warm": (5, 10), "Hot": (10, None)}
+
+
+def _tier_of(score):
+    try:
+        n = int(score or 0)
+    except (TypeError, ValueError):
+        n = 0
+    return "Hot" if n >= 10 else ("Warm" if n >= 5 else "Cold")
+
+
+def _quote(value):
+    return '"' + str(value).replace('"', '\\"') + '"'
+
+
+def _score_bounds(tiers):
+    """Server-side score range covering the union of ``tiers`` (None = unbounded)."""
+    tiers = [t for t in (tiers or []) if t in TIER_RANGES]
+    if not tiers or len(tiers) == len(TIER_RANGES):
+        return None, None
+    lows = [TIER_RANGES[t][0] for t in tiers]
+    highs = [TIER_RANGES[t][1] for t in tiers]
+    return (None if None in lows else min(lows)), (None if None in highs else max(highs))
+
+
+def _apply_filters(query, location, start_date, end_date, statuses, low, high):
+    query = query.is_("merged_into", "null")  # duplicates folded into another lead
+    if location and location != "All Locations":
+        query = query.eq("location", location)
+    if start_date:
+        query = query.gte("booking_timestamp", start_date.isoformat())
+    if end_date:
+        query = query.lte("booking_timestamp", (end_date + timedelta(days=1)).isoformat())
+    if statuses:
+        query = query.in_("action_status", list(statuses))
+    if low is not None:
+        query = query.gte("numeric_lead_score", low)
+    if high is not None:
+        query = query.lt("numeric_lead_score", high)
+    return query
+
+
+def count_leads(supabase, table, location=None, start_date=None, end_date=None, tiers=None, statuses=None) -> int:
+    """Exact number of rows the server-side filters match.
+
+    An upper bound for non-contiguous tier selections (Cold + Hot), which
+    ``iter_lead_pages`` trims client-side.
+    """
+    low, high = _score_bounds(tiers)
+    query = supabase.from_(table).select("request_id", count="exact").limit(1)
+    return _apply_filters(query, location, start_date, end_date, statuses, low, high).execute().count or 0
+
+
+def iter_lead_pages(supabase, table, location=None, start_date=None, end_date=None,
+                    tiers=None, statuses=None, page_size=PAGE_SIZE):
+    """Yield lists of booking rows matching the dashboard filters, newest first."""
+    tiers = [t for t in (tiers or []) if t in TIER_RANGES]
+    # Bound the score range server-side by the union of the selected tiers;
+    # non-contiguous selections (Cold + Hot) are trimmed per page below.
+    low, high = _score_bounds(tiers)
+
+    cursor = None
+    while True:
+        query = (
+            supabase.from_(table)
+            .select(", ".join(EXPORT_COLUMNS))
+            .order("booking_timestamp", desc=True)
+            .order("request_id", desc=True)
+            .limit(page_size)
+        )
+        query = _apply_filters(query, location, start_date, end_date, statuses, low, high)
+        if cursor is not None:
+            ts, rid = cursor
+            query = query.or_(
+                f"booking_timestamp.lt.{_quote(ts)},"
+                f"and(booking_timestamp.eq.{_quote(ts)},request_id.lt.{_quote(rid)})"
+            )
+        rows = query.execute().data or []
+        if not rows:
+            return
+        cursor = (rows[-1]["booking_timestamp"], rows[-1]["request_id"])
+        if tiers:
+            rows = [r for r in rows if _tier_of(r.get("numeric_lead_score")) in tiers]
+        if rows:
+            yield rows
+        if cursor[0] is None:
+            return  # cannot page past NULL timestamps with a keyset
+        if len(rows) < page_size and not tiers:
+            return
+
+
+def write_csv(pages, path) -> int:
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for page in pages:
+            writer.writerows(page)
+            count += len(page)
+    return count
+
+
+PARQUET_SCHEMA = pa.schema(
+    [(name, pa.int64() if name == "numeric_lead_score" else pa.string()) for name in EXPORT_COLUMNS]
+)
+
+
+def write_parquet(pages, path) -> int:
+    """One row group per page; only the current page is ever materialised."""
+    count = 0
+    with pq.ParquetWriter(path, PARQUET_SCHEMA, compression="snappy") as writer:
+        for page in pages:
+            columns = {
+                name: [
+                    (int(r[name]) if r.get(name) is not None else None) if name == "numeric_lead_score"
+                    else (None if r.get(name) is None else str(r[name]))
+                    for r in page
+                ]
+                for name in EXPORT_COLUMNS
+            }
+            writer.write_table(pa.table(columns, schema=PARQUET_SCHEMA))
+            count += len(page)
+    return count
+
+
+WRITERS = {"csv": (write_csv, "text/csv"), "parquet": (write_parquet, "application/vnd.apache.parquet")}
+
+
+TRUNCATION_MARKER = "TRUNCATED"
+
+
+def truncation_row(max_rows) -> dict:
+    """Last row of a capped export, so the file itself says it is incomplete."""
+    return {
+        "request_id": TRUNCATION_MARKER,
+        "full_name": f"Export stopped at {max_rows:,} rows (EXPORT_MAX_ROWS); narrow the filters to export the rest.",
+    }
+
+
+def capped_pages(pages, max_rows):
+    """Pass ``pages`` through up to ``max_rows`` rows; if more follow, end with ``truncation_row``."""
+    remaining = max_rows
+    for page in pages:
+        if len(page) > remaining:
+            if remaining > 0:
+                yield page[:remaining]
+            logging.warning(f"Export truncated at {max_rows} row(s) (EXPORT_MAX_ROWS).")
+            yield [truncation_row(max_rows)]
+            return
+        remaining -= len(page)
+        yield page
+
+
+def build_export(fmt, pages, max_rows=EXPORT_MAX_ROWS) -> bytes:
+    """Spool at most ``max_rows`` rows of ``pages`` to a temp file in ``fmt`` and return its bytes.
+
+    The temp file is closed and removed before returning, so nothing is left
+    behind on disk.
+    """
+    writer, _ = WRITERS[fmt]
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}", prefix="leads_export_")
+    os.close(fd)
+    try:
+        count = writer(capped_pages(pages, max_rows), path)
+        logging.info(f"Exported {count} lead(s) to {fmt}.")
+        with open(path, "rb") as fh:
+            return fh.read()
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -0,0 +1,121 @@
+"""Process-wide, read-only lead frame shared by all sessions.
+
+Every rerun of every session used to turn the bookings list into its own
+``pd.DataFrame``, parse ``booking_timestamp`` and sort it, so ten reps meant
+ten full copies and ten sorts of the same rows each time anything was
+clicked. The list itself is already shared (``swr_cache`` hands every
+session the same object until a refresh replaces it), so the frame can be
+too: ``get_table`` builds one ``LeadTable`` per fetched list, i.e. once per
+data version and location/date filter, and every session reuses it.
+
+* The frame is built, parsed and sorted once. Sessions must treat it as
+  read-only; under pandas copy-on-write a stray assignment copies instead of
+  corrupting the shared frame. String columns use pandas' Arrow-backed
+  string dtype where pandas enables it.
+* Tier labels are precomputed once, so the tier/status filters are boolean
+  masks over shared arrays. Without filters a session gets the shared frame
+  itself; each distinct filter's view is built once and shared by every
+  session using that filter.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import single_flight
+
+MAX_TABLES = 16
+MAX_VIEWS = 32
+
+
+def tier_labels(scores) -> np.ndarray:
+    """Vectorised ``label_from_numeric``: Hot >= 10, Warm >= 5, else Cold (unparseable scores are 0)."""
+    numeric = np.trunc(pd.to_numeric(pd.Series(scores, dtype=object), errors="coerce").fillna(0).to_numpy(dtype=np.float64))
+    return np.where(numeric >= 10, "Hot", np.where(numeric >= 5, "Warm", "Cold"))
+
+
+class LeadTable:
+    def __init__(self, rows):
+        self.rows = rows  # the list this table was built from; identity marks the data version
+        frame = pd.DataFrame(rows)
+        frame["booking_timestamp"] = pd.to_datetime(frame["booking_timestamp"])
+        self.frame = frame.sort_values(by="booking_timestamp", ascending=False)
+        self._tiers = tier_labels(self.frame["numeric_lead_score"])
+        self._statuses = self.frame["action_status"].to_numpy(dtype=object)
+        self._lock = threading.Lock()
+        self._views = OrderedDict()
+
+    def view(self, tiers=None, statuses=None) -> pd.DataFrame:
+        """Rows in any of ``tiers`` and ``statuses`` (empty means no filter), newest first. Do not mutate."""
+        if not tiers and not statuses:
+            return self.frame
+        key = (frozenset(tiers or ()), frozenset(statuses or ()))
+        with self._lock:
+            view = self._views.get(key)
+            if view is not None:
+                self._views.move_to_end(key)
+                return view
+        mask = np.ones(len(self.frame), dtype=bool)
+        if tiers:
+            mask &= np.isin(self._tiers, list(tiers))
+        if statuses:
+            mask &= np.isin(self._statuses, list(statuses))
+        view = self.frame[mask]
+        with self._lock:
+            self._views[key] = view
+            while len(self._views) > MAX_VIEWS:
+                self._views.popitem(last=False)
+        return view
+
+
+class TableRegistry:
+    def __init__(self, max_tables=MAX_TABLES):
+        self.max_tables = max_tables
+        self._lock = threading.Lock()
+        self._tables = OrderedDict()  # fetch key -> LeadTable
+        self.builds = 0
+        self.reuses = 0
+
+    def get(self, key, rows) -> LeadTable:
+        """The table for ``rows`` (fetched under ``key``); rebuilt only when a new list arrives."""
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None and table.rows is rows:
+                self._tables.move_to_end(key)
+                self.reuses += 1
+                return table
+        table = single_flight.get_group("lead_table").do((key, id(rows)), lambda: self._build(rows))
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+        return table
+
+    def _build(self, rows):
+        table = LeadTable(rows)
+        with self._lock:
+            self.builds += 1
+        return table
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tables": len(self._tables),
+                "rows": sum(len(t.frame) for t in self._tables.values()),
+                "builds": self.builds,
+                "reuses": self.reuses,
+            }
+
+
+_registry = TableRegistry()
+
+
+def get_table(key, rows) -> LeadTable:
+    """Shared table for the bookings list fetched under ``key``."""
+    return _registry.get(key, rows)
+
+
+def stats() -> dict:
+    return _registry.stats()
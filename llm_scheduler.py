@@ -0,0 +1,301 @@
+"""Process-wide governor for OpenAI chat completions.
+
+Every Streamlit session on a dyno used to call ``chat.completions.create``
+directly, so a handful of reps drafting at once could trip OpenAI rate limits.
+All calls now go through one ``LLMScheduler`` per process:
+
+* two token buckets, one for requests/minute and one for tokens/minute
+  (prompt estimate + ``max_tokens``, reconciled with the reported usage);
+* a priority queue served by a fixed pool of workers, so interactive drafts
+  overtake background precompute work. Workers never sleep while holding a
+  slot: a job that has to wait for the rate limits, or for a 429 backoff, goes
+  back on the queue with a not-before time and the worker picks the best job
+  that is ready now. ``INTERACTIVE_RESERVED`` workers only ever run
+  interactive jobs, so background work cannot occupy every slot;
+* retry with full-jitter exponential backoff on HTTP 429;
+* backpressure: background submissions are refused once the queue is full;
+* queue depth / wait time metrics for the instrumentation panel.
+
+``GovernedClient`` wraps an ``openai.OpenAI`` instance and exposes the same
+``client.chat.completions.create(...)`` call, so call sites do not change.
+Identical non-streaming requests made while one is already queued or running
+share its response (``single_flight``) instead of spending a second slot.
+"""
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import single_flight
+
+INTERACTIVE = 0
+BACKGROUND = 10
+
+DEFAULT_MAX_RPM = int(os.getenv("OPENAI_MAX_RPM", "500"))
+DEFAULT_MAX_TPM = int(os.getenv("OPENAI_MAX_TPM", "90000"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+DEFAULT_MAX_QUEUE = int(os.getenv("OPENAI_MAX_QUEUE", "200"))
+INTERACTIVE_RESERVED = int(os.getenv("OPENAI_INTERACTIVE_RESERVED", "2"))
+MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+WAIT_SAMPLES = 500
+
+
+class SchedulerOverloaded(RuntimeError):
+    """Raised instead of queueing when the scheduler is already saturated."""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at ``rate_per_minute``."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def shortfall(self, amount) -> float:
+        """Seconds until ``amount`` tokens are available (0 if they are now); takes nothing."""
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill()
+            return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def reserve(self, amount):
+        """Take ``amount`` tokens and return how long to wait before they are covered."""
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, delta):
+        """Give back (negative delta) or charge extra tokens after the fact."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+def is_rate_limited(exc) -> bool:
+    if getattr(exc, "status_code", None) == 429:
+        return True
+    return type(exc).__name__ == "RateLimitError"
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(kwargs) -> int:
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in kwargs.get("messages") or [])
+    return prompt_chars // 4 + int(kwargs.get("max_tokens") or 256)
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "enqueued", "fn", "tokens", "future", "attempt", "not_before")
+
+    def __init__(self, priority, seq, fn, tokens, future):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.fn = fn
+        self.tokens = tokens
+        self.future = future
+        self.attempt = 0
+        self.not_before = 0.0
+
+
+class LLMScheduler:
+    def __init__(self, max_rpm=DEFAULT_MAX_RPM, max_tpm=DEFAULT_MAX_TPM,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, max_queue=DEFAULT_MAX_QUEUE,
+                 interactive_reserved=INTERACTIVE_RESERVED):
+        self.requests_bucket = TokenBucket(max_rpm)
+        self.tokens_bucket = TokenBucket(max_tpm)
+        self.max_queue = max_queue
+        concurrency = max(1, max_concurrency)
+        # Background jobs may use at most this many workers; the rest wait for interactive ones
+        self.background_slots = max(1, concurrency - max(0, interactive_reserved))
+        self._jobs = []  # queued jobs, including ones waiting out a rate limit or a 429 backoff
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._background_in_flight = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+        for i in range(concurrency):
+            threading.Thread(target=self._worker, name=f"llm-worker-{i}", daemon=True).start()
+
+    def submit(self, fn, priority=INTERACTIVE, tokens=0) -> Future:
+        """Queue ``fn()`` and return a Future for its result.
+
+        Only background work is refused when the queue is full; interactive
+        calls always queue so a rep's click is never dropped.
+        """
+        future = Future()
+        with self._cond:
+            if priority > INTERACTIVE and len(self._jobs) >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerOverloaded(f"LLM queue full ({len(self._jobs)} waiting)")
+            self._jobs.append(_Job(priority, next(self._seq), fn, tokens, future))
+            self._cond.notify()
+        return future
+
+    def run(self, fn, priority=INTERACTIVE, tokens=0):
+        return self.submit(fn, priority, tokens).result()
+
+    def _take(self):
+        """Under ``_cond``: remove and return the best job that may run now, else (None, seconds to wait)."""
+        now = time.monotonic()
+        background_full = self._background_in_flight >= self.background_slots
+        wake = None
+        for job in sorted(self._jobs, key=lambda j: (j.priority, j.seq)):
+            if job.priority > INTERACTIVE and background_full:
+                continue  # woken again when a background job finishes
+            if job.not_before > now:
+                wake = job.not_before - now if wake is None else min(wake, job.not_before - now)
+                continue
+            wait = max(self.requests_bucket.shortfall(1), self.tokens_bucket.shortfall(job.tokens))
+            if wait > 0:
+                job.not_before = now + wait
+                wake = wait if wake is None else min(wake, wait)
+                continue
+            self.requests_bucket.reserve(1)
+            self.tokens_bucket.reserve(job.tokens)
+            self._jobs.remove(job)
+            return job, None
+        return None, wake
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    job, wake = self._take()
+                    if job is not None:
+                        break
+                    self._cond.wait(wake)
+                self._in_flight += 1
+                if job.priority > INTERACTIVE:
+                    self._background_in_flight += 1
+            try:
+                if job.attempt == 0:
+                    if not job.future.set_running_or_notify_cancel():
+                        continue
+                    self._waits.append((job.priority, time.monotonic() - job.enqueued))
+                self._run_job(job)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    if job.priority > INTERACTIVE:
+                        self._background_in_flight -= 1
+                    self._cond.notify_all()
+
+    def _run_job(self, job):
+        """Call the job once; on a 429 put it back on the queue to retry after the backoff."""
+        try:
+            result = job.fn()
+        except Exception as e:
+            if is_rate_limited(e) and job.attempt < MAX_RETRIES:
+                job.attempt += 1
+                self.retries += 1
+                delay = _retry_after(e) or random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** job.attempt))
+                logging.warning(f"OpenAI rate limited (attempt {job.attempt}/{MAX_RETRIES}), retrying in {delay:.1f}s")
+                job.not_before = time.monotonic() + delay
+                with self._cond:
+                    self._jobs.append(job)
+                return
+            self.failed += 1
+            job.future.set_exception(e)
+            return
+        usage = getattr(result, "usage", None)
+        total = getattr(usage, "total_tokens", None) if usage is not None else None
+        if isinstance(total, int) and job.tokens:
+            self.tokens_bucket.adjust(total - job.tokens)
+        self.completed += 1
+        job.future.set_result(result)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            depth = len(self._jobs)
+            in_flight = self._in_flight
+        waits = list(self._waits)
+
+        def _pct(values, q):
+            if not values:
+                return 0.0
+            values = sorted(values)
+            return values[min(len(values) - 1, int(q * len(values)))]
+
+        interactive = [w for p, w in waits if p <= INTERACTIVE]
+        background = [w for p, w in waits if p > INTERACTIVE]
+        return {
+            "queue_depth": depth,
+            "in_flight": in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries_429": self.retries,
+            "rejected": self.rejected,
+            "wait_p50_s": _pct([w for _, w in waits], 0.50),
+            "wait_p95_s": _pct([w for _, w in waits], 0.95),
+            "interactive_wait_p95_s": _pct(interactive, 0.95),
+            "background_wait_p95_s": _pct(background, 0.95),
+        }
+
+
+class GovernedClient:
+    """``openai.OpenAI`` look-alike whose completions go through the scheduler."""
+
+    def __init__(self, client, scheduler, priority=INTERACTIVE):
+        self._client = client
+        self._scheduler = scheduler
+        self.priority = priority
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_priority(self, priority):
+        return GovernedClient(self._client, self._scheduler, priority)
+
+    def _create(self, **kwargs):
+        def call():
+            return self._scheduler.run(
+                lambda: self._client.chat.completions.create(**kwargs),
+                priority=self.priority,
+                tokens=estimate_tokens(kwargs),
+            )
+        if kwargs.get("stream"):
+            return call()  # a stream can only be consumed once
+        return single_flight.get_group("openai").do(single_flight.request_key(kwargs), call)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """The single scheduler shared by every session in this process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
@@ -0,0 +1,390 @@
+"""Concurrent-session load test for dashboard.py against in-process stand-ins.
+
+Drives headless dashboard sessions through Streamlit's app-testing API
+(``streamlit.testing.v1.AppTest``) with scripted rep flows: filter changes,
+expanding leads, saving notes, drafting follow-up emails, AI offers and
+batch agent clicks. Supabase, OpenAI, SendGrid and the agent services are
+replaced inside each worker process by stand-ins with configurable latency,
+so no live service is touched. With ``--simulator`` the workers instead use
+the real client libraries against the HTTP backend simulator (``simulator/``),
+whose profiles then set latencies, error rates and rate limits.
+
+``AppTest`` is not thread-safe (concurrent runs in one process share element
+registration state), so each worker process hosts ``--sessions`` sessions
+and interleaves their reruns, and ``--processes`` workers run side by side.
+A worker therefore models one Streamlit server process: its throughput is
+the per-process capacity figure, and a conservative one, since backend
+waits of different sessions are not overlapped as they would be on the
+real server's script threads.
+
+Reported: reruns/s overall and per process, rerun latency p50/p95/p99 per
+flow, exceptions, and memory (session-state size per session and process
+RSS growth divided by sessions).
+
+    python loadtest.py --processes 2 --sessions 10 --duration 60 --db-latency 0.02 --llm-latency 0.4
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from types import SimpleNamespace
+
+import requests
+
+from simulator.fixtures import LOCATIONS, NOTES, llm_reply, seed_tables
+from simulator.postgrest import InMemorySupabase
+
+DASHBOARD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard.py")
+AGENT_URL = "http://agent-service.loadtest"
+AD_URL = "http://ad-service.loadtest"
+
+# Flow name -> relative weight in the scripted mix.
+FLOW_WEIGHTS = {
+    "filter": 4,
+    "expand": 4,
+    "save_notes": 2,
+    "draft_email": 1,
+    "ai_offer": 1,
+    "batch": 1,
+}
+
+
+# --- Agent services and SendGrid ---
+
+class FakeServiceAdapter(requests.adapters.BaseAdapter):
+    """Answers the agent/ad service endpoints after ``latency`` seconds."""
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        path = requests.utils.urlparse(request.url).path
+        if path == "/analyze-query":
+            body = {"result_type": "TEXT", "result_message": "Simulated analytics answer.", "payload": None}
+        elif path == "/health":
+            body = {"status": "ok"}
+        else:
+            body = {"message": f"Simulated {path} accepted.", "found": 0, "emails_sent": 0}
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(body).encode("utf-8")
+        response.headers["Content-Type"] = "application/json"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeSendGridClient:
+    def __init__(self, *args, latency=0.0, **kwargs):
+        self.latency = latency
+
+    def send(self, message):
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(status_code=202, body=b"", headers={})
+
+
+def install_stand_ins(tables, db_latency=0.0, llm_latency=0.0, service_latency=0.0, mail_latency=0.0):
+    """Patch this process so dashboard.py talks to the stand-ins. Returns the in-memory DB."""
+    import mail_pipeline
+    import openai
+    import supabase
+
+    import precompute
+
+    db = InMemorySupabase(tables, latency=db_latency)
+    supabase.create_client = lambda *args, **kwargs: db
+    openai.OpenAI = lambda *args, **kwargs: precompute.FakeLLMClient(reply=llm_reply, latency=llm_latency)
+    mail_pipeline.SendGridAPIClient = lambda *args, **kwargs: FakeSendGridClient(latency=mail_latency)
+
+    adapter = FakeServiceAdapter(latency=service_latency)
+    original_init = requests.Session.__init__
+
+    def session_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self.mount(AGENT_URL, adapter)
+        self.mount(AD_URL, adapter)
+
+    requests.Session.__init__ = session_init
+    return db
+
+
+# --- Sessions and flows ---
+
+def _visible_leads(at):
+    return [b.key[len("toggle_"):] for b in at.button if b.key and b.key.startswith("toggle_")]
+
+
+def flow_filter(at, rnd):
+    choice = rnd.random()
+    if choice < 0.5:
+        box = next(s for s in at.selectbox if s.label == "Filter by Location")
+        box.set_value(rnd.choice(["All Locations"] + LOCATIONS))
+    elif choice < 0.8:
+        start = at.date_input[0]
+        start.set_value(datetime.now().date() - timedelta(days=rnd.choice([1, 3, 7, 14, 30])))
+    else:
+        tiers = next(m for m in at.multiselect if m.label == "Filter by Lead Tier")
+        tiers.set_value(rnd.sample(["Hot", "Warm", "Cold"], rnd.randint(0, 2)))
+    return at.run()
+
+
+def flow_expand(at, rnd):
+    leads = _visible_leads(at)
+    if not leads:
+        return at.run()
+    return at.button(key=f"toggle_{rnd.choice(leads)}").click().run()
+
+
+def _open_lead(at, rid):
+    """Collapsed cards carry no notes or actions; open the card first, as a rep would."""
+    if not any(t.key == f"sales_notes_{rid}" for t in at.text_area):
+        at.button(key=f"toggle_{rid}").click().run()
+
+
+def _edit_notes(at, rnd, rid):
+    """Notes are editable only once Follow Up Required is saved, as for a real rep."""
+    _open_lead(at, rid)
+    if at.text_area(key=f"sales_notes_{rid}").disabled:
+        at.selectbox(key=f"action_status_{rid}").set_value("Follow Up Required")
+        at.button(key=f"FormSubmitter:update_form_{rid}-Save Updates").click().run()
+    at.text_area(key=f"sales_notes_{rid}").set_value(rnd.choice(NOTES[1:]))
+
+
+def flow_save_notes(at, rnd):
+    leads = _visible_leads(at)
+    if not leads:
+        return at.run()
+    rid = rnd.choice(leads)
+    _edit_notes(at, rnd, rid)
+    return at.button(key=f"FormSubmitter:update_form_{rid}-Save Updates").click().run()
+
+
+def flow_draft_email(at, rnd):
+    leads = _visible_leads(at)
+    if not leads:
+        return at.run()
+    rid = rnd.choice(leads)
+    _edit_notes(at, rnd, rid)
+    return at.button(key=f"FormSubmitter:update_form_{rid}-Draft Follow-up Email").click().run()
+
+
+def flow_ai_offer(at, rnd):
+    leads = _visible_leads(at)
+    if not leads:
+        return at.run()
+    rid = rnd.choice(leads)
+    _open_lead(at, rid)
+    key = f"suggest_offer_btn_outside_{rid}"
+    if not any(b.key == key for b in at.button):
+        return at.run()
+    return at.button(key=key).click().run()
+
+
+def flow_batch(at, rnd):
+    key = rnd.choice(["batch_followup_btn", "precompute_ai_btn"])
+    if not any(b.key == key for b in at.button):
+        return at.run()
+    return at.button(key=key).click().run()
+
+
+FLOWS = {
+    "filter": flow_filter,
+    "expand": flow_expand,
+    "save_notes": flow_save_notes,
+    "draft_email": flow_draft_email,
+    "ai_offer": flow_ai_offer,
+    "batch": flow_batch,
+}
+
+
+def session_state_bytes(at) -> int:
+    """Pickled size of the session's state, skipping values that cannot be pickled."""
+    total = 0
+    for value in at.session_state.to_dict().values():
+        try:
+            total += len(pickle.dumps(value))
+        except Exception:
+            pass
+    return total
+
+
+def _rss_bytes() -> int:
+    # ru_maxrss is KiB on Linux; peak rather than current, which is what capacity planning needs.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_worker(worker_id, args):
+    """One process: ``args.sessions`` interleaved sessions for ``args.duration`` seconds."""
+    os.environ.update({
+        "SUPABASE_URL": "http://supabase.loadtest", "SUPABASE_KEY": "loadtest",
+        "OPENAI_API_KEY": "loadtest", "SENDGRID_API_KEY": "loadtest", "EMAIL_ADDRESS": "loadtest@example.com",
+        "AUTOMOTIVE_AGENT_SERVICE_URL": AGENT_URL, "PERSONALIZED_AD_SERVICE_URL": AD_URL,
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "SHARED_CACHE_URL": args.shared_cache_url,
+        "INTERACTION_QUEUE_DIR": tempfile.mkdtemp(prefix=f"loadtest-queue-{worker_id}-"),
+    })
+    sys.path.insert(0, os.path.dirname(DASHBOARD_PATH))
+    if args.simulator:
+        # Real client libraries over HTTP; the simulator's service profiles set latencies and faults
+        os.environ["BACKEND_SIMULATOR"] = args.simulator
+    else:
+        install_stand_ins(
+            seed_tables(args.rows, seed=args.seed), db_latency=args.db_latency, llm_latency=args.llm_latency,
+            service_latency=args.service_latency, mail_latency=args.mail_latency,
+        )
+    from streamlit.testing.v1 import AppTest
+
+    rnd = random.Random(args.seed * 1000 + worker_id)
+    flows = list(FLOW_WEIGHTS)
+    weights = [FLOW_WEIGHTS[f] for f in flows]
+    samples, errors = [], []
+
+    sessions = []
+    rss_before = _rss_bytes()
+    for _ in range(args.sessions):
+        at = AppTest.from_file(DASHBOARD_PATH, default_timeout=args.rerun_timeout)
+        started = time.perf_counter()
+        at.run()
+        samples.append(("load", time.perf_counter() - started))
+        sessions.append(at)
+    deadline = time.time() + args.duration
+    reruns = 0
+    while time.time() < deadline:
+        for at in sessions:
+            flow = rnd.choices(flows, weights)[0]
+            started = time.perf_counter()
+            try:
+                FLOWS[flow](at, rnd)
+                for exc in at.exception:
+                    errors.append(f"{flow}: {exc.value}")
+            except Exception as e:
+                errors.append(f"{flow}: {type(e).__name__}: {e}")
+            samples.append((flow, time.perf_counter() - started))
+            reruns += 1
+            if args.think_time:
+                time.sleep(rnd.uniform(0, 2 * args.think_time) / max(1, len(sessions)))
+            if time.time() >= deadline:
+                break
+    return {
+        "worker": worker_id,
+        "reruns": reruns,
+        "duration_s": args.duration,
+        "samples": samples,
+        "errors": errors[:50],
+        "error_count": len(errors),
+        "session_state_bytes": [session_state_bytes(at) for at in sessions],
+        "rss_growth_bytes": max(0, _rss_bytes() - rss_before),
+        "sessions": len(sessions),
+    }
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(results) -> dict:
+    by_flow = {}
+    for result in results:
+        for flow, seconds in result["samples"]:
+            by_flow.setdefault(flow, []).append(seconds)
+    all_reruns = [s for flow, values in by_flow.items() if flow != "load" for s in values]
+    duration = max((r["duration_s"] for r in results), default=0) or 1
+    state_sizes = [b for r in results for b in r["session_state_bytes"]]
+    sessions = sum(r["sessions"] for r in results)
+    return {
+        "processes": len(results),
+        "sessions": sessions,
+        "reruns": sum(r["reruns"] for r in results),
+        "reruns_per_s": sum(r["reruns"] for r in results) / duration,
+        "reruns_per_s_per_process": statistics.mean(r["reruns"] / duration for r in results) if results else 0.0,
+        "latency_s": {
+            flow: {
+                "n": len(values),
+                "p50": _percentile(values, 0.50),
+                "p95": _percentile(values, 0.95),
+                "p99": _percentile(values, 0.99),
+            }
+            for flow, values in sorted(by_flow.items())
+        },
+        "all_reruns_p95_s": _percentile(all_reruns, 0.95),
+        "errors": sum(r["error_count"] for r in results),
+        "sample_errors": [e for r in results for e in r["errors"]][:10],
+        "session_state_kb_p50": _percentile(state_sizes, 0.5) / 1024,
+        "session_state_kb_max": max(state_sizes, default=0) / 1024,
+        "rss_mb_per_session": (sum(r["rss_growth_bytes"] for r in results) / max(1, sessions)) / (1024 * 1024),
+    }
+
+
+def format_report(summary) -> str:
+    lines = [
+        f"{summary['sessions']} sessions in {summary['processes']} process(es): "
+        f"{summary['reruns']} reruns, {summary['reruns_per_s']:.1f}/s "
+        f"({summary['reruns_per_s_per_process']:.1f}/s per process), {summary['errors']} error(s)",
+        f"{'flow':<12}{'n':>7}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}",
+    ]
+    for flow, stats in summary["latency_s"].items():
+        lines.append(f"{flow:<12}{stats['n']:>7}{stats['p50']:>9.3f}{stats['p95']:>9.3f}{stats['p99']:>9.3f}")
+    lines.append(
+        f"session state: p50 {summary['session_state_kb_p50']:.1f} KB, max {summary['session_state_kb_max']:.1f} KB; "
+        f"RSS growth {summary['rss_mb_per_session']:.1f} MB per session"
+    )
+    lines.extend(f"  ! {e}" for e in summary["sample_errors"])
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test dashboard.py with concurrent headless sessions.")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes (one Streamlit server each).")
+    parser.add_argument("--sessions", type=int, default=5, help="Sessions per process.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of scripted activity per process.")
+    parser.add_argument("--rows", type=int, default=300, help="Seeded bookings.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between a session's actions.")
+    parser.add_argument("--db-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--service-latency", type=float, default=0.1)
+    parser.add_argument("--mail-latency", type=float, default=0.05)
+    parser.add_argument("--rerun-timeout", type=float, default=120.0)
+    parser.add_argument("--shared-cache-url", default="memory://",
+                        help="SHARED_CACHE_URL for the workers; a sqlite:// file is shared between them.")
+    parser.add_argument("--simulator",
+                        help="Drive the real clients against a backend simulator instead of in-process stand-ins: "
+                             "its URL, or 'local' to start one here seeded with --rows (see simulator/).")
+    parser.add_argument("--json", help="Also write the summary as JSON to this file.")
+    args = parser.parse_args(argv)
+
+    if args.simulator == "local":
+        from simulator import server
+        args.simulator = server.start(tables=seed_tables(args.rows, seed=args.seed), seed=args.seed).url
+
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=get_context("spawn")) as pool:
+        results = list(pool.map(run_worker, range(args.processes), [args] * args.processes))
+    summary = summarize(results)
+    print(format_report(summary))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(summary, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
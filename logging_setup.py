@@ -0,0 +1,166 @@
+"""Non-blocking, structured logging for the dashboard.
+
+``logging.basicConfig(stream=sys.stdout, level=DEBUG)`` made every rerun pay
+for synchronous stdout writes, including debug dumps of drafted emails.
+``configure()`` instead installs:
+
+* a ``QueueHandler`` on the root logger, so callers only enqueue records and a
+  ``QueueListener`` thread does the formatting and writing;
+* JSON records (``LOG_FORMAT=json``, the default) carrying ``session_id`` and
+  ``request_id`` from context variables set with ``bind``;
+* per-logger levels from ``LOG_LEVEL`` (root) and ``LOG_LEVELS``
+  (``"precompute=DEBUG,urllib3=WARNING"``);
+* rate-limited sampling of DEBUG records (``LOG_DEBUG_PER_SECOND`` per
+  logger), so tracing can stay on in production.
+
+``configure`` is idempotent; Streamlit re-executes the script on every rerun.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+session_id_var = contextvars.ContextVar("session_id", default=None)
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# Chatty third-party loggers that are never useful at DEBUG here.
+QUIET_LOGGERS = ("markdown_it", "httpx", "httpcore", "hpack", "urllib3", "watchdog", "openai._base_client")
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener = None
+_sampler = None
+
+
+def bind(session_id=None, request_id=None):
+    """Set correlation ids for log records emitted from the current context."""
+    if session_id is not None:
+        session_id_var.set(session_id)
+    request_id_var.set(request_id)
+
+
+class ContextFilter(logging.Filter):
+    """Copies correlation ids onto the record on the emitting thread."""
+
+    def filter(self, record):
+        record.session_id = session_id_var.get()
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Lets at most ``per_second`` records below INFO through per logger."""
+
+    def __init__(self, per_second):
+        super().__init__()
+        self.per_second = float(per_second)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.INFO:
+            return True
+        if self.per_second <= 0:
+            self.dropped += 1
+            return False
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(record.name, (self.per_second, now))
+            tokens = min(self.per_second, tokens + (now - last) * self.per_second)
+            allowed = tokens >= 1
+            self._buckets[record.name] = (tokens - 1 if allowed else tokens, now)
+        if not allowed:
+            self.dropped += 1
+        return allowed
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records unformatted; the listener thread does the formatting.
+
+    The stock ``prepare`` renders message and traceback on the caller's thread.
+    Records never leave the process here, so a shallow copy is enough.
+    """
+
+    def prepare(self, record):
+        return copy.copy(record)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        session_id = getattr(record, "session_id", None)
+        request_id = getattr(record, "request_id", None)
+        if session_id:
+            payload["session_id"] = session_id
+        if request_id:
+            payload["request_id"] = request_id
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - [%(session_id)s %(request_id)s] %(message)s")
+
+
+def parse_levels(spec):
+    """``"a=DEBUG,b.c=WARNING"`` -> {"a": DEBUG, "b.c": WARNING}; bad entries are ignored."""
+    levels = {}
+    for part in (spec or "").split(","):
+        name, _, level = part.partition("=")
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def configure():
+    """Install the queue-backed handler once per process."""
+    global _configured, _listener, _sampler
+    with _configure_lock:
+        if _configured:
+            return
+        formatter = JsonFormatter() if os.getenv("LOG_FORMAT", "json").lower() == "json" else TextFormatter()
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = DeferredQueueHandler(log_queue)
+        _sampler = DebugSampler(float(os.getenv("LOG_DEBUG_PER_SECOND", "5")))
+        queue_handler.addFilter(_sampler)
+        queue_handler.addFilter(ContextFilter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(parse_levels(f"root={os.getenv('LOG_LEVEL', 'INFO')}").get("root", logging.INFO))
+
+        for name in QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+        for name, level in parse_levels(os.getenv("LOG_LEVELS")).items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        _configured = True
+
+
+def dropped_debug_records() -> int:
+    return _sampler.dropped if _sampler else 0
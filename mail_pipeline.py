@@ -0,0 +1,178 @@
+"""Batched SendGrid delivery for dashboard emails.
+
+``send_email`` used to build a fresh ``SendGridAPIClient`` and make one
+``/v3/mail/send`` call per message. ``MailPipeline`` keeps a single client per
+process and packs up to ``MAX_PERSONALIZATIONS`` recipients into one request:
+the message body is a substitution token and every personalization carries its
+own ``to``, ``subject`` and body substitution, so differently worded emails
+(e.g. "Lost" notes addressed by name) still share a call.
+
+SendGrid accepts or rejects a request as a whole. When a 400 names a
+recipient or personalization field, the batch is bisected until the
+offending recipients are isolated. Any other failure (a bad or revoked key,
+missing permission, a payload too large, rate limiting, 5xx) is not about
+one recipient, so the whole batch fails at once with one outcome per
+recipient instead of costing another ~2N SendGrid calls. The caller gets a
+``DeliveryReport`` with one ``RecipientOutcome`` per email and can log all the
+delivered interactions in a single bulk insert.
+"""
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from python_http_client.exceptions import HTTPError
+from sendgrid import SendGridAPIClient
+from sendgrid.helpers.mail import CustomArg, Mail, Personalization, To, Substitution
+
+# SendGrid hard limits for a single /v3/mail/send request.
+MAX_PERSONALIZATIONS = 1000
+MAX_SUBSTITUTION_BYTES = 10000
+
+BODY_TOKEN = "-aoe_body-"
+
+
+@dataclass
+class OutboundEmail:
+    to: str
+    subject: str
+    html: str
+    request_id: Optional[str] = None
+    event_type: str = "email_sent_dashboard"
+
+
+@dataclass
+class RecipientOutcome:
+    email: OutboundEmail
+    ok: bool
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class DeliveryReport:
+    outcomes: List[RecipientOutcome] = field(default_factory=list)
+    api_calls: int = 0
+
+    @property
+    def sent(self) -> List[RecipientOutcome]:
+        return [o for o in self.outcomes if o.ok]
+
+    @property
+    def failed(self) -> List[RecipientOutcome]:
+        return [o for o in self.outcomes if not o.ok]
+
+    def summary(self) -> str:
+        return f"{len(self.sent)} sent, {len(self.failed)} failed in {self.api_calls} SendGrid call(s)"
+
+
+class MailPipeline:
+    """One reused SendGrid client that sends emails in personalization batches."""
+
+    def __init__(self, api_key, from_email, host="https://api.sendgrid.com", batch_size=MAX_PERSONALIZATIONS):
+        self.from_email = from_email
+        self.batch_size = max(1, min(batch_size, MAX_PERSONALIZATIONS))
+        self.client = SendGridAPIClient(api_key, host=host)
+        self._lock = threading.Lock()
+
+    def send(self, emails) -> DeliveryReport:
+        """Deliver ``emails`` and report the outcome for each recipient."""
+        report = DeliveryReport()
+        batchable, single = [], []
+        for email in emails:
+            if len(email.html.encode("utf-8")) > MAX_SUBSTITUTION_BYTES:
+                single.append(email)
+            else:
+                batchable.append(email)
+        for start in range(0, len(batchable), self.batch_size):
+            self._send_batch(batchable[start:start + self.batch_size], report)
+        for email in single:
+            self._send_plain(email, report)
+        logging.info(f"Mail pipeline: {report.summary()}")
+        return report
+
+    def _post(self, message, report):
+        with self._lock:
+            report.api_calls += 1
+        return self.client.send(message)
+
+    def _send_batch(self, batch, report):
+        message = Mail(from_email=self.from_email, subject=batch[0].subject, html_content=BODY_TOKEN)
+        for email in batch:
+            personalization = Personalization()
+            personalization.add_to(To(email.to))
+            personalization.subject = email.subject
+            personalization.add_substitution(Substitution(BODY_TOKEN, email.html))
+            if email.request_id:
+                personalization.add_custom_arg(CustomArg("request_id", str(email.request_id)))
+            message.add_personalization(personalization)
+        try:
+            response = self._post(message, report)
+            self._record(batch, response.status_code, None, report)
+        except HTTPError as e:
+            if len(batch) > 1 and _names_recipient(e):
+                # Whole request rejected because of some recipients: split until they are isolated.
+                mid = len(batch) // 2
+                self._send_batch(batch[:mid], report)
+                self._send_batch(batch[mid:], report)
+            else:
+                self._record(batch, e.status_code, _error_text(e), report)
+        except Exception as e:
+            logging.error(f"Error sending email batch via SendGrid: {e}", exc_info=True)
+            self._record(batch, None, str(e), report)
+
+    def _send_plain(self, email, report):
+        message = Mail(from_email=self.from_email, to_emails=email.to, subject=email.subject, html_content=email.html)
+        try:
+            response = self._post(message, report)
+            self._record([email], response.status_code, None, report)
+        except HTTPError as e:
+            self._record([email], e.status_code, _error_text(e), report)
+        except Exception as e:
+            logging.error(f"Error sending email via SendGrid: {e}", exc_info=True)
+            self._record([email], None, str(e), report)
+
+    @staticmethod
+    def _record(batch, status_code, error, report):
+        ok = error is None and status_code is not None and 200 <= status_code < 300
+        if not ok and error is None:
+            error = f"SendGrid status {status_code}"
+        for email in batch:
+            report.outcomes.append(RecipientOutcome(email, ok, status_code, error))
+
+
+def _names_recipient(e) -> bool:
+    """True for a 400 whose errors point at a recipient/personalization field."""
+    if e.status_code != 400:
+        return False
+    body = getattr(e, "body", b"") or b""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+    try:
+        errors = json.loads(body).get("errors") or []
+    except (ValueError, AttributeError):
+        return False
+    return any(str((err or {}).get("field") or "").startswith("personalizations") for err in errors)
+
+
+def _error_text(e):
+    body = getattr(e, "body", b"") or b""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+    return f"SendGrid status {e.status_code}: {body[:300]}"
+
+
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_pipeline(api_key, from_email, **kwargs) -> MailPipeline:
+    """Process-wide pipeline per (api key, sender); reused across reruns and sessions."""
+    key = (api_key, from_email, tuple(sorted(kwargs.items())))
+    with _pipelines_lock:
+        pipeline = _pipelines.get(key)
+        if pipeline is None:
+            pipeline = MailPipeline(api_key, from_email, **kwargs)
+            _pipelines[key] = pipeline
+        return pipeline
@@ -0,0 +1,95 @@
+"""Concurrent fetch of a query split into location/date partitions.
+
+A wide bookings view ("All Locations" over weeks) used to be one large
+ordered query on one thread. ``fetch_all`` runs one query per partition on a
+shared thread pool (the Supabase client's HTTP connection pool is shared by
+the threads) and merges the per-partition results, each already ordered
+newest first, with ``heapq.merge``. The wall time is roughly that of the
+slowest partition instead of the sum.
+
+Partitions are plain values, so callers can cache each one independently
+(the dashboard keys the shared cache tier by partition). Every partition is
+a request, so splitting only pays off for wide ranges: the dashboard fetches
+short ranges with one query, and ``shard_days_for`` widens the date shards
+of long ranges so a view never costs more than ``PARTITION_FETCH_MAX_PARTS``
+requests.
+"""
+import heapq
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import NamedTuple, Optional
+
+MAX_WORKERS = int(os.getenv("PARTITION_FETCH_WORKERS", "8"))
+MAX_PARTITIONS = int(os.getenv("PARTITION_FETCH_MAX_PARTS", str(2 * MAX_WORKERS)))
+
+
+class Partition(NamedTuple):
+    first_day: object
+    last_day: object
+    location: Optional[str]  # None: every location not listed explicitly
+
+
+def date_shards(first_day, last_day, shard_days):
+    """Split ``first_day..last_day`` (inclusive) into ranges of at most ``shard_days`` days."""
+    if not shard_days or shard_days <= 0:
+        return [(first_day, last_day)]
+    shards = []
+    start = first_day
+    while start <= last_day:
+        end = min(last_day, start + timedelta(days=shard_days - 1))
+        shards.append((start, end))
+        start = end + timedelta(days=1)
+    return shards
+
+
+def shard_days_for(first_day, last_day, n_locations, shard_days, max_parts=MAX_PARTITIONS):
+    """``shard_days``, widened so ``first_day..last_day`` splits into at most ``max_parts`` partitions."""
+    if not shard_days or shard_days <= 0:
+        return shard_days  # date shards disabled
+    total_days = (last_day - first_day).days + 1
+    max_shards = max(1, max_parts // max(1, n_locations))
+    return max(shard_days, math.ceil(total_days / max_shards))
+
+
+def partitions(first_day, last_day, locations, shard_days=None):
+    """One partition per (date shard, location); ``None`` in ``locations`` is the catch-all."""
+    return [
+        Partition(start, end, location)
+        for start, end in date_shards(first_day, last_day, shard_days)
+        for location in locations
+    ]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="partition-fetch")
+        return _executor
+
+
+def fetch_all(parts, fetch, sort_key, descending=True):
+    """Run ``fetch(partition)`` for every partition concurrently and merge the results.
+
+    Each ``fetch`` must return rows ordered by ``sort_key`` (descending by
+    default). The first failure is re-raised once every partition finished.
+    """
+    if len(parts) == 1:
+        return list(fetch(parts[0]))
+    futures = [get_executor().submit(fetch, part) for part in parts]
+    results, error = [], None
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+    return list(heapq.merge(*results, key=sort_key, reverse=descending))
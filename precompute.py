@@ -0,0 +1,293 @@
+"""Offline bulk pre-generation of AI offer suggestions and call talking points.
+
+The lead card used to generate both on demand: one blocking OpenAI call per
+click followed by a rerun. This module picks the leads that are eligible for
+either suggestion, generates them in bulk on a background thread pool with
+bounded concurrency, and keeps the results in a process-wide store keyed by a
+context fingerprint (sales notes, lead score and vehicle). The store is an LRU
+capped at ``PRECOMPUTE_MAX_ITEMS`` results kept for at most
+``PRECOMPUTE_TTL_SECONDS``. The card looks the
+result up by fingerprint and shows it instantly; a changed context simply
+misses and is regenerated on the next run.
+
+Nothing here imports Streamlit, so the job can be driven from tests with
+``FakeLLMClient`` standing in for ``openai.OpenAI``.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import SimpleNamespace
+
+OFFER = "offer"
+TALKING_POINTS = "talking_points"
+# Session artifact kind for follow-up drafts. Drafts are per rep and never go into the shared store.
+FOLLOWUP_DRAFT = "followup_draft"
+
+# Same rules the lead card and the batch offer agent use.
+OFFER_SCORE_THRESHOLD = 12
+CLOSED_STATUSES = ("Lost", "Converted")
+TALKING_POINTS_STATUS = "Call Scheduled"
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_ITEMS = int(os.getenv("PRECOMPUTE_MAX_ITEMS", "5000"))
+DEFAULT_TTL_SECONDS = float(os.getenv("PRECOMPUTE_TTL_SECONDS", str(24 * 3600)))
+
+
+def context_fingerprint(sales_notes, numeric_lead_score, vehicle) -> str:
+    """Stable hash of the inputs that change what the LLM would say about a lead."""
+    try:
+        score = int(numeric_lead_score or 0)
+    except (TypeError, ValueError):
+        score = 0
+    raw = "\x1f".join([(sales_notes or "").strip(), str(score), (vehicle or "").strip()])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def row_fingerprint(row) -> str:
+    return context_fingerprint(row.get("sales_notes"), row.get("numeric_lead_score"), row.get("vehicle"))
+
+
+def eligible_kinds(row, offer_threshold=OFFER_SCORE_THRESHOLD) -> list:
+    """Which suggestions are worth precomputing for a booking row."""
+    status = row.get("action_status")
+    if status in CLOSED_STATUSES:
+        return []
+    kinds = []
+    try:
+        score = int(row.get("numeric_lead_score") or 0)
+    except (TypeError, ValueError):
+        score = 0
+    if score > offer_threshold:
+        kinds.append(OFFER)
+    if status == TALKING_POINTS_STATUS:
+        kinds.append(TALKING_POINTS)
+    return kinds
+
+
+class PrecomputeStore:
+    """Thread-safe LRU map of (request_id, kind) -> latest generated result.
+
+    Holds at most ``max_items`` results, each for at most ``ttl`` seconds.
+    """
+
+    def __init__(self, max_items=DEFAULT_MAX_ITEMS, ttl=DEFAULT_TTL_SECONDS):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.evictions = 0
+
+    def get(self, request_id, kind, fingerprint):
+        """Return the stored text only if it was generated for this exact context and has not expired."""
+        key = (request_id, kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["generated_at"] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+        if entry["fingerprint"] == fingerprint:
+            return entry["text"]
+        return None
+
+    def put(self, request_id, kind, fingerprint, text):
+        key = (request_id, kind)
+        with self._lock:
+            self._entries[key] = {
+                "fingerprint": fingerprint,
+                "text": text,
+                "generated_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, request_id, kind):
+        with self._lock:
+            self._entries.pop((request_id, kind), None)
+
+    def is_fresh(self, request_id, kind, fingerprint) -> bool:
+        return self.get(request_id, kind, fingerprint) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class PrecomputeJob:
+    """Progress of one bulk run; read from the UI while the pool works."""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.finished_at is None
+
+    def _record(self, ok):
+        with self._lock:
+            if ok:
+                self.done += 1
+            else:
+                self.failed += 1
+
+    def summary(self) -> str:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return (
+            f"{self.done}/{self.total} generated, {self.failed} failed, "
+            f"{self.skipped} already fresh ({elapsed:.1f}s)"
+        )
+
+
+def plan(rows, store, offer_threshold=OFFER_SCORE_THRESHOLD, force=False):
+    """List (row, kind, fingerprint) tasks whose stored result is missing or stale."""
+    tasks, skipped = [], 0
+    for row in rows:
+        fingerprint = row_fingerprint(row)
+        for kind in eligible_kinds(row, offer_threshold):
+            if not force and store.is_fresh(row["request_id"], kind, fingerprint):
+                skipped += 1
+                continue
+            tasks.append((row, kind, fingerprint))
+    return tasks, skipped
+
+
+def run_precompute(rows, generators, store, max_workers=DEFAULT_MAX_WORKERS,
+                   offer_threshold=OFFER_SCORE_THRESHOLD, force=False, job=None, client=None):
+    """Generate missing suggestions for ``rows`` and store them.
+
+    ``generators`` maps a kind (``OFFER``/``TALKING_POINTS``) to a callable
+    taking the booking row and ``client=`` and returning the markdown text;
+    ``client`` (an ``openai.OpenAI``-like object, None for the generator's
+    default) is passed through. Kinds without a generator are ignored. Runs
+    synchronously; see ``start_background``.
+    """
+    tasks, skipped = plan(rows, store, offer_threshold, force)
+    tasks = [t for t in tasks if t[1] in generators]
+    if job is None:
+        job = PrecomputeJob(len(tasks))
+    else:
+        job.total = len(tasks)
+    job.skipped = skipped
+
+    def _work(row, kind, fingerprint):
+        text = generators[kind](row, client=client)
+        if not text:
+            raise ValueError(f"empty {kind} result")
+        store.put(row["request_id"], kind, fingerprint, text)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = {pool.submit(_work, *task): task for task in tasks}
+            for future in as_completed(futures):
+                row, kind, _ = futures[future]
+                try:
+                    future.result()
+                    job._record(True)
+                except Exception as e:
+                    logging.error(f"Precompute {kind} failed for {row.get('request_id')}: {e}")
+                    job._record(False)
+    finally:
+        job.finished_at = time.time()
+    logging.info(f"Precompute finished: {job.summary()}")
+    return job
+
+
+_store = PrecomputeStore()
+_job_lock = threading.Lock()
+_current_job = None
+
+
+def get_store() -> PrecomputeStore:
+    """Process-wide store shared by every Streamlit session."""
+    return _store
+
+
+def current_job():
+    return _current_job
+
+
+def start_background(rows, generators, max_workers=DEFAULT_MAX_WORKERS,
+                     offer_threshold=OFFER_SCORE_THRESHOLD, force=False, client=None, store=None):
+    """Kick off ``run_precompute`` on a daemon thread unless one is already running.
+
+    Results go to ``store`` (default: the process-wide one). Returns the
+    running ``PrecomputeJob`` (new or existing).
+    """
+    global _current_job
+    with _job_lock:
+        if _current_job is not None and _current_job.running:
+            return _current_job
+        job = PrecomputeJob(0)
+        _current_job = job
+    rows = [dict(r) for r in rows]
+    threading.Thread(
+        target=run_precompute,
+        args=(rows, generators, _store if store is None else store, max_workers, offer_threshold, force, job, client),
+        name="precompute",
+        daemon=True,
+    ).start()
+    return job
+
+
+class FakeLLMClient:
+    """Drop-in stand-in for ``openai.OpenAI`` in tests and offline runs.
+
+    Answers ``client.chat.completions.create(...)`` with a deterministic reply
+    derived from the prompt, optionally after ``latency`` seconds, and counts
+    calls (and the most calls in flight at once) so tests can assert on how
+    many requests a job made and how many ran concurrently.
+    """
+
+    def __init__(self, reply=None, latency=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model=None, messages=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        prompt = (messages or [{}])[-1].get("content", "")
+        if callable(self.reply):
+            content = self.reply(messages)
+        elif self.reply is not None:
+            content = self.reply
+        else:
+            digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+            content = f"**AI Suggestion:**\n\n- Offline stand-in reply ({digest})"
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4),
+        )
@@ -0,0 +1,252 @@
+"""Incrementally maintained "call next" ranking of open leads.
+
+The only answer to "who should I call" used to be the ``RANK`` payload from
+``/analyze-query``, recomputed remotely for every question. ``CallIndex``
+keeps the open leads (not Lost/Converted, not merged into another booking)
+this process has seen in a list kept sorted with ``bisect``, ordered by:
+
+1. status rule (``Call Customer (AI)`` first, then ``Follow Up Required``);
+2. lead score, highest first;
+3. most recent engagement (``last_engaged_at`` from AI insights);
+4. most recent booking.
+
+Bookings and insights are applied as patches: only leads whose ranking
+fields changed are moved (O(log n) search plus a list shift), and a lead
+that becomes Lost/Converted is dropped. Besides the global order, every
+``(location, booking day)`` has its own sorted list, so ``top(k)`` for a
+location and date range merges just the lists of that range and stops after
+``k`` matches instead of walking the whole index.
+
+The index only learns about leads from the bookings it is given, so a lead
+whose status changed outside this process's views keeps its old entry. The
+dashboard therefore asks ``top`` for the location and dates of the view it
+just loaded, whose rows were applied fresh. The index holds at most
+``CALL_INDEX_MAX_LEADS`` leads; the ones not seen in a loaded list for the
+longest are dropped first.
+"""
+import bisect
+import heapq
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+DEFAULT_MAX_LEADS = int(os.getenv("CALL_INDEX_MAX_LEADS", "20000"))
+CLOSED_STATUSES = ("Lost", "Converted")
+STATUS_PRIORITY = {"Call Customer (AI)": 0, "Follow Up Required": 1}
+DEFAULT_STATUS_PRIORITY = 2
+
+# Booking fields the index keeps per lead (for ranking and display).
+TRACKED_FIELDS = (
+    "full_name", "vehicle", "location", "action_status", "numeric_lead_score", "booking_timestamp", "merged_into",
+)
+
+
+def _epoch(value) -> float:
+    if not value:
+        return 0.0
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _score(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _closed(lead) -> bool:
+    return lead.get("action_status") in CLOSED_STATUSES or bool(lead.get("merged_into"))
+
+
+def _tier(lead) -> str:
+    """Same thresholds as the dashboard's ``label_from_numeric``."""
+    score = _score(lead.get("numeric_lead_score"))
+    return "Hot" if score >= 10 else ("Warm" if score >= 5 else "Cold")
+
+
+def _bucket(lead) -> tuple:
+    """``(location, "YYYY-MM-DD")`` of the lead's booking; ISO day strings sort like dates."""
+    return lead.get("location"), str(lead.get("booking_timestamp") or "")[:10]
+
+
+def rank_key(lead) -> tuple:
+    """Ascending sort key; the smallest key is the lead to call first."""
+    return (
+        STATUS_PRIORITY.get(lead.get("action_status"), DEFAULT_STATUS_PRIORITY),
+        -_score(lead.get("numeric_lead_score")),
+        -_epoch(lead.get("last_engaged_at")),
+        -_epoch(lead.get("booking_timestamp")),
+        lead["request_id"],
+    )
+
+
+def reason(lead) -> str:
+    status = lead.get("action_status")
+    if status in STATUS_PRIORITY:
+        return status
+    if lead.get("last_engaged_at"):
+        return f"Score {_score(lead.get('numeric_lead_score'))}, recently engaged"
+    return f"Score {_score(lead.get('numeric_lead_score'))}"
+
+
+class CallIndex:
+    def __init__(self, max_leads=DEFAULT_MAX_LEADS):
+        self.max_leads = max_leads
+        self._leads = OrderedDict()  # request_id -> tracked fields (+ last_engaged_at), least recently seen first
+        self._keys = {}  # request_id -> current rank key, for open leads only
+        self._order = []  # sorted rank keys
+        self._buckets = {}  # (location, day) -> sorted rank keys of that day's open leads there
+        self._bucket_of = {}  # request_id -> its (location, day)
+        self._days = {}  # location -> sorted days that have a bucket
+        self._lock = threading.Lock()
+        self._last_bookings = None
+        self._last_insights = None
+        self.moves = 0
+
+    def _insert(self, request_id, key, bucket):
+        bisect.insort(self._order, key)
+        self._keys[request_id] = key
+        keys = self._buckets.get(bucket)
+        if keys is None:
+            keys = self._buckets[bucket] = []
+            bisect.insort(self._days.setdefault(bucket[0], []), bucket[1])
+        bisect.insort(keys, key)
+        self._bucket_of[request_id] = bucket
+
+    def _remove(self, request_id):
+        key = self._keys.pop(request_id, None)
+        if key is None:
+            return
+        del self._order[bisect.bisect_left(self._order, key)]
+        bucket = self._bucket_of.pop(request_id)
+        keys = self._buckets[bucket]
+        del keys[bisect.bisect_left(keys, key)]
+        if not keys:
+            del self._buckets[bucket]
+            days = self._days[bucket[0]]
+            del days[bisect.bisect_left(days, bucket[1])]
+            if not days:
+                del self._days[bucket[0]]
+
+    def _reposition(self, request_id):
+        lead = self._leads[request_id]
+        self._remove(request_id)
+        if _closed(lead):
+            return
+        self._insert(request_id, rank_key(lead), _bucket(lead))
+        self.moves += 1
+
+    def _patch(self, request_id, fields):
+        lead = self._leads.get(request_id)
+        if lead is None:
+            lead = {"request_id": request_id}
+            self._leads[request_id] = lead
+        elif all(lead.get(name) == value for name, value in fields.items()):
+            return False
+        old_key = self._keys.get(request_id)
+        lead.update(fields)
+        if (old_key is None or rank_key(lead) != old_key or _closed(lead)
+                or _bucket(lead) != self._bucket_of.get(request_id)):
+            self._reposition(request_id)
+        return True
+
+    def apply_bookings(self, rows) -> int:
+        """Merge booking rows (full or partial); returns how many leads changed.
+
+        Passing the same list object twice in a row is a no-op, so the
+        dashboard can call this on every rerun with the cached bookings list.
+        """
+        with self._lock:
+            if rows is self._last_bookings:
+                return 0
+            changed = 0
+            for row in rows:
+                fields = {name: row[name] for name in TRACKED_FIELDS if name in row}
+                if "booking_timestamp" in fields and not isinstance(fields["booking_timestamp"], str):
+                    fields["booking_timestamp"] = str(fields["booking_timestamp"])
+                changed += self._patch(row["request_id"], fields)
+                self._leads.move_to_end(row["request_id"])
+            while len(self._leads) > self.max_leads:
+                self._drop(next(iter(self._leads)))
+            self._last_bookings = rows
+            return changed
+
+    def apply_insights(self, insights_map) -> int:
+        """Merge ``{request_id: insight}``; only ``last_engaged_at`` affects the ranking."""
+        with self._lock:
+            if insights_map is self._last_insights:
+                return 0
+            changed = 0
+            for request_id, insight in insights_map.items():
+                if request_id in self._leads:
+                    changed += self._patch(request_id, {"last_engaged_at": (insight or {}).get("last_engaged_at")})
+            self._last_insights = insights_map
+            return changed
+
+    def _drop(self, request_id):
+        self._remove(request_id)
+        self._leads.pop(request_id, None)
+
+    def remove(self, request_id):
+        with self._lock:
+            self._drop(request_id)
+
+    def top(self, k, location=None, start=None, end=None, tiers=None, statuses=None) -> list:
+        """The ``k`` leads to call first, optionally limited to a location, booking days ``start..end``
+        (inclusive dates), lead ``tiers`` and action ``statuses``.
+
+        Merges only the per-day lists of the range, so it costs O(days in range + k log days),
+        plus the leads skipped by the tier/status filters.
+        """
+        with self._lock:
+            if (not location or location == "All Locations") and start is None and end is None:
+                lists = [self._order]
+            else:
+                locations = [location] if location and location != "All Locations" else list(self._days)
+                low = start.isoformat() if start is not None else ""
+                high = end.isoformat() if end is not None else "\uffff"
+                lists = []
+                for loc in locations:
+                    days = self._days.get(loc, [])
+                    for day in days[bisect.bisect_left(days, low):bisect.bisect_right(days, high)]:
+                        lists.append(self._buckets[(loc, day)])
+            result = []
+            for key in heapq.merge(*lists):
+                lead = self._leads[key[-1]]
+                if statuses and lead.get("action_status") not in statuses:
+                    continue
+                if tiers and _tier(lead) not in tiers:
+                    continue
+                result.append(dict(lead, reason=reason(lead)))
+                if len(result) >= k:
+                    break
+            return result
+
+    def __len__(self):
+        with self._lock:
+            return len(self._order)
+
+    def clear(self):
+        with self._lock:
+            self._leads.clear()
+            self._keys.clear()
+            self._order.clear()
+            self._buckets.clear()
+            self._bucket_of.clear()
+            self._days.clear()
+            self._last_bookings = None
+            self._last_insights = None
+
+
+_index = CallIndex()
+
+
+def get_index() -> CallIndex:
+    """Process-wide index shared by all sessions."""
+    return _index
@@ -0,0 +1,249 @@
+"""Full recomputation of lead scores from bookings and email interactions.
+
+``track-email-event`` only ever nudges one lead's score by one event, so a
+change to the point rules (or scores that drifted out of sync) could not be
+repaired. This job rebuilds every ``numeric_lead_score`` / ``lead_score``
+pair from scratch with the same rules as the edge function:
+
+* baseline from ``time_frame`` (the score a new booking starts with);
+* +1 for the first ``opened`` event only, +2 for every ``clicked_video`` /
+  ``clicked_pdf``;
+* capped at ``SCORE_CAP``. Points are never negative, so capping once at the
+  end equals capping after each event.
+
+Both tables are streamed with keyset pagination and interactions are folded
+into per-lead totals page by page with pandas, so memory is bounded by the
+number of leads, not events. Only rows whose score changes are written back.
+Writes are grouped by ``(old score, new score)`` into one
+``update ... where request_id in (...) and numeric_lead_score = old`` per
+chunk: a handful of round-trips in total, and a lead that scored an event
+while the job ran is left alone instead of being overwritten.
+
+Run ``python rescore.py --dry-run`` for a diff report without writing.
+"""
+import argparse
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+TIME_FRAME_BASELINE = {
+    "0-3-months": 10,
+    "3-6-months": 7,
+    "6-12-months": 5,
+    "exploring-now": 2,
+}
+EVENT_POINTS = {"clicked_video": 2, "clicked_pdf": 2}
+OPEN_EVENT = "opened"
+OPEN_POINTS = 1
+SCORE_CAP = 15
+
+BOOKINGS_TABLE = "bookings"
+INTERACTIONS_TABLE = "email_interactions"
+PAGE_SIZE = 10_000
+WRITE_CHUNK = 500
+# Fold per-page aggregates together every N pages to keep the list short.
+COMPACT_EVERY = 50
+
+
+def label_for(scores):
+    """Vectorised ``label_from_numeric``: Hot >= 10, Warm >= 5, else Cold."""
+    scores = np.asarray(scores)
+    return np.where(scores >= 10, "Hot", np.where(scores >= 5, "Warm", "Cold"))
+
+
+def iter_pages(supabase, table, columns, key, page_size=PAGE_SIZE):
+    """Yield DataFrames of ``table`` in ``key`` order, ``page_size`` rows at a time."""
+    last = None
+    while True:
+        query = supabase.from_(table).select(", ".join(columns)).order(key).limit(page_size)
+        if last is not None:
+            query = query.gt(key, last)
+        rows = query.execute().data or []
+        if not rows:
+            return
+        yield pd.DataFrame(rows, columns=columns)
+        if len(rows) < page_size:
+            return
+        last = rows[-1][key]
+
+
+def aggregate_events(events):
+    """Per-lead ``points`` and ``opened`` totals for one page of interactions."""
+    return (
+        pd.DataFrame({
+            "request_id": events["request_id"],
+            "points": events["event_type"].map(EVENT_POINTS).fillna(0).astype("int64"),
+            "opened": (events["event_type"] == OPEN_EVENT).astype("int8"),
+        })
+        .groupby("request_id", sort=False)
+        .agg(points=("points", "sum"), opened=("opened", "max"))
+    )
+
+
+def _fold(partials):
+    return pd.concat(partials).groupby(level=0, sort=False).agg(points=("points", "sum"), opened=("opened", "max"))
+
+
+def event_totals(pages):
+    """Fold interaction pages into one frame indexed by request_id."""
+    partials, totals = [], None
+    for page in pages:
+        if page.empty:
+            continue
+        partials.append(aggregate_events(page))
+        if len(partials) >= COMPACT_EVERY:
+            partials = [_fold(partials)]
+    if partials:
+        totals = _fold(partials)
+    if totals is None:
+        totals = pd.DataFrame({"points": pd.Series(dtype="int64"), "opened": pd.Series(dtype="int8")})
+        totals.index.name = "request_id"
+    return totals
+
+
+def compute_scores(bookings, totals):
+    """Old and recomputed scores for every booking with a known ``time_frame``.
+
+    Returns ``(scores, skipped)`` where ``skipped`` counts bookings whose
+    ``time_frame`` has no baseline; their scores are left untouched.
+    """
+    baseline = bookings["time_frame"].map(TIME_FRAME_BASELINE)
+    known = baseline.notna()
+    scored = bookings.loc[known, ["request_id", "numeric_lead_score", "lead_score"]].copy()
+    scored = scored.join(totals, on="request_id")
+    points = scored["points"].fillna(0).to_numpy("int64")
+    opened = scored["opened"].fillna(0).to_numpy("int64")
+    new_scores = np.minimum(baseline[known].to_numpy("int64") + points + opened * OPEN_POINTS, SCORE_CAP)
+    scored["old_numeric_lead_score"] = pd.to_numeric(scored.pop("numeric_lead_score"), errors="coerce")
+    scored["old_lead_score"] = scored.pop("lead_score")
+    scored["numeric_lead_score"] = new_scores
+    scored["lead_score"] = label_for(new_scores)
+    return scored.drop(columns=["points", "opened"]).reset_index(drop=True), int((~known).sum())
+
+
+def changed_rows(scores):
+    """Rows whose numeric score or label differs from what is stored."""
+    mask = (scores["old_numeric_lead_score"] != scores["numeric_lead_score"]) | (
+        scores["old_lead_score"] != scores["lead_score"]
+    )
+    return scores[mask].reset_index(drop=True)
+
+
+@dataclass
+class RescoreReport:
+    bookings: int = 0
+    interactions: int = 0
+    skipped_unknown_time_frame: int = 0
+    written: int = 0
+    conflicts: int = 0
+    dry_run: bool = True
+    elapsed_s: float = 0.0
+    diff: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+    def summary(self) -> str:
+        if self.dry_run:
+            outcome = f"{len(self.diff)} lead(s) would change"
+        else:
+            outcome = f"{self.written} of {len(self.diff)} changed lead(s) written ({self.conflicts} updated concurrently, left alone)"
+        return (
+            f"Rescored {self.bookings} bookings from {self.interactions} interactions in {self.elapsed_s:.1f}s: "
+            f"{outcome}; {self.skipped_unknown_time_frame} with unknown time_frame left as is."
+        )
+
+    def transitions(self) -> pd.DataFrame:
+        """Count of changed leads per (old label -> new label)."""
+        if self.diff.empty:
+            return pd.DataFrame(columns=["old_lead_score", "lead_score", "leads"])
+        return (
+            self.diff.groupby(["old_lead_score", "lead_score"], dropna=False)
+            .size().reset_index(name="leads")
+            .sort_values("leads", ascending=False)
+        )
+
+
+def write_changes(supabase, diff, table=BOOKINGS_TABLE, chunk=WRITE_CHUNK):
+    """Apply ``diff`` with one compare-and-set update per (old, new) score group and chunk.
+
+    Returns ``(written, conflicts)``; a conflict is a lead whose stored score
+    no longer matched the one the job read.
+    """
+    written = conflicts = 0
+    groups = diff.groupby(["old_numeric_lead_score", "numeric_lead_score", "lead_score"], dropna=False, sort=False)
+    for (old_score, new_score, label), group in groups:
+        ids = group["request_id"].tolist()
+        for i in range(0, len(ids), chunk):
+            batch = ids[i:i + chunk]
+            query = supabase.from_(table).update(
+                {"numeric_lead_score": int(new_score), "lead_score": label}
+            ).in_("request_id", batch)
+            if pd.isna(old_score):
+                query = query.is_("numeric_lead_score", "null")
+            else:
+                query = query.eq("numeric_lead_score", int(old_score))
+            updated = len(query.execute().data or [])
+            written += updated
+            conflicts += len(batch) - updated
+    return written, conflicts
+
+
+def run_rescore(supabase, dry_run=True, page_size=PAGE_SIZE):
+    """Recompute every lead score; write the changed ones unless ``dry_run``."""
+    started = time.time()
+    report = RescoreReport(dry_run=dry_run)
+
+    def counted(pages, attr):
+        for page in pages:
+            setattr(report, attr, getattr(report, attr) + len(page))
+            yield page
+
+    totals = event_totals(counted(
+        iter_pages(supabase, INTERACTIONS_TABLE, ["id", "request_id", "event_type"], "id", page_size),
+        "interactions",
+    ))
+    booking_pages = list(counted(
+        iter_pages(supabase, BOOKINGS_TABLE, ["request_id", "time_frame", "numeric_lead_score", "lead_score"],
+                   "request_id", page_size),
+        "bookings",
+    ))
+    if booking_pages:
+        bookings = pd.concat(booking_pages, ignore_index=True)
+    else:
+        bookings = pd.DataFrame(columns=["request_id", "time_frame", "numeric_lead_score", "lead_score"])
+    scores, report.skipped_unknown_time_frame = compute_scores(bookings, totals)
+    report.diff = changed_rows(scores)
+    if not dry_run and not report.diff.empty:
+        report.written, report.conflicts = write_changes(supabase, report.diff)
+    report.elapsed_s = time.time() - started
+    logging.info(report.summary())
+    return report
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    parser = argparse.ArgumentParser(description="Recompute every lead score from bookings and email interactions.")
+    parser.add_argument("--dry-run", action="store_true", help="Report the changes without writing them.")
+    parser.add_argument("--diff-csv", help="Write the per-lead diff to this CSV file.")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    report = run_rescore(supabase, dry_run=args.dry_run, page_size=args.page_size)
+    print(report.summary())
+    if not report.diff.empty:
+        print(report.transitions().to_string(index=False))
+        print(report.diff.head(20).to_string(index=False))
+    if args.diff_csv:
+        report.diff.to_csv(args.diff_csv, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
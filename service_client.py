@@ -0,0 +1,253 @@
+"""Resilient HTTP client for the automotive agent and personalized ad services.
+
+Fixed 15-120 s timeouts meant a cold or dead backend cost every click the full
+timeout. ``ServiceClient`` adds, per endpoint (base URL + path):
+
+* a circuit breaker: after ``failure_threshold`` consecutive failures the
+  endpoint is *open* and calls fail in milliseconds with
+  ``ServiceDegradedError`` until ``reset_timeout`` passes, then one trial call
+  is let through (*half-open*);
+* an adaptive read timeout learned from recent successful latencies
+  (p95 x ``TIMEOUT_MULTIPLIER``), bounded by the caller's old fixed timeout.
+  Calls that must not be cut short and retried - batch triggers and sends,
+  which are not idempotent - pass ``adaptive=False`` and keep the fixed one;
+* a short connect timeout so an unreachable host fails fast.
+
+``health()`` returns the last known state without touching the network and
+schedules a cheap background ``GET /health`` probe when that state is stale.
+A successful probe lets open breakers retry early; a failed one is reported
+but only the breakers decide whether the service counts as degraded.
+
+``post(..., coalesce=True)`` is for read-only calls: identical requests made
+while one is in flight share its response.
+
+``ServiceDegradedError`` subclasses ``requests.exceptions.ConnectionError`` so
+the dashboard's existing ``except RequestException`` handlers cover it.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+
+import single_flight
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+CONNECT_TIMEOUT = 3.05
+MIN_READ_TIMEOUT = 2.0
+TIMEOUT_MULTIPLIER = 3.0
+MIN_LATENCY_SAMPLES = 5
+LATENCY_SAMPLES = 50
+PROBE_TIMEOUT = 2.0
+PROBE_INTERVAL = 30.0
+
+
+class ServiceDegradedError(requests.exceptions.ConnectionError):
+    """Raised immediately while an endpoint's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def half_open(self):
+        """Allow a trial call now (used when a health probe succeeds)."""
+        with self._lock:
+            if self.state == OPEN:
+                self.state = HALF_OPEN
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+
+class Endpoint:
+    def __init__(self, failure_threshold, reset_timeout):
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def learned_timeout(self):
+        """p95 of recent latencies times a safety factor, or None until enough samples."""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+        return max(MIN_READ_TIMEOUT, p95 * TIMEOUT_MULTIPLIER)
+
+    def read_timeout(self, ceiling) -> float:
+        learned = self.learned_timeout()
+        return ceiling if learned is None else min(ceiling, learned)
+
+
+class ServiceClient:
+    def __init__(self, name, base_url, health_path="/health", failure_threshold=3, reset_timeout=30.0):
+        self.name = name
+        self.base_url = (base_url or "").rstrip("/")
+        self.health_path = health_path
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.session = requests.Session()
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self._probe_ok = None
+        self._probe_at = 0.0
+        self._probe_latency = None
+        self._probing = False
+
+    def _endpoint(self, path) -> Endpoint:
+        with self._lock:
+            endpoint = self._endpoints.get(path)
+            if endpoint is None:
+                endpoint = Endpoint(self.failure_threshold, self.reset_timeout)
+                self._endpoints[path] = endpoint
+            return endpoint
+
+    def post(self, path, timeout=60, coalesce=False, adaptive=True, **kwargs) -> requests.Response:
+        """POST to ``base_url + path`` through the endpoint's breaker.
+
+        ``timeout`` is the old fixed value and acts as the upper bound of the
+        adaptive read timeout; with ``adaptive=False`` it is used as is.
+        5xx responses, timeouts and connection errors count as failures; 4xx
+        responses do not. With ``coalesce`` concurrent identical calls share
+        one request and its response.
+        """
+        if coalesce:
+            key = single_flight.request_key(self.base_url, path, kwargs)
+            return single_flight.get_group(self.name).do(
+                key, lambda: self.post(path, timeout=timeout, adaptive=adaptive, **kwargs)
+            )
+        endpoint = self._endpoint(path)
+        if not endpoint.breaker.allow():
+            raise ServiceDegradedError(
+                f"{self.name} is degraded ({path} failing); retrying in {endpoint.breaker.retry_in():.0f}s."
+            )
+        read_timeout = endpoint.read_timeout(timeout) if adaptive else timeout
+        started = time.monotonic()
+        try:
+            response = self.session.post(f"{self.base_url}{path}", timeout=(CONNECT_TIMEOUT, read_timeout), **kwargs)
+        except requests.exceptions.RequestException:
+            endpoint.breaker.record_failure()
+            raise
+        elapsed = time.monotonic() - started
+        if response.status_code >= 500:
+            endpoint.breaker.record_failure()
+        else:
+            endpoint.breaker.record_success()
+            endpoint.record_latency(elapsed)
+        return response
+
+    # --- health ------------------------------------------------------------
+    def probe(self) -> bool:
+        """Cheap liveness check; any non-5xx answer counts as up."""
+        started = time.monotonic()
+        try:
+            response = self.session.get(f"{self.base_url}{self.health_path}", timeout=(CONNECT_TIMEOUT, PROBE_TIMEOUT))
+            ok = response.status_code < 500
+        except requests.exceptions.RequestException:
+            ok = False
+        with self._lock:
+            self._probe_ok = ok
+            self._probe_at = time.monotonic()
+            self._probe_latency = time.monotonic() - started
+            self._probing = False
+            endpoints = list(self._endpoints.values())
+        if ok:
+            for endpoint in endpoints:
+                endpoint.breaker.half_open()
+        else:
+            logging.warning(f"Health probe failed for {self.name} ({self.base_url}{self.health_path})")
+        return ok
+
+    def _maybe_probe(self):
+        with self._lock:
+            if self._probing or time.monotonic() - self._probe_at < PROBE_INTERVAL:
+                return
+            self._probing = True
+        threading.Thread(target=self.probe, name=f"probe-{self.name}", daemon=True).start()
+
+    def degraded(self) -> bool:
+        """True while any endpoint's breaker is open; a failing ``/health`` alone does not count."""
+        self._maybe_probe()
+        with self._lock:
+            endpoints = list(self._endpoints.values())
+        return any(e.breaker.state == OPEN for e in endpoints)
+
+    def health(self) -> dict:
+        """Non-blocking snapshot for the UI."""
+        degraded = self.degraded()
+        with self._lock:
+            endpoints = dict(self._endpoints)
+            probe_ok, probe_latency = self._probe_ok, self._probe_latency
+        return {
+            "name": self.name,
+            "degraded": degraded,
+            "probe_ok": probe_ok,
+            "probe_latency_s": probe_latency,
+            "endpoints": {
+                path: {
+                    "state": e.breaker.state,
+                    "failures": e.breaker.failures,
+                    "retry_in_s": e.breaker.retry_in(),
+                    "learned_timeout_s": e.learned_timeout(),
+                }
+                for path, e in endpoints.items()
+            },
+        }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name, base_url, **kwargs) -> ServiceClient:
+    """Process-wide client per (name, base URL), so breakers are shared by all sessions."""
+    key = (name, (base_url or "").rstrip("/"))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = ServiceClient(name, base_url, **kwargs)
+            _clients[key] = client
+        return client
@@ -0,0 +1,130 @@
+"""Bounded per-session store for AI outputs shown on lead cards.
+
+Offer suggestions, talking points and follow-up drafts used to live in
+``st.session_state`` under one permanent key per lead
+(``suggested_offer_<id>``, ``draft_body_<id>``...), so long sessions grew
+without bound. ``ArtifactStore`` keeps them in a single LRU map with an item
+cap and a byte cap. Evicted offers and talking points are not lost: ``get``
+accepts a ``restore`` callable that looks the value up in the process-wide
+LLM result cache (``precompute.get_store()``), where they are also written.
+Follow-up drafts belong to the rep who made them and are kept here only, so
+an evicted draft has to be drafted again.
+
+Every live store registers itself in a weak set so the instrumentation panel
+can report totals across sessions.
+"""
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+DEFAULT_MAX_ITEMS = int(os.getenv("ARTIFACT_MAX_ITEMS", "100"))
+DEFAULT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(1024 * 1024)))
+
+SESSION_KEY = "_ai_artifacts"
+
+_live_stores = weakref.WeakSet()
+_live_lock = threading.Lock()
+
+
+def estimate_size(value) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ArtifactStore:
+    def __init__(self, max_items=DEFAULT_MAX_ITEMS, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # (kind, request_id) -> (value, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.restores = 0
+        self.evictions = 0
+        with _live_lock:
+            _live_stores.add(self)
+
+    def set(self, kind, request_id, value):
+        key = (kind, request_id)
+        self.pop(kind, request_id)
+        size = estimate_size(value)
+        self._items[key] = (value, size)
+        self.bytes += size
+        while self._items and (len(self._items) > self.max_items or self.bytes > self.max_bytes):
+            _, (_, evicted_size) = self._items.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def get(self, kind, request_id, restore=None):
+        """Return the artifact, falling back to ``restore()`` if it was evicted or never set here.
+
+        Restored values are not re-inserted; the shared cache already holds them.
+        """
+        key = (kind, request_id)
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+        self.misses += 1
+        if restore is not None:
+            value = restore()
+            if value is not None:
+                self.restores += 1
+                return value
+        return None
+
+    def pop(self, kind, request_id):
+        item = self._items.pop((kind, request_id), None)
+        if item is None:
+            return None
+        self.bytes -= item[1]
+        return item[0]
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self) -> dict:
+        return {
+            "items": len(self._items),
+            "bytes": self.bytes,
+            "max_items": self.max_items,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "restores": self.restores,
+            "evictions": self.evictions,
+        }
+
+    # Session state may be pickled and restored by Streamlit; re-register on unpickle.
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        with _live_lock:
+            _live_stores.add(self)
+
+
+def get_store(session_state) -> ArtifactStore:
+    """The artifact store of the current Streamlit session."""
+    if SESSION_KEY not in session_state:
+        session_state[SESSION_KEY] = ArtifactStore()
+    return session_state[SESSION_KEY]
+
+
+def process_totals() -> dict:
+    """Aggregate accounting across every live session in this process."""
+    with _live_lock:
+        stores = list(_live_stores)
+    return {
+        "sessions": len(stores),
+        "items": sum(len(s) for s in stores),
+        "bytes": sum(s.bytes for s in stores),
+        "evictions": sum(s.evictions for s in stores),
+        "restores": sum(s.restores for s in stores),
+    }
@@ -0,0 +1,470 @@
+"""Shared cache tier for data fetched from Supabase.
+
+``st.cache_data`` lives inside one Streamlit process, so N web replicas used
+to run N identical Supabase queries per refresh. ``SharedCache`` sits behind
+``fetch_bookings_data`` / ``fetch_ai_insights_map`` and stores results in a
+backend every replica can see:
+
+* ``SQLiteCacheBackend`` - a WAL-mode SQLite file, for workers on one host;
+* ``RedisCacheBackend`` - optional, for replicas on different hosts
+  (needs the ``redis`` package);
+* ``MemoryCacheBackend`` - process-local, for tests and single workers.
+
+Keys are versioned per namespace (``bookings:v7:<hash>``). ``invalidate``
+bumps the namespace version in the backend, which every replica reads, so a
+write on one dyno invalidates all of them. A short lease per key makes one
+replica fetch while the others wait for its result, so a cold refresh costs
+about one Supabase read regardless of the replica count. Within a process,
+concurrent lookups of one key are coalesced (``single_flight``) before they
+reach the backend, so only one thread per replica polls the lease.
+
+Change detection across replicas goes through ``advance_marker``: a marker
+is a list of monotonically increasing values (e.g. the latest ``updated_at``
+of each table) and only ever moves forward, via compare-and-set, so the one
+replica that first sees a change is told and bumps the namespace once,
+however many replicas probe. ``invalidate(..., changed=days)`` records which
+days a version bump touched, and ``changed_since`` reads that log back so
+day-bucketed caches can drop just those days.
+
+``claim`` reuses the lease table as an idempotency guard: the first caller
+for a request within ``window`` seconds, on any replica, gets True; the
+dashboard uses it to drop duplicate batch dispatches.
+
+Pick the backend with ``SHARED_CACHE_URL``: ``sqlite:///path/to/file``,
+``redis://host:6379/0`` or ``memory://``. The default is
+``shared_cache.sqlite3`` in ``SHARED_CACHE_DIR`` (``.cache/`` next to this
+module), and relative SQLite paths are resolved against the app directory
+rather than the working directory, so every worker opens the same file
+however it was launched. A SQLite location that cannot be written raises
+``CacheConfigError`` instead of quietly degrading to a per-process cache.
+"""
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import single_flight
+
+try:
+    import redis
+except ImportError:
+    redis = None  # Only needed for redis:// cache URLs
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(APP_DIR, os.getenv("SHARED_CACHE_DIR", ".cache"))
+DEFAULT_CACHE_URL = f"sqlite:///{os.path.join(CACHE_DIR, 'shared_cache.sqlite3')}"
+LEASE_SECONDS = 30.0
+LEASE_POLL_SECONDS = 0.1
+CHANGE_LOG_SECONDS = 3600.0
+MAX_CHANGE_LOG_VERSIONS = 50
+
+
+class CacheConfigError(RuntimeError):
+    """The configured backend cannot be used (e.g. an unwritable SQLite path)."""
+
+
+class CacheBackend(ABC):
+    """Storage contract; values are JSON-serialisable objects."""
+
+    @abstractmethod
+    def get(self, key):
+        """Return the stored value, or None if missing or expired."""
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """Store ``value`` for ``ttl`` seconds."""
+
+    @abstractmethod
+    def get_version(self, namespace) -> int:
+        """Current version of ``namespace`` (0 if never bumped)."""
+
+    @abstractmethod
+    def bump_version(self, namespace) -> int:
+        """Atomically increment and return the namespace version."""
+
+    @abstractmethod
+    def get_marker(self, name):
+        """Stored marker (a JSON list), or None if never set."""
+
+    @abstractmethod
+    def compare_and_set_marker(self, name, expected, value) -> bool:
+        """Atomically replace the marker with ``value`` if it still equals ``expected`` (None = unset)."""
+
+    @abstractmethod
+    def acquire_lease(self, key, ttl) -> bool:
+        """Try to become the one process computing ``key``."""
+
+    @abstractmethod
+    def release_lease(self, key):
+        """Give up a lease taken with ``acquire_lease``."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._versions = {}
+        self._markers = {}
+        self._leases = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.time():
+                return None
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            now = time.time()
+            for stale in [k for k, (_, exp) in self._entries.items() if exp < now]:
+                del self._entries[stale]
+
+    def get_version(self, namespace):
+        with self._lock:
+            return self._versions.get(namespace, 0)
+
+    def bump_version(self, namespace):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            return self._versions[namespace]
+
+    def get_marker(self, name):
+        with self._lock:
+            return self._markers.get(name)
+
+    def compare_and_set_marker(self, name, expected, value):
+        with self._lock:
+            if self._markers.get(name) != expected:
+                return False
+            self._markers[name] = value
+            return True
+
+    def acquire_lease(self, key, ttl):
+        with self._lock:
+            now = time.time()
+            for expired in [k for k, exp in self._leases.items() if exp <= now]:
+                del self._leases[expired]  # claim keys are never released explicitly
+            if key in self._leases:
+                return False
+            self._leases[key] = now + ttl
+            return True
+
+    def release_lease(self, key):
+        with self._lock:
+            self._leases.pop(key, None)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Cache file shared by every worker process on the host."""
+
+    def __init__(self, path):
+        self.path = os.path.join(APP_DIR, path)  # absolute paths are kept as given
+        directory = os.path.dirname(self.path)
+        self._local = threading.local()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if not os.access(directory, os.W_OK):
+                raise PermissionError(f"directory {directory} is not writable")
+            conn = self._conn()
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+                conn.execute("CREATE TABLE IF NOT EXISTS versions (namespace TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+                conn.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+                conn.execute("CREATE TABLE IF NOT EXISTS markers (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        except (OSError, sqlite3.Error) as e:
+            raise CacheConfigError(
+                f"Shared cache file {self.path} is not writable ({e}); set SHARED_CACHE_DIR or SHARED_CACHE_URL."
+            ) from e
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, default=str), now + ttl),
+        )
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+
+    def get_version(self, namespace):
+        row = self._conn().execute("SELECT version FROM versions WHERE namespace = ?", (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, namespace):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO versions (namespace, version) VALUES (?, 1) "
+                "ON CONFLICT(namespace) DO UPDATE SET version = version + 1",
+                (namespace,),
+            )
+            version = conn.execute("SELECT version FROM versions WHERE namespace = ?", (namespace,)).fetchone()[0]
+            conn.execute("COMMIT")
+            return version
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_marker(self, name):
+        row = self._conn().execute("SELECT value FROM markers WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def compare_and_set_marker(self, name, expected, value):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM markers WHERE name = ?", (name,)).fetchone()
+            if (json.loads(row[0]) if row else None) != expected:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("INSERT OR REPLACE INTO markers (name, value) VALUES (?, ?)", (name, json.dumps(value, default=str)))
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire_lease(self, key, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+            taken = conn.execute("INSERT OR IGNORE INTO leases (key, expires_at) VALUES (?, ?)", (key, now + ttl)).rowcount == 1
+            conn.execute("COMMIT")
+            return taken
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release_lease(self, key):
+        self._conn().execute("DELETE FROM leases WHERE key = ?", (key,))
+
+
+class RedisCacheBackend(CacheBackend):
+    """Networked backend for replicas on different hosts."""
+
+    def __init__(self, url):
+        if redis is None:
+            raise ImportError("The 'redis' package is required for redis:// SHARED_CACHE_URL values.")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self.client.get(f"entry:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(f"entry:{key}", json.dumps(value, default=str), ex=max(1, int(ttl)))
+
+    def get_version(self, namespace):
+        return int(self.client.get(f"version:{namespace}") or 0)
+
+    def bump_version(self, namespace):
+        return int(self.client.incr(f"version:{namespace}"))
+
+    def get_marker(self, name):
+        raw = self.client.get(f"marker:{name}")
+        return json.loads(raw) if raw is not None else None
+
+    def compare_and_set_marker(self, name, expected, value):
+        key = f"marker:{name}"
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                raw = pipe.get(key)
+                if (json.loads(raw) if raw is not None else None) != expected:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.set(key, json.dumps(value, default=str))
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def acquire_lease(self, key, ttl):
+        return bool(self.client.set(f"lease:{key}", "1", nx=True, px=int(ttl * 1000)))
+
+    def release_lease(self, key):
+        self.client.delete(f"lease:{key}")
+
+
+def backend_from_url(url) -> CacheBackend:
+    if url.startswith("sqlite:///"):
+        return SQLiteCacheBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://")):
+        return RedisCacheBackend(url)
+    if url.startswith("memory://"):
+        return MemoryCacheBackend()
+    raise ValueError(f"Unsupported SHARED_CACHE_URL: {url}")
+
+
+def _later(a, b):
+    """The larger of two marker values; None is older than anything."""
+    if a is None or b is None:
+        return b if a is None else a
+    return max(a, b)
+
+
+def _args_hash(args) -> str:
+    return hashlib.sha1(json.dumps(args, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SharedCache:
+    def __init__(self, backend, lease_seconds=LEASE_SECONDS):
+        self.backend = backend
+        self.lease_seconds = lease_seconds
+        self.hits = 0
+        self.misses = 0
+        self.waited = 0
+        self.duplicates = 0
+
+    def version(self, namespace) -> int:
+        return self.backend.get_version(namespace)
+
+    def key(self, namespace, args) -> str:
+        return f"{namespace}:v{self.version(namespace)}:{_args_hash(args)}"
+
+    def invalidate(self, *namespaces, changed=None):
+        """Bump namespace versions; every replica's next lookup misses.
+
+        ``changed`` (e.g. the ISO days whose rows moved) is logged against each
+        new version for ``changed_since``; without it a bump counts as "everything changed".
+        """
+        for namespace in namespaces:
+            version = self.backend.bump_version(namespace)
+            if changed is not None:
+                self.backend.set(f"changes:{namespace}:v{version}", sorted(changed), CHANGE_LOG_SECONDS)
+
+    def changed_since(self, namespace, old_version, new_version):
+        """Union of what the bumps ``old_version`` -> ``new_version`` changed, or None if any bump is unscoped."""
+        if new_version - old_version > MAX_CHANGE_LOG_VERSIONS:
+            return None
+        changed = set()
+        for version in range(old_version + 1, new_version + 1):
+            logged = self.backend.get(f"changes:{namespace}:v{version}")
+            if logged is None:
+                return None
+            changed.update(logged)
+        return changed
+
+    def advance_marker(self, name, values):
+        """Move the shared marker ``name`` forward to the element-wise max of it and ``values``.
+
+        Returns the previous marker if this call moved it, so exactly one caller
+        per change gets a result; None if the marker was already there or
+        ahead, or is being set for the first time.
+        """
+        values = json.loads(json.dumps(list(values), default=str))
+        while True:
+            stored = self.backend.get_marker(name)
+            merged = values if stored is None else [
+                _later(old, new) for old, new in itertools.zip_longest(stored, values)
+            ]
+            if merged == stored:
+                return None
+            if self.backend.compare_and_set_marker(name, stored, merged):
+                return stored
+
+    def get_or_compute(self, namespace, args, ttl, compute, refresh=False):
+        """Return the cached value for ``(namespace, args)`` or compute and share it.
+
+        Only the replica holding the lease calls ``compute``; the others poll
+        for its result and fall back to computing themselves if the lease
+        expires without one. Exceptions from ``compute`` propagate and nothing
+        is cached. ``refresh`` ignores a cached value and replaces it (used by
+        the warm-up to renew entries before they expire).
+        """
+        key = self.key(namespace, args)
+        return single_flight.get_group("shared_cache").do(
+            key, lambda: self._get_or_compute(namespace, key, ttl, compute, refresh)
+        )
+
+    def _get_or_compute(self, namespace, key, ttl, compute, refresh=False):
+        value = None if refresh else self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        deadline = time.time() + self.lease_seconds
+        while not self.backend.acquire_lease(key, self.lease_seconds):
+            if time.time() >= deadline:
+                logging.warning(f"Shared cache lease for {namespace} not released in time; computing locally.")
+                return compute()
+            time.sleep(LEASE_POLL_SECONDS)
+            value = self.backend.get(key)
+            if value is not None:
+                self.waited += 1
+                return value
+        try:
+            value = None if refresh else self.backend.get(key)  # filled while we were acquiring
+            if value is None:
+                value = compute()
+                self.backend.set(key, value, ttl)
+            return value
+        finally:
+            self.backend.release_lease(key)
+
+    def claim(self, namespace, args, window) -> bool:
+        """True for the first caller of ``(namespace, args)`` in ``window`` seconds across all replicas."""
+        taken = self.backend.acquire_lease(f"claim:{namespace}:{_args_hash(args)}", window)
+        if not taken:
+            self.duplicates += 1
+        return taken
+
+    def release_claim(self, namespace, args):
+        """Give a claim back early, e.g. when the claimed action failed and may be retried."""
+        self.backend.release_lease(f"claim:{namespace}:{_args_hash(args)}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__, "hits": self.hits, "misses": self.misses,
+            "waited": self.waited, "duplicates": self.duplicates,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SharedCache:
+    """Process-wide cache built from ``SHARED_CACHE_URL``.
+
+    An unreachable Redis falls back to memory; a misconfigured cache
+    (unwritable SQLite path, unknown scheme) raises.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            url = os.getenv("SHARED_CACHE_URL", DEFAULT_CACHE_URL)
+            try:
+                backend = backend_from_url(url)
+            except (CacheConfigError, ValueError):
+                raise
+            except Exception as e:
+                logging.error(f"Shared cache backend {url} unavailable, using in-process cache: {e}")
+                backend = MemoryCacheBackend()
+            _cache = SharedCache(backend)
+        return _cache
@@ -0,0 +1,251 @@
+"""Local similar-lead retrieval over sales notes and AI rolling summaries.
+
+Each lead becomes a TF-IDF vector over hashed word unigrams and bigrams of
+its ``sales_notes``, ``current_vehicle`` and ``ai_lead_insights.rolling_summary``
+(feature hashing, so there is no vocabulary to maintain). Vectors are kept
+as one append-only sparse matrix in NumPy buffers:
+
+* updating a lead appends its new row and tombstones the old one; the
+  buffers are compacted once more than half of them is dead;
+* document frequencies are adjusted per update, and IDF weights and row
+  norms are recomputed lazily only when they changed since the last query;
+* a query is one pass over the non-zeros (``np.bincount``) plus
+  ``argpartition`` for the top k, a few milliseconds for tens of thousands
+  of leads.
+
+No external service or extra dependency; the index is process-wide and fed
+from whatever bookings/insights the dashboard loads.
+"""
+import re
+import threading
+import zlib
+
+import numpy as np
+
+SIMILAR = "similar_leads"  # session artifact kind for a card's last result
+
+N_FEATURES = 1 << 20
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its of on or she that the their they "
+    "this to was were will with".split()
+)
+META_FIELDS = ("full_name", "vehicle", "current_vehicle", "location", "action_status")
+
+
+def tokens(text):
+    words = [w for w in TOKEN_RE.findall((text or "").lower()) if w not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def hashed_counts(text):
+    """{feature index: count} for ``text``; crc32 keeps indices stable across processes."""
+    counts = {}
+    for token in tokens(text):
+        index = zlib.crc32(token.encode("utf-8")) % N_FEATURES
+        counts[index] = counts.get(index, 0) + 1
+    return counts
+
+
+def lead_text(notes=None, current_vehicle=None, summary=None):
+    return " ".join(part for part in (notes, current_vehicle, summary) if part)
+
+
+class _Buffer:
+    """Growable 1-D NumPy array with amortised O(1) appends."""
+
+    def __init__(self, dtype, capacity=1024):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        n = len(values)
+        if self.size + n > len(self.data):
+            grown = np.empty(max(len(self.data) * 2, self.size + n), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:self.size + n] = values
+        self.size += n
+
+    def view(self):
+        return self.data[:self.size]
+
+
+class SimilarLeadIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = _Buffer(np.int32)  # slot of each non-zero
+        self._cols = _Buffer(np.int32)  # feature index of each non-zero
+        self._tf = _Buffer(np.float32)  # sublinear term frequency of each non-zero
+        self._slot_owner = []  # slot -> request_id, or None once superseded
+        self._slot_of = {}  # request_id -> live slot
+        self._dead_slots = []  # superseded slots, zeroed out of query results
+        self._counts = {}  # request_id -> hashed counts of the indexed text
+        self._texts = {}  # request_id -> (notes, current_vehicle, summary)
+        self._meta = {}  # request_id -> display fields
+        self._df = np.zeros(N_FEATURES, dtype=np.int32)
+        self._dead_nnz = 0
+        self._weights_dirty = True
+        self._idf = None
+        self._weights = None
+        self._norms = None
+        self._last_bookings = None
+        self._last_insights = None
+
+    # --- updates ---
+
+    def _index(self, request_id):
+        notes, vehicle, summary = self._texts[request_id]
+        counts = hashed_counts(lead_text(notes, vehicle, summary))
+        old = self._counts.get(request_id)
+        if old == counts and request_id in self._slot_of:
+            return False
+        old_slot = self._slot_of.pop(request_id, None)
+        if old_slot is not None:
+            self._slot_owner[old_slot] = None
+            self._dead_slots.append(old_slot)
+            self._dead_nnz += len(old)
+            self._df[list(old)] -= 1
+        self._counts[request_id] = counts
+        if counts:
+            slot = len(self._slot_owner)
+            self._slot_owner.append(request_id)
+            self._slot_of[request_id] = slot
+            cols = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+            self._rows.extend(np.full(len(counts), slot, dtype=np.int32))
+            self._cols.extend(cols)
+            self._tf.extend(tf)
+            self._df[cols] += 1
+        self._weights_dirty = True
+        if self._dead_nnz > max(4096, self._rows.size // 2):
+            self._compact()
+        return True
+
+    def _update_text(self, request_id, notes=None, vehicle=None, summary=None):
+        current = self._texts.get(request_id, (None, None, None))
+        new = (
+            current[0] if notes is None else notes,
+            current[1] if vehicle is None else vehicle,
+            current[2] if summary is None else summary,
+        )
+        if new == current and request_id in self._counts:
+            return False
+        self._texts[request_id] = new
+        return self._index(request_id)
+
+    def apply_bookings(self, rows) -> int:
+        """Index notes/vehicle of booking rows; the same list object twice in a row is a no-op."""
+        with self._lock:
+            if rows is self._last_bookings:
+                return 0
+            changed = 0
+            for row in rows:
+                request_id = row["request_id"]
+                meta = self._meta.setdefault(request_id, {"request_id": request_id})
+                meta.update({name: row[name] for name in META_FIELDS if name in row})
+                if "sales_notes" in row or "current_vehicle" in row:
+                    changed += self._update_text(
+                        request_id,
+                        notes=(row.get("sales_notes") or "") if "sales_notes" in row else None,
+                        vehicle=(row.get("current_vehicle") or "") if "current_vehicle" in row else None,
+                    )
+            self._last_bookings = rows
+            return changed
+
+    def apply_insights(self, insights_map) -> int:
+        """Index ``rolling_summary`` from ``{request_id: insight}``."""
+        with self._lock:
+            if insights_map is self._last_insights:
+                return 0
+            changed = 0
+            for request_id, insight in insights_map.items():
+                summary = (insight or {}).get("rolling_summary")
+                if summary is not None:
+                    changed += self._update_text(request_id, summary=summary)
+            self._last_insights = insights_map
+            return changed
+
+    def _compact(self):
+        live = np.zeros(len(self._slot_owner), dtype=bool)
+        live[list(self._slot_of.values())] = True
+        keep = live[self._rows.view()]
+        old_slots = np.flatnonzero(live)
+        remap = np.full(len(self._slot_owner), -1, dtype=np.int32)
+        remap[old_slots] = np.arange(len(old_slots), dtype=np.int32)
+        rows, cols, tf = remap[self._rows.view()[keep]], self._cols.view()[keep], self._tf.view()[keep]
+        capacity = len(rows) + 1024
+        self._rows, self._cols, self._tf = _Buffer(np.int32, capacity), _Buffer(np.int32, capacity), _Buffer(np.float32, capacity)
+        self._rows.extend(rows)
+        self._cols.extend(cols)
+        self._tf.extend(tf)
+        self._slot_owner = [self._slot_owner[s] for s in old_slots]
+        self._slot_of = {rid: slot for slot, rid in enumerate(self._slot_owner)}
+        self._dead_slots = []
+        self._dead_nnz = 0
+        self._weights_dirty = True
+
+    # --- queries ---
+
+    def _refresh_weights(self):
+        if not self._weights_dirty:
+            return
+        n_docs = len(self._slot_of)
+        self._idf = (np.log((1.0 + n_docs) / (1.0 + self._df)) + 1.0).astype(np.float32)
+        self._weights = self._tf.view() * self._idf[self._cols.view()]
+        squared = np.bincount(self._rows.view(), weights=self._weights * self._weights, minlength=len(self._slot_owner))
+        self._norms = np.sqrt(squared).astype(np.float32)
+        self._weights_dirty = False
+
+    def similar(self, request_id, k=5, text=None) -> list:
+        """Top ``k`` other leads by cosine similarity to ``request_id`` (or to ``text``).
+
+        Each match is the lead's display fields (including its current
+        ``action_status``) plus ``similarity`` in 0..1.
+        """
+        with self._lock:
+            counts = hashed_counts(text) if text is not None else self._counts.get(request_id)
+            if not counts or not self._slot_of:
+                return []
+            self._refresh_weights()
+            query = np.zeros(N_FEATURES, dtype=np.float32)
+            cols = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            query[cols] = (1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))) * self._idf[cols]
+            query_norm = float(np.linalg.norm(query[cols]))
+            if query_norm == 0.0:
+                return []
+            dots = np.bincount(
+                self._rows.view(), weights=self._weights * query[self._cols.view()], minlength=len(self._slot_owner)
+            )
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = np.where(self._norms > 0, dots / (self._norms * query_norm), 0.0)
+            own_slot = self._slot_of.get(request_id)
+            if own_slot is not None:
+                scores[own_slot] = 0.0
+            scores[self._dead_slots] = 0.0
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            matches = []
+            for slot in top:
+                if scores[slot] <= 0.0:
+                    break
+                owner = self._slot_owner[slot]
+                matches.append(dict(self._meta.get(owner, {"request_id": owner}), similarity=round(float(scores[slot]), 3)))
+            return matches
+
+    def __len__(self):
+        with self._lock:
+            return len(self._slot_of)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"leads": len(self._slot_of), "nnz": self._rows.size, "dead_nnz": self._dead_nnz}
+
+
+_index = SimilarLeadIndex()
+
+
+def get_index() -> SimilarLeadIndex:
+    """Process-wide index shared by all sessions."""
+    return _index
@@ -0,0 +1,65 @@
+"""Local latency-injecting stand-ins for every backend dashboard.py talks to.
+
+Supabase (PostgREST subset over ``bookings``, ``email_interactions`` and
+``ai_lead_insights``), OpenAI chat completions (with streaming), a SendGrid
+sink and the agent/ad services are served by one HTTP server, each with its
+own latency distribution, error rate and rate limit (see ``faults``). The
+real client libraries are used unchanged; only their base URLs move.
+
+One environment setting switches a process over:
+
+* ``BACKEND_SIMULATOR=1`` - start a seeded simulator inside this process
+  (``SIMULATOR_ROWS``, ``SIMULATOR_SEED``, ``SIMULATOR_PROFILES``);
+* ``BACKEND_SIMULATOR=http://host:port`` - use one started separately with
+  ``python -m simulator``, e.g. shared by several Streamlit processes.
+
+``activate()`` then points ``SUPABASE_URL``, ``OPENAI_BASE_URL``,
+``SENDGRID_API_HOST`` and both agent service URLs at it, overriding any
+live values so nothing real is called.
+"""
+import logging
+import os
+import threading
+
+ENV_VAR = "BACKEND_SIMULATOR"
+
+_server = None
+_lock = threading.Lock()
+
+
+def _start_local():
+    global _server
+    with _lock:
+        if _server is None:
+            from . import fixtures, server
+
+            seed = int(os.getenv("SIMULATOR_SEED", "0"))
+            tables = fixtures.seed_tables(int(os.getenv("SIMULATOR_ROWS", "500")), seed=seed)
+            _server = server.start(tables=tables, seed=seed)
+            logging.warning(f"Backend simulator running in-process at {_server.url}")
+        return _server.url
+
+
+def activate(environ=None):
+    """Redirect backend settings to the simulator when ``BACKEND_SIMULATOR`` is set.
+
+    Returns the simulator's base URL, or ``None`` when the setting is off.
+    Idempotent: reruns reuse the in-process server.
+    """
+    environ = os.environ if environ is None else environ
+    setting = (environ.get(ENV_VAR) or "").strip()
+    if not setting or setting.lower() in ("0", "false", "no", "off"):
+        return None
+    base_url = setting.rstrip("/") if setting.startswith(("http://", "https://")) else _start_local()
+    environ.update({
+        "SUPABASE_URL": base_url,
+        "SUPABASE_KEY": "simulator",
+        "OPENAI_API_KEY": "simulator",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "SENDGRID_API_KEY": "simulator",
+        "SENDGRID_API_HOST": base_url,
+        "AUTOMOTIVE_AGENT_SERVICE_URL": f"{base_url}/agent",
+        "PERSONALIZED_AD_SERVICE_URL": f"{base_url}/ad",
+    })
+    environ.setdefault("EMAIL_ADDRESS", "simulator@example.com")
+    return base_url
@@ -0,0 +1,39 @@
+"""Run the backend simulator as its own process.
+
+    python -m simulator --port 8787 --rows 5000 --profiles profiles.json
+    BACKEND_SIMULATOR=http://127.0.0.1:8787 streamlit run dashboard.py
+"""
+import argparse
+import logging
+import time
+
+from . import faults, fixtures, server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve simulated Supabase/OpenAI/SendGrid/agent backends.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--rows", type=int, default=500, help="Seeded bookings.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=30, help="Spread bookings over this many past days.")
+    parser.add_argument("--profiles", help="JSON (inline or a file path) overriding the default service profiles; "
+                                           "defaults to SIMULATOR_PROFILES.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    sim = server.start(
+        host=args.host, port=args.port, tables=fixtures.seed_tables(args.rows, seed=args.seed, days=args.days),
+        profiles=faults.load_profiles(args.profiles), seed=args.seed,
+    )
+    logging.info(f"Backend simulator listening on {sim.url} (set BACKEND_SIMULATOR={sim.url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sim.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
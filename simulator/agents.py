@@ -0,0 +1,111 @@
+"""Stand-ins for the automotive agent service and the personalized ad service.
+
+Answers are computed from the simulator's tables, so the dashboard renders
+real-looking results and the batch endpoints leave the same traces (status
+changes, ``email_interactions`` rows) the live agents would.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+CLOSED_STATUSES = ("Lost", "Converted")
+
+
+def _in_range(db, start_date=None, end_date=None):
+    query = db.from_("bookings").select("*").is_("merged_into", "null")
+    if start_date:
+        query = query.gte("booking_date", start_date)
+    if end_date:
+        query = query.lte("booking_date", end_date)
+    return query.execute().data
+
+
+def _log_sends(db, request_ids, event_type):
+    now = datetime.now(timezone.utc).isoformat()
+    if request_ids:
+        db.from_("email_interactions").insert(
+            [{"request_id": rid, "event_type": event_type, "timestamp": now} for rid in request_ids]
+        ).execute()
+
+
+def analyze_query(db, body):
+    """``/analyze-query``: the handful of question shapes the dashboard suggests."""
+    text = (body.get("query_text") or "").lower()
+    rows = _in_range(db, body.get("start_date"), body.get("end_date"))
+    if "call" in text:
+        open_rows = [r for r in rows if r.get("action_status") not in CLOSED_STATUSES]
+        open_rows.sort(key=lambda r: (r.get("numeric_lead_score") or 0, r.get("booking_timestamp") or ""), reverse=True)
+        ranked = [
+            {
+                "Lead": r.get("full_name"), "Vehicle": r.get("vehicle"), "Status": r.get("action_status"),
+                "LeadScore": r.get("numeric_lead_score"), "Reason": f"{r.get('lead_score')} lead, {r.get('time_frame')}",
+                "RequestID": r.get("request_id"),
+            }
+            for r in open_rows[:10]
+        ]
+        return {"result_type": "RANK", "result_message": f"Top {len(ranked)} leads to call.",
+                "payload": {"rows": ranked, "columns": ["Lead", "Vehicle", "Status", "LeadScore", "Reason"]}}
+    if "distribution" in text:
+        tiers = Counter(r.get("lead_score") for r in rows)
+        labels = ["Hot", "Warm", "Cold"]
+        return {"result_type": "CHART", "result_message": "Lead score distribution.",
+                "payload": {"kind": "bar", "labels": labels, "values": [tiers.get(label, 0) for label in labels]}}
+    if "trend" in text:
+        days = sorted({r.get("booking_date") for r in rows if r.get("booking_date")})
+        series = {
+            status: [sum(1 for r in rows if r.get("booking_date") == d and r.get("action_status") == status) for d in days]
+            for status in CLOSED_STATUSES
+        }
+        return {"result_type": "CHART", "result_message": "Conversions and losses by day.",
+                "payload": {"kind": "line", "x": days, "series": series}}
+    if "hot" in text:
+        hot = sum(1 for r in rows if r.get("lead_score") == "Hot")
+        return {"result_type": "TEXT", "result_message": f"**{hot}** hot leads in this period.", "payload": None}
+    if "total" in text or "how many" in text:
+        return {"result_type": "TEXT", "result_message": f"**{len(rows)}** leads in this period.", "payload": None}
+    return {"result_type": "TEXT", "result_message": "🙅 Not relevant (simulated analytics).", "payload": None}
+
+
+def batch_followup(db, body):
+    lead_ids = list(body.get("lead_ids") or [])
+    _log_sends(db, lead_ids, "email_sent_agent")
+    return {"message": f"Follow-up agent sent {len(lead_ids)} email(s) (simulated).", "emails_sent": len(lead_ids)}
+
+
+def batch_offer(db, body):
+    lead_ids = list(body.get("lead_ids") or [])
+    _log_sends(db, lead_ids, "offer_sent_agent")
+    return {"message": f"Offer agent sent {len(lead_ids)} offer(s) (simulated).", "emails_sent": len(lead_ids)}
+
+
+def mark_testdrives_due(db, body):
+    """Bookings for tomorrow move to 'Test Drive Due' unless already there or closed."""
+    target = (date.today() + timedelta(days=1)).isoformat()
+    found = db.from_("bookings").select("request_id, action_status").eq("booking_date", target).execute().data
+    already = [r["request_id"] for r in found if r.get("action_status") == "Test Drive Due"]
+    due = [r["request_id"] for r in found
+           if r.get("action_status") not in CLOSED_STATUSES and r["request_id"] not in already]
+    if due:
+        db.from_("bookings").update({"action_status": "Test Drive Due"}).in_("request_id", due).execute()
+    _log_sends(db, due, "testdrive_reminder")
+    return {
+        "target_booking_date": target, "found": len(found), "updated_status_to_due": len(due),
+        "emails_sent": len(due), "skipped_already_due": len(already),
+    }
+
+
+def send_ad_email(db, body):
+    request_id = body.get("request_id")
+    _log_sends(db, [request_id] if request_id else [], "ad_email_sent")
+    return {"message": f"Personalized ad sent to {request_id} (simulated).", "request_id": request_id}
+
+
+AGENT_ROUTES = {
+    "/analyze-query": analyze_query,
+    "/trigger-batch-followup-email-agent": batch_followup,
+    "/trigger-batch-offer-agent": batch_offer,
+    "/ops/mark-testdrives-due": mark_testdrives_due,
+}
+
+AD_ROUTES = {
+    "/send-ad-email": send_ad_email,
+}
@@ -0,0 +1,142 @@
+"""Per-service latency, error and rate-limit injection.
+
+Each simulated service has a ``ServiceProfile``. Profiles come from
+``DEFAULT_PROFILES`` overridden by ``SIMULATOR_PROFILES`` (inline JSON or the
+path of a JSON file), service by service and key by key::
+
+    {
+      "openai":    {"latency": {"dist": "lognormal", "median": 0.8, "p95": 3.0},
+                    "token_latency": 0.02, "error_rate": 0.02,
+                    "rate_limit": {"rps": 3, "burst": 6}},
+      "postgrest": {"latency": 0.01},
+      "agent":     {"error_rate": 0.1, "error_status": 502}
+    }
+
+Latency is a number of seconds (fixed) or ``{"dist": "fixed"|"uniform"|"lognormal", ...}``
+with ``value``, ``low``/``high`` or ``median``/``p95``. A request over the
+rate limit is answered 429 with ``Retry-After``; otherwise it fails with
+``error_status`` at ``error_rate`` after its sampled latency.
+"""
+import json
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+SERVICES = ("postgrest", "openai", "sendgrid", "agent", "ad")
+
+DEFAULT_PROFILES = {
+    "postgrest": {"latency": {"dist": "lognormal", "median": 0.03, "p95": 0.12}},
+    "openai": {"latency": {"dist": "lognormal", "median": 0.6, "p95": 2.5}, "token_latency": 0.015},
+    "sendgrid": {"latency": {"dist": "lognormal", "median": 0.15, "p95": 0.5}},
+    "agent": {"latency": {"dist": "lognormal", "median": 0.3, "p95": 1.5}},
+    "ad": {"latency": {"dist": "lognormal", "median": 0.4, "p95": 1.5}},
+}
+
+_Z95 = 1.6449
+
+
+class Latency:
+    def __init__(self, dist="fixed", value=0.0, low=0.0, high=0.0, median=0.0, p95=None):
+        if dist not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"unknown latency distribution {dist!r}")
+        self.dist = dist
+        self.value, self.low, self.high, self.median = float(value), float(low), float(high), float(median)
+        p95 = float(p95) if p95 is not None else self.median
+        self.sigma = math.log(p95 / self.median) / _Z95 if self.median > 0 and p95 > self.median else 0.0
+
+    @classmethod
+    def from_spec(cls, spec):
+        if isinstance(spec, Latency):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls("fixed", value=spec)
+        return cls(**(spec or {}))
+
+    def sample(self, rnd) -> float:
+        if self.dist == "uniform":
+            return rnd.uniform(self.low, self.high)
+        if self.dist == "lognormal":
+            return self.median * math.exp(self.sigma * rnd.gauss(0.0, 1.0)) if self.median > 0 else 0.0
+        return self.value
+
+
+class TokenBucket:
+    """``rps`` requests per second with bursts of up to ``burst``."""
+
+    def __init__(self, rps, burst=None):
+        self.rps = float(rps)
+        self.burst = float(burst if burst is not None else max(1.0, rps))
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """0.0 if a request may go ahead, else the seconds until one may."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rps)
+            self._stamp = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rps
+
+
+@dataclass
+class ServiceProfile:
+    latency: Latency
+    error_rate: float = 0.0
+    error_status: int = 503
+    rate_limit: Optional[TokenBucket] = None
+    token_latency: float = 0.0  # streaming: pause between chunks
+
+    @classmethod
+    def from_spec(cls, spec):
+        limit = spec.get("rate_limit")
+        return cls(
+            latency=Latency.from_spec(spec.get("latency", 0.0)),
+            error_rate=float(spec.get("error_rate", 0.0)),
+            error_status=int(spec.get("error_status", 503)),
+            rate_limit=TokenBucket(limit["rps"], limit.get("burst")) if limit else None,
+            token_latency=float(spec.get("token_latency", 0.0)),
+        )
+
+    def admit(self, rnd):
+        """``(delay seconds, error status or None, retry_after seconds or None)`` for one request."""
+        if self.rate_limit is not None:
+            wait = self.rate_limit.take()
+            if wait > 0:
+                return 0.0, 429, wait
+        delay = max(0.0, self.latency.sample(rnd))
+        if self.error_rate and rnd.random() < self.error_rate:
+            return delay, self.error_status, None
+        return delay, None, None
+
+
+def _read_spec(spec):
+    if spec is None:
+        spec = os.getenv("SIMULATOR_PROFILES", "")
+    if isinstance(spec, dict):
+        return spec
+    spec = spec.strip()
+    if not spec:
+        return {}
+    if not spec.startswith("{"):
+        with open(spec) as fh:
+            spec = fh.read()
+    return json.loads(spec)
+
+
+def load_profiles(spec=None) -> dict:
+    """``{service: ServiceProfile}`` from the defaults overridden by ``spec`` (dict, JSON, path or env)."""
+    overrides = _read_spec(spec)
+    unknown = set(overrides) - set(SERVICES)
+    if unknown:
+        raise ValueError(f"unknown simulator service(s): {', '.join(sorted(unknown))}")
+    return {
+        name: ServiceProfile.from_spec({**DEFAULT_PROFILES[name], **overrides.get(name, {})})
+        for name in SERVICES
+    }
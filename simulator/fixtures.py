@@ -0,0 +1,60 @@
+"""Seed data and canned answers shared by the simulator and ``loadtest.py``."""
+import random
+from datetime import datetime, timedelta, timezone
+
+LOCATIONS = ["New York", "Los Angeles", "Chicago", "Houston", "Miami"]
+VEHICLES = ["AOE Apex", "AOE Volt", "AOE Thunder"]
+CURRENT_VEHICLES = ["Ford SUV", "Toyota Sedan", "Honda Civic", "Tesla Model 3", None]
+TIME_FRAMES = {"0-3-months": 10, "3-6-months": 7, "6-12-months": 5, "exploring-now": 2}
+STATUSES = ["New Lead", "Call Scheduled", "Test Drive Due", "Follow Up Required", "Lost", "Converted"]
+NOTES = [
+    "", "Customer worried about charging at home.", "Loved the test drive, price is the concern.",
+    "Wants a trade-in quote for the Ford SUV.", "Comparing with a Tesla, asked about range.",
+]
+
+
+def seed_tables(n_bookings, seed=0, days=30):
+    """Deterministic bookings, interactions and insights spread over the last ``days`` days."""
+    rnd = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    bookings, interactions, insights = [], [], []
+    for i in range(n_bookings):
+        time_frame = rnd.choice(list(TIME_FRAMES))
+        score = min(15, TIME_FRAMES[time_frame] + rnd.choice([0, 0, 1, 2, 3, 5]))
+        ts = now - timedelta(days=rnd.random() * days)
+        first, last = rnd.choice(["Ana", "Ben", "Chloe", "Dev", "Eli", "Fay"]), rnd.choice(["Park", "Ruiz", "Smith", "Okafor"])
+        request_id = f"lt-{i:06d}"
+        bookings.append({
+            "request_id": request_id, "full_name": f"{first} {last} {i}", "email": f"lead{i}@example.com",
+            "vehicle": rnd.choice(VEHICLES), "booking_date": ts.date().isoformat(),
+            "current_vehicle": rnd.choice(CURRENT_VEHICLES), "location": rnd.choice(LOCATIONS),
+            "time_frame": time_frame, "action_status": rnd.choice(STATUSES), "sales_notes": rnd.choice(NOTES),
+            "lead_score": "Hot" if score >= 10 else ("Warm" if score >= 5 else "Cold"),
+            "numeric_lead_score": score, "booking_timestamp": ts.isoformat(), "updated_at": ts.isoformat(),
+        })
+        for _ in range(rnd.randint(0, 3)):
+            interactions.append({
+                "id": len(interactions) + 1, "request_id": request_id,
+                "event_type": rnd.choice(["opened", "clicked_video", "clicked_pdf", "email_sent_dashboard"]),
+                "timestamp": ts.isoformat(),
+            })
+        if rnd.random() < 0.5:
+            insights.append({
+                "request_id": request_id, "rolling_summary": rnd.choice(NOTES[1:]),
+                "engagement_counters": {"opens_7d": rnd.randint(0, 5), "replies_7d": rnd.randint(0, 2)},
+                "updated_at": ts.isoformat(), "last_engaged_at": ts.isoformat(),
+            })
+    return {"bookings": bookings, "email_interactions": interactions, "ai_lead_insights": insights}
+
+
+def llm_reply(messages):
+    """Plausible answers for the dashboard's prompts, so flows take their normal path."""
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    prompt = (messages or [{}])[-1].get("content", "")
+    if "'RELEVANT'" in system:
+        return "RELEVANT"
+    if "sentiment" in system.lower():
+        return "POSITIVE"
+    if "Subject: " in prompt:
+        return "Subject: Following up on your test drive\n\nHi there,\n\nThanks again for visiting us. (simulated draft)"
+    return "**AI Suggestion:**\n\n- Simulated reply for load testing."
@@ -0,0 +1,337 @@
+"""In-memory tables with the PostgREST subset dashboard.py uses.
+
+The same engine serves two front ends:
+
+* ``InMemorySupabase`` - a drop-in for the supabase-py client object
+  (``from_(...).select(...).eq(...).execute()``), patched in by ``loadtest.py``;
+* ``handle_request`` - the ``/rest/v1/<table>`` HTTP surface, so the real
+  supabase-py client can be pointed at the simulator with ``SUPABASE_URL``.
+
+Supported: ``select`` (column lists, ``count=exact``), ``eq/neq/lt/lte/gt/gte``,
+``is``, ``in``, ``not.``, ``or(...)``/``and(...)``, ``order``, ``limit``,
+``offset``/``range``, insert, upsert (``on_conflict``, merging or ignoring
+duplicates), update and delete.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from postgrest.exceptions import APIError
+
+
+def _literal(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"')
+    return value
+
+
+def _split_top(expr):
+    """Split a PostgREST logic list on commas that are not inside parentheses or quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in expr:
+        if ch == '"' and not current.endswith("\\"):
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _compare(row_value, op, literal):
+    if op == "is":
+        return row_value is None if literal.lower() == "null" else str(row_value).lower() == literal.lower()
+    if op == "in":
+        return row_value is not None and str(row_value) in {_literal(v) for v in _split_top(literal.strip("()"))}
+    if row_value is None:
+        return False
+    if isinstance(row_value, (int, float)) and not isinstance(row_value, bool):
+        try:
+            literal = float(literal)
+        except ValueError:
+            row_value = str(row_value)
+    else:
+        row_value = str(row_value)
+    return {
+        "eq": row_value == literal, "neq": row_value != literal,
+        "lt": row_value < literal, "lte": row_value <= literal,
+        "gt": row_value > literal, "gte": row_value >= literal,
+    }[op]
+
+
+def parse_condition(expr):
+    """Compile one PostgREST condition (``col.op.value``, ``and(...)``, ``or(...)``, ``not.``) to a predicate."""
+    expr = expr.strip()
+    for logic, combine in (("and(", all), ("or(", any)):
+        if expr.startswith(logic) and expr.endswith(")"):
+            children = [parse_condition(part) for part in _split_top(expr[len(logic):-1])]
+            return lambda row, c=children, f=combine: f(child(row) for child in c)
+    column, op, literal = expr.split(".", 2)
+    negate = op == "not"
+    if negate:
+        op, literal = literal.split(".", 1)
+    if op != "in":
+        literal = _literal(literal)
+
+    def predicate(row):
+        result = _compare(row.get(column), op, literal)
+        return not result if negate else result
+    return predicate
+
+
+def _sort_key(value):
+    # Nulls last; numbers compare as numbers, everything else as text.
+    if value is None:
+        return (1, 0, "")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, 0, value)
+    return (0, 1, str(value))
+
+
+class _Query:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.orders = []
+        self.columns = None
+        self.count = None
+        self.row_limit = None
+        self.row_offset = 0
+        self.op = "select"
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+
+    def select(self, columns="*", count=None):
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        self.count = count
+        return self
+
+    def _filter(self, column, op, value):
+        self.filters.append(lambda row: _compare(row.get(column), op, value if op == "in" else str(value)))
+        return self
+
+    def eq(self, column, value): return self._filter(column, "eq", value)
+    def neq(self, column, value): return self._filter(column, "neq", value)
+    def lt(self, column, value): return self._filter(column, "lt", value)
+    def lte(self, column, value): return self._filter(column, "lte", value)
+    def gt(self, column, value): return self._filter(column, "gt", value)
+    def gte(self, column, value): return self._filter(column, "gte", value)
+    def is_(self, column, value): return self._filter(column, "is", str(value))
+
+    def in_(self, column, values):
+        return self._filter(column, "in", "(" + ",".join(f'"{v}"' for v in values) + ")")
+
+    def or_(self, expr):
+        self.filters.append(parse_condition(f"or({expr})"))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def range(self, start, end):
+        self.row_offset, self.row_limit = start, end - start + 1
+        return self
+
+    def insert(self, payload, **_):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict=None, ignore_duplicates=False, **_):
+        self.op, self.payload, self.on_conflict = "upsert", payload, on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def execute(self):
+        return self.db.execute(self)
+
+
+class QueryError(APIError):
+    """A PostgREST error response; raised to in-memory callers as supabase-py would."""
+
+    def __init__(self, code, message):
+        super().__init__({"code": code, "message": message, "details": None, "hint": None})
+
+
+class InMemorySupabase:
+    """Enough of the supabase-py client for dashboard.py, with per-call latency."""
+
+    PRIMARY_KEYS = {"bookings": "request_id", "ai_lead_insights": "request_id", "email_interactions": "id"}
+    # Columns with a unique constraint (as in the migrations); upserts may only conflict on these
+    UNIQUE_COLUMNS = {"email_interactions": ("id", "event_id")}
+    # Columns a trigger stamps with now() on every write (as in the migrations)
+    TOUCHED_COLUMNS = {"bookings": "updated_at"}
+
+    def __init__(self, tables=None, latency=0.0):
+        self.tables = tables or {}
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.calls = 0
+        self._next_id = 1 + max((r.get("id", 0) for r in self.tables.get("email_interactions", [])), default=0)
+
+    def from_(self, table):
+        return _Query(self, table)
+
+    table = from_
+
+    def execute(self, query):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls += 1
+            rows = self.tables.setdefault(query.table, [])
+            if query.op in ("insert", "upsert"):
+                return self._write(query, rows)
+            matched = [r for r in rows if all(f(r) for f in query.filters)]
+            if query.op == "update":
+                for row in matched:
+                    row.update(query.payload)
+                    self._touch(query.table, row)
+                return SimpleNamespace(data=[dict(r) for r in matched], count=len(matched))
+            if query.op == "delete":
+                self.tables[query.table] = [r for r in rows if r not in matched]
+                return SimpleNamespace(data=matched, count=len(matched))
+            for column, desc in reversed(query.orders):
+                matched.sort(key=lambda r: _sort_key(r.get(column)), reverse=desc)
+            total = len(matched)
+            matched = matched[query.row_offset:]
+            if query.row_limit is not None:
+                matched = matched[:query.row_limit]
+            data = [
+                {c: r.get(c) for c in query.columns} if query.columns else dict(r)
+                for r in matched
+            ]
+            return SimpleNamespace(data=data, count=total if query.count else None)
+
+    def _write(self, query, rows):
+        payload = query.payload if isinstance(query.payload, list) else [query.payload]
+        key = query.on_conflict or self.PRIMARY_KEYS.get(query.table)
+        unique = self.UNIQUE_COLUMNS.get(query.table, (self.PRIMARY_KEYS.get(query.table),))
+        if query.op == "upsert" and query.on_conflict and query.on_conflict not in unique:
+            raise QueryError(
+                "42P10", "there is no unique or exclusion constraint matching the ON CONFLICT specification"
+            )
+        written = []
+        for item in payload:
+            item = dict(item)
+            if key == "id" and "id" not in item:
+                item["id"] = self._next_id
+                self._next_id += 1
+            existing = next((r for r in rows if key and r.get(key) == item.get(key)), None) if query.op == "upsert" else None
+            if existing is not None and query.ignore_duplicates:
+                continue
+            if existing is not None:
+                existing.update(item)
+                self._touch(query.table, existing)
+                written.append(dict(existing))
+            else:
+                self._touch(query.table, item)
+                rows.append(item)
+                written.append(dict(item))
+        return SimpleNamespace(data=written, count=len(written))
+
+    def _touch(self, table, row):
+        column = self.TOUCHED_COLUMNS.get(table)
+        if column:
+            row[column] = datetime.now(timezone.utc).isoformat()
+
+
+# --- HTTP surface ---
+
+def _prefer(header):
+    """``Prefer: return=representation,count=exact`` -> ``{"return": ..., "count": ...}``."""
+    prefs = {}
+    for part in (header or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            prefs[name] = value
+    return prefs
+
+
+def build_query(db, method, table, params, body, prefer):
+    """Translate one PostgREST request into a ``_Query``; raises ``ValueError`` on anything unsupported."""
+    query = db.from_(table)
+    query.select("*", count=prefer.get("count"))
+    for key, value in params:
+        if key == "select":
+            query.select(value, count=prefer.get("count"))
+        elif key == "order":
+            for part in value.split(","):
+                column, *modifiers = part.split(".")
+                query.order(column, desc="desc" in modifiers)
+        elif key == "limit":
+            query.row_limit = int(value)
+        elif key == "offset":
+            query.row_offset = int(value)
+        elif key in ("or", "and"):
+            query.filters.append(parse_condition(f"{key}{value}"))
+        elif key == "on_conflict":
+            query.on_conflict = value
+        elif key == "columns":
+            continue
+        else:
+            try:
+                query.filters.append(parse_condition(f"{key}.{value}"))
+            except ValueError:
+                raise ValueError(f"unsupported filter {key}={value}")
+    if method == "POST":
+        resolution = prefer.get("resolution", "")
+        query.op = "upsert" if resolution in ("merge-duplicates", "ignore-duplicates") else "insert"
+        query.ignore_duplicates = resolution == "ignore-duplicates"
+        query.payload = body
+    elif method == "PATCH":
+        query.op, query.payload = "update", body
+    elif method == "DELETE":
+        query.op = "delete"
+    elif method != "GET":
+        raise ValueError(f"unsupported method {method}")
+    return query
+
+
+def handle_request(db, method, table, params, headers, body):
+    """Serve ``/rest/v1/<table>``. Returns ``(status, headers, body bytes)``."""
+    prefer = _prefer(headers.get("Prefer"))
+    try:
+        payload = json.loads(body) if body else None
+        query = build_query(db, method, table, params, payload, prefer)
+        result = db.execute(query)
+    except APIError as e:
+        return 400, {"Content-Type": "application/json"}, json.dumps(e.json()).encode("utf-8")
+    except (ValueError, KeyError) as e:
+        error = {"code": "PGRST100", "message": f"Simulator could not run the request: {e}", "details": None, "hint": None}
+        return 400, {"Content-Type": "application/json"}, json.dumps(error).encode("utf-8")
+
+    out_headers = {"Content-Type": "application/json"}
+    if prefer.get("count") and result.count is not None:
+        first = query.row_offset if method == "GET" else 0
+        span = f"{first}-{first + len(result.data) - 1}" if result.data else "*"
+        out_headers["Content-Range"] = f"{span}/{result.count}"
+    if method == "GET":
+        return 200, out_headers, json.dumps(result.data, default=str).encode("utf-8")
+    if prefer.get("return") == "representation":
+        return (201 if method == "POST" else 200), out_headers, json.dumps(result.data, default=str).encode("utf-8")
+    return (201 if method == "POST" else 204), out_headers, b""
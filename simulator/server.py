@@ -0,0 +1,254 @@
+"""One threaded HTTP server hosting every simulated backend, routed by path.
+
+==============================  =========  ======================================
+Path                            Service    Stands in for
+==============================  =========  ======================================
+``/rest/v1/<table>``            postgrest  Supabase (``SUPABASE_URL``)
+``/v1/chat/completions``        openai     OpenAI (``OPENAI_BASE_URL``), ``stream`` supported
+``/v3/mail/send``               sendgrid   SendGrid (``SENDGRID_API_HOST``), a sink
+``/agent/...``                  agent      ``AUTOMOTIVE_AGENT_SERVICE_URL``
+``/ad/...``                     ad         ``PERSONALIZED_AD_SERVICE_URL``
+``/__simulator/...``            -          stats, the mail sink and live profile changes
+==============================  =========  ======================================
+
+Every service request first goes through its ``ServiceProfile`` (rate limit,
+sampled latency, injected errors). Errors use the wire format of the service
+they imitate, so client-side retry and circuit-breaker code takes its normal
+path.
+"""
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from . import agents, faults, fixtures, postgrest
+
+MAIL_SINK_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, db, profiles=None, seed=None):
+        super().__init__(address, _Handler)
+        self.db = db
+        self.profiles = profiles or faults.load_profiles()
+        self.mail = deque(maxlen=MAIL_SINK_SIZE)
+        self.stats = {name: Counter() for name in faults.SERVICES}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def admit(self, service):
+        with self._lock:
+            delay, status, retry_after = self.profiles[service].admit(self._random)
+            counters = self.stats[service]
+            counters["requests"] += 1
+            if status == 429:
+                counters["throttled"] += 1
+            elif status is not None:
+                counters["errors"] += 1
+            counters["latency_ms"] += int(delay * 1000)
+        return delay, status, retry_after
+
+    def record_mail(self, entry):
+        with self._lock:
+            self.mail.append(entry)
+            self.stats["sendgrid"]["messages"] += len(entry["recipients"])
+
+    def set_profiles(self, spec):
+        profiles = faults.load_profiles(spec)
+        with self._lock:
+            self.profiles = profiles
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counters) for name, counters in self.stats.items()}
+
+    def mail_log(self):
+        with self._lock:
+            return list(self.mail)
+
+
+def _error_body(service, status):
+    message = "Simulated rate limit" if status == 429 else f"Simulated {service} failure"
+    if service == "openai":
+        return {"error": {"message": message, "type": "rate_limit_error" if status == 429 else "server_error",
+                          "code": "rate_limit_exceeded" if status == 429 else None}}
+    if service == "postgrest":
+        return {"code": f"SIM{status}", "message": message, "details": None, "hint": None}
+    if service == "sendgrid":
+        return {"errors": [{"message": message, "field": None}]}
+    return {"detail": message}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "BackendSimulator/1.0"
+
+    ROUTES = (
+        (re.compile(r"^/rest/v1/(?P<table>[A-Za-z0-9_]+)$"), "postgrest", "_postgrest"),
+        (re.compile(r"^/v1/chat/completions$"), "openai", "_chat"),
+        (re.compile(r"^/v3/mail/send$"), "sendgrid", "_mail"),
+        (re.compile(r"^/agent(?P<path>/.*)$"), "agent", "_agent"),
+        (re.compile(r"^/ad(?P<path>/.*)$"), "ad", "_ad"),
+        (re.compile(r"^/__simulator/(?P<path>.*)$"), None, "_control"),
+    )
+
+    def log_message(self, fmt, *args):
+        logger.debug("simulator %s", fmt % args)
+
+    def do_GET(self): self._dispatch()
+    def do_POST(self): self._dispatch()
+    def do_PATCH(self): self._dispatch()
+    def do_DELETE(self): self._dispatch()
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        self.params = parse_qsl(url.query, keep_blank_values=True)
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+        for pattern, service, handler in self.ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                break
+        else:
+            return self._json(404, {"detail": f"No simulated route for {url.path}"})
+
+        if service is not None:
+            delay, status, retry_after = self.server.admit(service)
+            if delay:
+                time.sleep(delay)
+            if status is not None:
+                headers = {"Retry-After": str(max(1, math.ceil(retry_after)))} if retry_after else {}
+                return self._json(status, _error_body(service, status), headers)
+        try:
+            getattr(self, handler)(service, **match.groupdict())
+        except Exception as e:
+            logger.error(f"Simulator error on {self.command} {url.path}: {e}", exc_info=True)
+            self._json(500, {"detail": str(e)})
+
+    # --- responses ---
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload, default=str).encode("utf-8"),
+                   {"Content-Type": "application/json", **(headers or {})})
+
+    def _request_json(self):
+        return json.loads(self.body) if self.body else {}
+
+    # --- services ---
+
+    def _postgrest(self, service, table):
+        status, headers, body = postgrest.handle_request(
+            self.server.db, self.command, table, self.params, self.headers, self.body
+        )
+        self._send(status, body, headers)
+
+    def _chat(self, service):
+        request = self._request_json()
+        content = fixtures.llm_reply(request.get("messages") or [])
+        completion_id = f"chatcmpl-sim-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "simulated")
+        created = int(time.time())
+        if not request.get("stream"):
+            prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages") or [])
+            completion_tokens = len(content.split())
+            return self._json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+
+        # Server-sent events, one chunk per word, body delimited by closing the connection.
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        token_latency = self.server.profiles[service].token_latency
+
+        def chunk(delta, finish_reason=None):
+            event = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for piece in re.findall(r"\S+\s*|\s+", content):
+            if token_latency:
+                time.sleep(token_latency)
+            chunk({"content": piece})
+        chunk({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _mail(self, service):
+        message = self._request_json()
+        recipients = [
+            {"to": [t.get("email") for t in p.get("to", [])], "subject": p.get("subject") or message.get("subject")}
+            for p in message.get("personalizations", [])
+        ]
+        self.server.record_mail({
+            "received_at": time.time(), "from": (message.get("from") or {}).get("email"), "recipients": recipients,
+        })
+        self._send(202, b"", {"X-Message-Id": uuid.uuid4().hex})
+
+    def _agent_route(self, routes, path):
+        if self.command == "GET" and path == "/health":
+            return self._json(200, {"status": "ok"})
+        route = routes.get(path)
+        if route is None or self.command != "POST":
+            return self._json(404, {"detail": f"No simulated endpoint {self.command} {path}"})
+        self._json(200, route(self.server.db, self._request_json()))
+
+    def _agent(self, service, path):
+        self._agent_route(agents.AGENT_ROUTES, path)
+
+    def _ad(self, service, path):
+        self._agent_route(agents.AD_ROUTES, path)
+
+    def _control(self, service, path):
+        if path == "stats" and self.command == "GET":
+            return self._json(200, self.server.snapshot())
+        if path == "mail" and self.command == "GET":
+            return self._json(200, self.server.mail_log())
+        if path == "profiles" and self.command == "POST":
+            try:
+                self.server.set_profiles(self._request_json())
+            except (ValueError, TypeError, KeyError) as e:
+                return self._json(400, {"detail": str(e)})
+            return self._json(200, {"status": "ok"})
+        self._json(404, {"detail": f"No simulator control endpoint {self.command} {path}"})
+
+
+def start(host="127.0.0.1", port=0, tables=None, profiles=None, seed=None) -> SimulatorServer:
+    """Serve on a daemon thread and return the server (``port=0`` picks a free port)."""
+    db = postgrest.InMemorySupabase(tables if tables is not None else fixtures.seed_tables(500, seed=seed or 0))
+    server = SimulatorServer((host, port), db, profiles, seed=seed)
+    threading.Thread(target=server.serve_forever, name="backend-simulator", daemon=True).start()
+    return server
@@ -0,0 +1,94 @@
+"""In-process request coalescing ("single flight").
+
+Right after a cache expiry, or when several reps ask the same thing at once,
+every session used to start its own identical backend call: the same
+Supabase read, the same OpenAI completion, the same analytics query.
+``SingleFlight.do(key, fn)`` runs ``fn`` once per key at a time; callers that
+arrive while it is in flight wait for and share its result (or exception)
+instead of issuing their own. Nothing is kept once the call finishes, so
+this never serves stale data; caching stays with ``swr_cache`` /
+``shared_cache``.
+
+``request_key`` normalises a request's identity (dict key order, sets and
+dates do not matter) into a short hash. Groups are per call kind and shared
+by all sessions in the process; across replicas ``shared_cache`` leases do
+the equivalent job.
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+
+
+def _normalise(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted((_normalise(v) for v in value), key=repr)
+    if isinstance(value, dict):
+        return {str(k): _normalise(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalise(v) for v in value]
+    return value
+
+
+def request_key(*parts) -> str:
+    """Stable hash of a request's identity; pass order-insensitive collections as sets."""
+    raw = json.dumps(_normalise(parts), sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._in_flight = {}  # key -> Future of the leader's call
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """Return ``fn()``, or the result of an identical call already in flight."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._in_flight)}
+
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def get_group(name) -> SingleFlight:
+    """Process-wide group per call kind, shared by all sessions."""
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = SingleFlight(name)
+            _groups[name] = group
+        return group
+
+
+def all_stats() -> dict:
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.stats() for name, group in groups.items()}
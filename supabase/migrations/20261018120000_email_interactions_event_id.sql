@@ -0,0 +1,6 @@
+-- Idempotent writes from the dashboard's interaction queue: every event carries a stable
+-- event_id and is upserted with ON CONFLICT (event_id) DO NOTHING, so a replay after a
+-- crash cannot duplicate rows. Rows written elsewhere (the track-email-event function)
+-- leave it NULL, which the unique constraint allows any number of times.
+alter table public.email_interactions
+    add column if not exists event_id text unique;
@@ -0,0 +1,15 @@
+-- Duplicate bookings folded into another lead by the dashboard's merge action point at the
+-- kept booking through merged_into instead of being closed as Lost, so they no longer count
+-- as lost deals. Lead lists, call lists, exports and analytics read only rows where it is NULL.
+alter table public.bookings
+    add column if not exists merged_into text references public.bookings (request_id);
+
+create index if not exists bookings_unmerged_booking_timestamp_idx
+    on public.bookings (booking_timestamp desc)
+    where merged_into is null;
+
+-- Bookings merged before this column existed carry the kept booking in their sales notes.
+update public.bookings
+    set merged_into = substring(sales_notes from '^Merged duplicate of (.+)$')
+    where merged_into is null
+      and sales_notes like 'Merged duplicate of %';
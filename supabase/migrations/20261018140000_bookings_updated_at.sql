@@ -0,0 +1,21 @@
+-- Change marker for the dashboard's freshness probe: every insert and update stamps
+-- updated_at, so "latest updated_at" is an exact signal that also sees in-place edits
+-- (status changes, score bumps from email events), read as one row through the index.
+alter table public.bookings
+    add column if not exists updated_at timestamptz not null default now();
+
+create or replace function public.touch_updated_at() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists bookings_touch_updated_at on public.bookings;
+create trigger bookings_touch_updated_at
+    before update on public.bookings
+    for each row execute function public.touch_updated_at();
+
+create index if not exists bookings_updated_at_idx on public.bookings (updated_at desc);
+create index if not exists ai_lead_insights_updated_at_idx on public.ai_lead_insights (updated_at desc);
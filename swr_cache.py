@@ -0,0 +1,173 @@
+"""Stale-while-revalidate cache for the dashboard's Supabase reads.
+
+With ``st.cache_data(ttl=30)`` the first rerun after expiry paid the full
+Supabase latency inline, and a failed fetch replaced the list with nothing.
+``SWRCache`` instead:
+
+* serves the last good value immediately once it is older than ``ttl`` (or
+  its data version changed) and refreshes it on a background thread;
+* coalesces refreshes, so one key is never fetched twice concurrently;
+* keeps serving the old value when a refresh fails;
+* blocks only on a cold miss, where concurrent callers share the one load.
+
+Values are keyed by the call arguments and tagged with the data version they
+were loaded under, so a version bump from another replica is served stale
+and revalidated rather than forcing a blocking miss. ``invalidate`` drops
+entries outright; use it after this process's own writes so the writer sees
+them on the next rerun.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 256
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at", "version", "refreshing", "loaded", "error")
+
+    def __init__(self):
+        self.value = None
+        self.fetched_at = None
+        self.version = None
+        self.refreshing = False
+        self.loaded = threading.Event()
+        self.error = None
+
+
+class SWRCache:
+    def __init__(self, name, max_entries=DEFAULT_MAX_ENTRIES):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.cold_loads = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def get(self, key, loader, ttl, version=None):
+        """Return the value for ``key``, loading it with ``loader()`` if needed.
+
+        Raises only when there is no previous value to fall back on.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry()
+                entry.refreshing = True
+                self._entries[key] = entry
+                self._evict()
+                owner = True
+            else:
+                self._entries.move_to_end(key)
+                owner = False
+
+        if owner:
+            self.cold_loads += 1
+            return self._load(key, entry, loader, version, raise_errors=True)
+
+        if entry.fetched_at is None:
+            # Another caller is doing the cold load; share its result.
+            entry.loaded.wait()
+            if entry.fetched_at is None:
+                raise RuntimeError(f"{self.name} load failed: {entry.error}")
+            return entry.value
+
+        stale = time.time() - entry.fetched_at >= ttl or (version is not None and entry.version != version)
+        if stale:
+            self.stale_hits += 1
+            self._refresh_in_background(key, entry, loader, version)
+        else:
+            self.hits += 1
+        return entry.value
+
+    def _load(self, key, entry, loader, version, raise_errors):
+        try:
+            value = loader()
+        except Exception as e:
+            entry.error = str(e)
+            with self._lock:
+                entry.refreshing = False
+                if entry.fetched_at is None and self._entries.get(key) is entry:
+                    del self._entries[key]  # nothing good to serve; retry on next call
+            entry.loaded.set()
+            if raise_errors:
+                raise
+            self.refresh_failures += 1
+            logging.warning(f"{self.name} background refresh failed, serving stale data: {e}")
+            return entry.value
+        with self._lock:
+            entry.value = value
+            entry.fetched_at = time.time()
+            entry.version = version
+            entry.error = None
+            entry.refreshing = False
+        entry.loaded.set()
+        return value
+
+    def _refresh_in_background(self, key, entry, loader, version):
+        with self._lock:
+            if entry.refreshing:
+                return
+            entry.refreshing = True
+        self.refreshes += 1
+        threading.Thread(
+            target=self._load, args=(key, entry, loader, version, False),
+            name=f"swr-{self.name}", daemon=True,
+        ).start()
+
+    def age(self, key):
+        """Seconds since ``key`` was last loaded, or None if never loaded."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry.fetched_at is None:
+            return None
+        return time.time() - entry.fetched_at
+
+    def is_refreshing(self, key) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+        return bool(entry and entry.refreshing and entry.fetched_at is not None)
+
+    def last_error(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry.error if entry else None
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "cold_loads": self.cold_loads,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name) -> SWRCache:
+    """Process-wide cache per name, shared by all sessions."""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = SWRCache(name)
+            _caches[name] = cache
+        return cache
@@ -0,0 +1,33 @@
+"""Change detection and TTL adaptation of ``CacheFreshness``."""
+import freshness
+
+
+def test_on_change_runs_for_the_first_probe_and_each_move_only():
+    signatures = iter([("t1",), ("t1",), ("t2",), ("t2",), ("t3",)])
+    seen = []
+    cache = freshness.CacheFreshness("bookings", lambda: next(signatures), default_ttl=30, on_change=seen.append)
+    for _ in range(5):
+        cache.run_probe()
+    assert seen == [("t1",), ("t2",), ("t3",)]
+    assert cache.stats()["changes"] == 2
+
+
+def test_ttl_follows_the_change_rate():
+    cache = freshness.CacheFreshness("bookings", lambda: None, default_ttl=30, min_ttl=5, max_ttl=300)
+    assert cache.observe(("a",), now=0) is None
+    assert cache.observe(("a",), now=100) == 0
+    assert cache.ttl == 300
+    for step in range(1, 30):
+        cache.observe((f"b{step}",), now=100 + step * 2)
+    assert cache.ttl < 10
+
+
+def test_failed_probe_keeps_the_ttl_and_skips_on_change():
+    seen = []
+
+    def probe():
+        raise ConnectionError("supabase down")
+
+    cache = freshness.CacheFreshness("bookings", probe, default_ttl=30, on_change=seen.append)
+    cache.run_probe()
+    assert cache.ttl == 30 and seen == [] and cache.stats()["failures"] == 1
@@ -0,0 +1,83 @@
+"""Interaction queue flushing through ``supabase_sink`` against PostgREST error responses."""
+import json
+import os
+from types import SimpleNamespace
+
+from postgrest.exceptions import APIError
+
+import interaction_queue
+
+
+class FakeTable:
+    """``client.from_(table).upsert(...).execute()`` raising ``error_for(rows)`` when it returns one."""
+
+    def __init__(self, error_for):
+        self.error_for = error_for
+        self.written = []
+        self.calls = 0
+
+    def from_(self, table):
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self._rows = rows
+        return self
+
+    def execute(self):
+        self.calls += 1
+        error = self.error_for(self._rows)
+        if error:
+            raise APIError({"code": error, "message": f"simulated {error}", "details": None, "hint": None})
+        self.written.extend(self._rows)
+        return SimpleNamespace(data=[])
+
+
+def _queue(tmp_path, table):
+    sink = interaction_queue.supabase_sink(table, "email_interactions")
+    return interaction_queue.InteractionQueue(sink, queue_dir=str(tmp_path), start_worker=False)
+
+
+def _events(n):
+    return [{"request_id": f"r{i}", "event_type": "email_sent", "timestamp": "2026-10-18T10:00:00"} for i in range(n)]
+
+
+def test_schema_error_keeps_rows_pending_and_alerts(tmp_path):
+    table = FakeTable(lambda rows: "42P10")  # no unique constraint on event_id
+    queue = _queue(tmp_path, table)
+    queue.append(_events(4))
+
+    assert queue.flush() == 0
+    stats = queue.stats()
+    assert stats["pending"] == 4
+    assert stats["quarantined_total"] == 0
+    assert "42P10" in stats["misconfigured"]
+    assert table.calls == 1  # not bisected
+    assert not os.path.exists(queue.quarantine_path)
+
+    table.error_for = lambda rows: None  # migration applied
+    assert queue.flush() == 4
+    assert queue.stats()["misconfigured"] is None
+    assert len(table.written) == 4
+    assert all(row["event_id"] for row in table.written)
+
+
+def test_missing_column_from_schema_cache_is_not_a_row_rejection(tmp_path):
+    queue = _queue(tmp_path, FakeTable(lambda rows: "PGRST204"))
+    queue.append(_events(2))
+    assert queue.flush() == 0
+    assert queue.stats()["pending"] == 2
+    assert queue.stats()["quarantined_total"] == 0
+
+
+def test_data_error_quarantines_only_the_bad_row(tmp_path):
+    table = FakeTable(lambda rows: "23503" if any(r["request_id"] == "r2" for r in rows) else None)
+    queue = _queue(tmp_path, table)
+    queue.append(_events(5))
+
+    assert queue.flush() == 5
+    stats = queue.stats()
+    assert (stats["flushed_total"], stats["quarantined_total"], stats["pending"]) == (4, 1, 0)
+    assert sorted(r["request_id"] for r in table.written) == ["r0", "r1", "r3", "r4"]
+    with open(queue.quarantine_path, encoding="utf-8") as fh:
+        quarantined = [json.loads(line) for line in fh]
+    assert [q["event"]["request_id"] for q in quarantined] == ["r2"]
@@ -0,0 +1,185 @@
+"""Gap computation, partial hits, eviction and concurrent fetches of ``IntervalCache``."""
+import threading
+import time
+from datetime import date, timedelta
+
+import interval_cache
+
+D = date(2026, 10, 1)
+
+
+def day(n):
+    return D + timedelta(days=n)
+
+
+def _rows(first, last, per_day=2):
+    rows, current = [], first
+    while current <= last:
+        for i in range(per_day):
+            rows.append({
+                "request_id": f"{current.isoformat()}-{i}",
+                "booking_timestamp": f"{current.isoformat()}T1{i}:00:00+00:00",
+                "location": "Chicago" if i % 2 else "Miami",
+            })
+        current += timedelta(days=1)
+    return rows
+
+
+class Source:
+    def __init__(self, per_day=2, delay=0.0):
+        self.per_day = per_day
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, first, last):
+        with self._lock:
+            self.calls.append((first, last))
+        time.sleep(self.delay)
+        return _rows(first, last, self.per_day)
+
+
+def test_missing_intervals_coalesces_absent_and_expired_days():
+    now = 1000.0
+    days = {day(1): now, day(2): now - 100, day(4): now, day(5): now}
+    assert interval_cache.missing_intervals(days, day(0), day(6), ttl=30, now=now) == [
+        (day(0), day(0)), (day(2), day(3)), (day(6), day(6)),
+    ]
+    assert interval_cache.missing_intervals(days, day(4), day(5), ttl=30, now=now) == []
+    assert interval_cache.missing_intervals({}, day(0), day(2), ttl=30, now=now) == [(day(0), day(2))]
+
+
+def test_partial_hit_fetches_only_the_missing_days_and_merges():
+    cache = interval_cache.IntervalCache("test")
+    source = Source()
+    cache.get(day(0), day(4), source, ttl=60)
+    rows = cache.get(day(3), day(7), source, ttl=60)
+    assert source.calls == [(day(0), day(4)), (day(5), day(7))]
+    assert len(rows) == 10
+    timestamps = [r["booking_timestamp"] for r in rows]
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert cache.stats()["partial_hits"] == 1
+
+    miami = cache.get(day(0), day(7), source, ttl=60, match={"location": "Miami"})
+    assert len(miami) == 8 and {r["location"] for r in miami} == {"Miami"}
+    assert len(source.calls) == 2
+
+
+def test_version_change_drops_held_days():
+    cache = interval_cache.IntervalCache("test")
+    source = Source()
+    cache.get(day(0), day(2), source, ttl=60, version=1)
+    cache.get(day(0), day(2), source, ttl=60, version=1)
+    cache.get(day(0), day(2), source, ttl=60, version=2)
+    assert len(source.calls) == 2
+
+
+def test_eviction_keeps_the_range_being_served():
+    cache = interval_cache.IntervalCache("test", max_rows=10)
+    source = Source(per_day=2)
+    cache.get(day(0), day(4), source, ttl=60)
+    rows = cache.get(day(10), day(16), source, ttl=60)  # 14 rows, more than max_rows
+    assert len(rows) == 14
+    assert cache.stats()["days"] == 7  # everything else was evicted
+    cache.get(day(10), day(16), source, ttl=60)
+    assert len(source.calls) == 2
+
+
+def test_eviction_skips_days_of_a_concurrent_request():
+    cache = interval_cache.IntervalCache("test", max_rows=10)
+    calls = []
+
+    def fetch(first, last):
+        calls.append((first, last))
+        if first == day(2):
+            time.sleep(0.3)  # the other request stores and evicts meanwhile
+        return _rows(first, last)
+
+    cache.get(day(1), day(1), fetch, ttl=60)
+    results = {}
+    reader = threading.Thread(target=lambda: results.setdefault("held", cache.get(day(0), day(2), fetch, ttl=60)))
+    reader.start()
+    time.sleep(0.1)
+    results["other"] = cache.get(day(10), day(14), fetch, ttl=60)
+    reader.join(5)
+    assert len(results["held"]) == 6 and len(results["other"]) == 10
+    # day 0 and day 1 were the oldest but belonged to the request in progress, so nothing was refetched
+    assert calls == [(day(1), day(1)), (day(0), day(0)), (day(2), day(2)), (day(10), day(14))]
+
+
+def test_disjoint_ranges_fetch_concurrently():
+    cache = interval_cache.IntervalCache("test")
+    barrier = threading.Barrier(2, timeout=2)
+
+    def fetch(first, last):
+        barrier.wait()  # times out if the two fetches are serialised
+        return _rows(first, last)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda r=r: results.append(cache.get(r[0], r[1], fetch, ttl=60)))
+        for r in [(day(0), day(2)), (day(5), day(7))]
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert sorted(len(r) for r in results) == [6, 6]
+
+
+def test_overlapping_requests_fetch_each_day_once():
+    cache = interval_cache.IntervalCache("test")
+    source = Source(delay=0.2)
+    results = []
+    threads = [
+        threading.Thread(target=lambda r=r: results.append(cache.get(r[0], r[1], source, ttl=60)))
+        for r in [(day(0), day(4)), (day(2), day(7))]
+    ]
+    threads[0].start()
+    time.sleep(0.05)
+    threads[1].start()
+    for t in threads:
+        t.join(5)
+    fetched = sorted(d for first, last in source.calls for d in range((first - D).days, (last - D).days + 1))
+    assert fetched == list(range(8))
+    assert sorted(len(r) for r in results) == [10, 12]
+
+
+def test_failed_fetch_is_retried_by_a_waiting_caller():
+    cache = interval_cache.IntervalCache("test")
+    calls = []
+
+    def flaky(first, last):
+        calls.append((first, last))
+        if len(calls) == 1:
+            time.sleep(0.2)
+            raise ConnectionError("supabase down")
+        return _rows(first, last)
+
+    errors, results = [], []
+
+    def first_caller():
+        try:
+            cache.get(day(0), day(2), flaky, ttl=60)
+        except ConnectionError as e:
+            errors.append(e)
+
+    t = threading.Thread(target=first_caller)
+    t.start()
+    time.sleep(0.05)
+    results.append(cache.get(day(0), day(2), flaky, ttl=60))
+    t.join(5)
+    assert len(errors) == 1 and len(results[0]) == 6
+    assert len(calls) == 2
+
+
+def test_scoped_version_change_drops_only_the_changed_days():
+    cache = interval_cache.IntervalCache("test")
+    source = Source()
+    cache.get(day(0), day(6), source, ttl=60, version=1)
+    changes = lambda old, new: {day(2).isoformat()} if (old, new) == (1, 2) else None
+    cache.get(day(0), day(6), source, ttl=60, version=2, changes=changes)
+    assert source.calls == [(day(0), day(6)), (day(2), day(2))]
+
+    cache.get(day(0), day(6), source, ttl=60, version=3, changes=changes)  # unknown scope
+    assert source.calls[-1] == (day(0), day(6))
@@ -0,0 +1,62 @@
+"""Paging, counting and truncation of lead exports against the PostgREST simulator."""
+import csv
+import io
+
+import pyarrow.parquet as pq
+
+import lead_export
+from simulator.fixtures import seed_tables
+from simulator.postgrest import InMemorySupabase
+
+
+def _supabase(rows=120):
+    return InMemorySupabase(seed_tables(rows, seed=3))
+
+
+def _csv_rows(data):
+    return list(csv.DictReader(io.StringIO(data.decode("utf-8"))))
+
+
+def test_count_matches_the_paged_rows():
+    supabase = _supabase()
+    filters = dict(location="Chicago", tiers=["Hot", "Warm"], statuses=["New Lead", "Call Scheduled", "Follow Up Required"])
+    pages = list(lead_export.iter_lead_pages(supabase, "bookings", page_size=7, **filters))
+    assert len(pages) > 1
+    assert sum(len(p) for p in pages) == lead_export.count_leads(supabase, "bookings", **filters)
+    ids = [r["request_id"] for p in pages for r in p]
+    assert len(ids) == len(set(ids))
+
+
+def test_export_under_the_cap_has_no_marker():
+    supabase = _supabase()
+    total = lead_export.count_leads(supabase, "bookings")
+    data = lead_export.build_export("csv", lead_export.iter_lead_pages(supabase, "bookings", page_size=25), max_rows=total)
+    rows = _csv_rows(data)
+    assert len(rows) == total
+    assert all(r["request_id"] != lead_export.TRUNCATION_MARKER for r in rows)
+
+
+def test_capped_csv_ends_with_truncation_row():
+    supabase = _supabase()
+    data = lead_export.build_export("csv", lead_export.iter_lead_pages(supabase, "bookings", page_size=25), max_rows=60)
+    rows = _csv_rows(data)
+    assert len(rows) == 61
+    assert rows[-1]["request_id"] == lead_export.TRUNCATION_MARKER
+    assert "60" in rows[-1]["full_name"]
+
+
+def test_capped_parquet_ends_with_truncation_row():
+    supabase = _supabase()
+    data = lead_export.build_export("parquet", lead_export.iter_lead_pages(supabase, "bookings", page_size=25), max_rows=50)
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == 51
+    assert table.column("request_id")[-1].as_py() == lead_export.TRUNCATION_MARKER
+
+
+def test_merged_duplicates_are_not_exported():
+    supabase = _supabase(rows=30)
+    merged = [r["request_id"] for r in supabase.tables["bookings"][:4]]
+    supabase.from_("bookings").update({"merged_into": "lt-000029"}).in_("request_id", merged).execute()
+    assert lead_export.count_leads(supabase, "bookings") == 26
+    exported = {r["request_id"] for p in lead_export.iter_lead_pages(supabase, "bookings") for r in p}
+    assert len(exported) == 26 and not exported & set(merged)
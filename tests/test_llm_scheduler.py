@@ -0,0 +1,74 @@
+"""Priority and slot use of ``LLMScheduler`` under saturation and 429 backoff."""
+import threading
+import time
+from types import SimpleNamespace
+
+import llm_scheduler
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("rate limited")
+        self.response = SimpleNamespace(headers={"retry-after": str(retry_after)})
+
+
+def _scheduler(**kwargs):
+    return llm_scheduler.LLMScheduler(max_rpm=100000, max_tpm=10000000, **kwargs)
+
+
+def test_background_work_cannot_take_the_interactive_slots():
+    scheduler = _scheduler(max_concurrency=4, interactive_reserved=2)
+    release = threading.Event()
+    running = []
+
+    def background():
+        running.append(1)
+        release.wait(5)
+
+    futures = [scheduler.submit(background, priority=llm_scheduler.BACKGROUND) for _ in range(10)]
+    time.sleep(0.1)
+    assert len(running) == 2  # only the non-reserved workers
+
+    started = time.monotonic()
+    assert scheduler.run(lambda: "draft", priority=llm_scheduler.INTERACTIVE) == "draft"
+    assert time.monotonic() - started < 1.0
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+
+
+def test_rate_limited_job_does_not_hold_its_worker_during_backoff():
+    scheduler = _scheduler(max_concurrency=1, interactive_reserved=0)
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RateLimited(retry_after=0.5)
+        return "retried"
+
+    first = scheduler.submit(flaky)
+    time.sleep(0.05)
+    started = time.monotonic()
+    assert scheduler.run(lambda: "other") == "other"
+    assert time.monotonic() - started < 0.3  # ran during the 0.5 s backoff on the only worker
+
+    assert first.result(timeout=5) == "retried"
+    assert attempts[1] - attempts[0] >= 0.5
+    assert scheduler.metrics()["retries_429"] == 1
+
+
+def test_interactive_jobs_are_served_before_queued_background_jobs():
+    scheduler = _scheduler(max_concurrency=1, interactive_reserved=0)
+    gate = threading.Event()
+    order = []
+    scheduler.submit(lambda: gate.wait(5), priority=llm_scheduler.BACKGROUND)
+    time.sleep(0.05)
+    later = [scheduler.submit(lambda: order.append("background"), priority=llm_scheduler.BACKGROUND) for _ in range(3)]
+    urgent = scheduler.submit(lambda: order.append("interactive"))
+    gate.set()
+    for future in later + [urgent]:
+        future.result(timeout=5)
+    assert order[0] == "interactive"
@@ -0,0 +1,65 @@
+"""Batch splitting in ``MailPipeline`` with SendGrid's responses faked."""
+import json
+from types import SimpleNamespace
+
+from python_http_client.exceptions import HTTPError
+
+import mail_pipeline
+
+
+def _http_error(status, errors=()):
+    body = json.dumps({"errors": list(errors)}).encode("utf-8")
+    return HTTPError(status, "error", body, {})
+
+
+class FakeSendGrid:
+    def __init__(self, respond):
+        self.respond = respond  # list of recipient addresses -> None (202) or HTTPError
+        self.calls = 0
+
+    def send(self, message):
+        self.calls += 1
+        recipients = [p["to"][0]["email"] for p in message.get()["personalizations"]]
+        error = self.respond(recipients)
+        if error is not None:
+            raise error
+        return SimpleNamespace(status_code=202)
+
+
+def _pipeline(respond):
+    pipeline = mail_pipeline.MailPipeline("SG.test", "sales@example.com")
+    pipeline.client = FakeSendGrid(respond)
+    return pipeline
+
+
+def _emails(n):
+    return [mail_pipeline.OutboundEmail(f"lead{i}@example.com", "Hi", "<p>Hello</p>", f"r{i}") for i in range(n)]
+
+
+def test_bad_key_fails_whole_batch_in_one_call():
+    pipeline = _pipeline(lambda recipients: _http_error(401, [{"message": "The provided authorization grant is invalid"}]))
+    report = pipeline.send(_emails(8))
+    assert pipeline.client.calls == 1
+    assert len(report.failed) == 8
+    assert all(o.status_code == 401 for o in report.outcomes)
+
+
+def test_payload_too_large_is_not_bisected():
+    pipeline = _pipeline(lambda recipients: _http_error(413))
+    report = pipeline.send(_emails(4))
+    assert pipeline.client.calls == 1
+    assert len(report.failed) == 4
+
+
+def test_invalid_recipient_is_isolated():
+    bad = "lead5@example.com"
+
+    def respond(recipients):
+        if bad in recipients:
+            return _http_error(400, [{"message": "Invalid email", "field": "personalizations.0.to.0.email"}])
+        return None
+
+    pipeline = _pipeline(respond)
+    report = pipeline.send(_emails(8))
+    assert [o.email.to for o in report.failed] == [bad]
+    assert len(report.sent) == 7
@@ -0,0 +1,36 @@
+"""Partition planning and merging of ``partitioned_fetch``."""
+from datetime import date, timedelta
+
+import pytest
+
+import partitioned_fetch
+
+D = date(2026, 1, 1)
+LOCATIONS = ["New York", "Los Angeles", "Chicago", "Houston", "Miami", None]
+
+
+@pytest.mark.parametrize("days", [14, 30, 92, 365])
+def test_wide_ranges_stay_within_the_partition_budget(days):
+    last = D + timedelta(days=days - 1)
+    shard_days = partitioned_fetch.shard_days_for(D, last, len(LOCATIONS), 7, max_parts=16)
+    parts = partitioned_fetch.partitions(D, last, LOCATIONS, shard_days)
+    assert len(parts) <= 16
+    for location in LOCATIONS:
+        covered = sorted((p.first_day, p.last_day) for p in parts if p.location == location)
+        assert covered[0][0] == D and covered[-1][1] == last
+        assert all(b[0] == a[1] + timedelta(days=1) for a, b in zip(covered, covered[1:]))
+
+
+def test_short_ranges_keep_the_configured_shard_size():
+    last = D + timedelta(days=13)
+    assert partitioned_fetch.shard_days_for(D, last, len(LOCATIONS), 7, max_parts=16) == 7
+    assert partitioned_fetch.shard_days_for(D, last, len(LOCATIONS), 0, max_parts=16) == 0
+
+
+def test_fetch_all_merges_partitions_newest_first():
+    rows = {
+        "a": [{"ts": "2026-01-05"}, {"ts": "2026-01-02"}],
+        "b": [{"ts": "2026-01-04"}, {"ts": "2026-01-01"}],
+    }
+    merged = partitioned_fetch.fetch_all(["a", "b"], rows.get, sort_key=lambda r: r["ts"])
+    assert [r["ts"] for r in merged] == ["2026-01-05", "2026-01-04", "2026-01-02", "2026-01-01"]
@@ -0,0 +1,86 @@
+"""Background precompute job driven by ``FakeLLMClient`` instead of OpenAI."""
+import time
+
+import precompute
+
+
+def _generator(kind):
+    """Stands in for the dashboard's precompute_offer / precompute_talking_points."""
+    def generate(row, client=None):
+        completion = client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": f"{kind} for {row['request_id']}: {row.get('sales_notes')}"}],
+        )
+        return completion.choices[0].message.content
+    return generate
+
+
+GENERATORS = {kind: _generator(kind) for kind in (precompute.OFFER, precompute.TALKING_POINTS)}
+
+
+def _row(request_id, status="New", score=0, notes="Asked about range", vehicle="EV6"):
+    return {"request_id": request_id, "action_status": status, "numeric_lead_score": score,
+            "sales_notes": notes, "vehicle": vehicle}
+
+
+def _run(rows, client, store, **kwargs):
+    job = precompute.start_background(rows, GENERATORS, client=client, store=store, **kwargs)
+    deadline = time.monotonic() + 10
+    while job.running:
+        assert time.monotonic() < deadline, "precompute job did not finish"
+        time.sleep(0.01)
+    return job
+
+
+def test_only_eligible_kinds_are_generated():
+    rows = [
+        _row("hot", score=13),
+        _row("call", status="Call Scheduled", score=3),
+        _row("hot-call", status="Call Scheduled", score=15),
+        _row("lukewarm", score=12),
+        _row("lost", status="Lost", score=20),
+    ]
+    client, store = precompute.FakeLLMClient(), precompute.PrecomputeStore()
+    job = _run(rows, client, store)
+
+    assert (job.done, job.failed, job.skipped) == (4, 0, 0)
+    assert client.calls == 4
+    generated = {
+        (row["request_id"], kind)
+        for row in rows
+        for kind in (precompute.OFFER, precompute.TALKING_POINTS)
+        if store.get(row["request_id"], kind, precompute.row_fingerprint(row))
+    }
+    assert generated == {
+        ("hot", precompute.OFFER), ("call", precompute.TALKING_POINTS),
+        ("hot-call", precompute.OFFER), ("hot-call", precompute.TALKING_POINTS),
+    }
+
+
+def test_changed_context_invalidates_only_that_lead():
+    rows = [_row("a", score=13), _row("b", score=14)]
+    client, store = precompute.FakeLLMClient(), precompute.PrecomputeStore()
+    _run(rows, client, store)
+    assert client.calls == 2
+
+    job = _run(rows, client, store)
+    assert (job.done, job.skipped) == (0, 2)
+    assert client.calls == 2
+
+    edited = dict(rows[0], sales_notes="Wants a test drive on Saturday")
+    assert store.get("a", precompute.OFFER, precompute.row_fingerprint(edited)) is None
+    job = _run([edited, rows[1]], client, store)
+    assert (job.done, job.skipped) == (1, 1)
+    assert client.calls == 3
+    assert store.get("a", precompute.OFFER, precompute.row_fingerprint(edited))
+    assert store.get("a", precompute.OFFER, precompute.row_fingerprint(rows[0])) is None
+
+
+def test_concurrency_is_bounded_by_max_workers():
+    rows = [_row(f"lead-{i}", score=20) for i in range(12)]
+    client, store = precompute.FakeLLMClient(latency=0.05), precompute.PrecomputeStore()
+    job = _run(rows, client, store, max_workers=3)
+
+    assert job.done == 12
+    assert client.calls == 12
+    assert 1 < client.max_in_flight <= 3
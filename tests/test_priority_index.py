@@ -0,0 +1,99 @@
+"""Ranking and range-limited top-K of the call-next index."""
+import random
+from datetime import date, timedelta
+
+import priority_index
+
+LOCATIONS = ["Chicago", "Miami", "Houston"]
+STATUSES = ["New Lead", "Call Scheduled", "Follow Up Required", "Call Customer (AI)", "Lost", "Converted"]
+D = date(2026, 10, 1)
+
+
+def _bookings(n, seed=0):
+    rnd = random.Random(seed)
+    return [
+        {
+            "request_id": f"r{i:04d}", "full_name": f"Lead {i}", "vehicle": "EV6",
+            "location": rnd.choice(LOCATIONS), "action_status": rnd.choice(STATUSES),
+            "numeric_lead_score": rnd.randint(0, 15),
+            "booking_timestamp": f"{(D + timedelta(days=rnd.randint(0, 29))).isoformat()}T{rnd.randint(10, 23)}:00:00+00:00",
+        }
+        for i in range(n)
+    ]
+
+
+def _expected(rows, k, location=None, start=None, end=None, tiers=None, statuses=None):
+    def keep(r):
+        day = date.fromisoformat(r["booking_timestamp"][:10])
+        return (
+            r["action_status"] not in priority_index.CLOSED_STATUSES
+            and (location is None or r["location"] == location)
+            and (start is None or day >= start) and (end is None or day <= end)
+            and (not tiers or priority_index._tier(r) in tiers)
+            and (not statuses or r["action_status"] in statuses)
+        )
+    return [r["request_id"] for r in sorted(filter(keep, rows), key=priority_index.rank_key)[:k]]
+
+
+def test_status_rules_then_score_then_engagement():
+    index = priority_index.CallIndex()
+    index.apply_bookings([
+        {"request_id": "a", "action_status": "New Lead", "numeric_lead_score": 15, "booking_timestamp": "2026-10-02T10:00:00"},
+        {"request_id": "b", "action_status": "Follow Up Required", "numeric_lead_score": 1, "booking_timestamp": "2026-10-02T10:00:00"},
+        {"request_id": "c", "action_status": "Call Customer (AI)", "numeric_lead_score": 0, "booking_timestamp": "2026-10-01T10:00:00"},
+        {"request_id": "d", "action_status": "New Lead", "numeric_lead_score": 15, "booking_timestamp": "2026-10-01T10:00:00"},
+        {"request_id": "e", "action_status": "Lost", "numeric_lead_score": 15, "booking_timestamp": "2026-10-01T10:00:00"},
+    ])
+    index.apply_insights({"d": {"last_engaged_at": "2026-10-03T09:00:00"}})
+    assert [lead["request_id"] for lead in index.top(10)] == ["c", "b", "d", "a"]
+
+
+def test_range_top_matches_a_full_sort():
+    rows = _bookings(600)
+    index = priority_index.CallIndex()
+    index.apply_bookings(rows)
+    cases = [
+        {},
+        {"location": "Miami"},
+        {"start": D + timedelta(days=3), "end": D + timedelta(days=9)},
+        {"location": "Chicago", "start": D + timedelta(days=10), "end": D + timedelta(days=10)},
+        {"location": "Houston", "start": D, "end": D + timedelta(days=29), "tiers": ["Hot"], "statuses": ["New Lead"]},
+    ]
+    for filters in cases:
+        assert [lead["request_id"] for lead in index.top(5, **filters)] == _expected(rows, 5, **filters), filters
+
+
+def test_patches_move_leads_between_days_and_locations():
+    rows = _bookings(200, seed=1)
+    index = priority_index.CallIndex()
+    index.apply_bookings(rows)
+    moved = [dict(r, location="Miami", booking_timestamp="2026-10-05T12:00:00+00:00",
+                  action_status="Call Customer (AI)") for r in rows[:5]]
+    closed = [dict(r, action_status="Converted") for r in rows[5:10]]
+    index.apply_bookings(moved + closed)
+    current = {r["request_id"]: r for r in rows}
+    current.update({r["request_id"]: r for r in moved + closed})
+    day = date(2026, 10, 5)
+    for filters in [{"location": "Miami", "start": day, "end": day}, {"location": "Chicago"}, {}]:
+        assert [lead["request_id"] for lead in index.top(8, **filters)] == _expected(list(current.values()), 8, **filters)
+
+
+def test_oldest_unseen_leads_are_dropped_from_every_structure():
+    index = priority_index.CallIndex(max_leads=50)
+    index.apply_bookings(_bookings(50, seed=2))
+    fresh = [dict(r, request_id=f"n{i}") for i, r in enumerate(_bookings(30, seed=3))]
+    index.apply_bookings(fresh)
+    assert len(index._leads) == 50
+    seen = {lead["request_id"] for lead in index.top(100, location="Miami", start=D, end=D + timedelta(days=29))}
+    assert seen <= set(index._keys)
+    assert sum(len(keys) for keys in index._buckets.values()) == len(index._order) == len(index)
+
+
+def test_merged_duplicates_leave_the_index_without_closing_them():
+    rows = _bookings(40, seed=4)
+    index = priority_index.CallIndex()
+    index.apply_bookings(rows)
+    open_ids = [r["request_id"] for r in rows if r["action_status"] not in priority_index.CLOSED_STATUSES]
+    index.apply_bookings([{"request_id": rid, "merged_into": "r9999"} for rid in open_ids[:3]])
+    ranked = {lead["request_id"] for lead in index.top(100)}
+    assert ranked == set(open_ids[3:])
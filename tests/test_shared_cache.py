@@ -0,0 +1,111 @@
+"""Versioned namespaces, lease expiry and path handling of the shared cache backends."""
+import threading
+import time
+
+import pytest
+
+import shared_cache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return shared_cache.MemoryCacheBackend()
+    return shared_cache.SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"))
+
+
+def test_invalidate_bumps_only_its_namespace(backend):
+    cache = shared_cache.SharedCache(backend)
+    calls = []
+
+    def compute(tag):
+        def run():
+            calls.append(tag)
+            return {"tag": tag, "n": len(calls)}
+        return run
+
+    first = cache.get_or_compute("bookings", ["2026-10-01"], 60, compute("bookings"))
+    insights = cache.get_or_compute("ai_insights", [], 60, compute("insights"))
+    assert cache.get_or_compute("bookings", ["2026-10-01"], 60, compute("bookings")) == first
+    assert calls == ["bookings", "insights"]
+
+    cache.invalidate("bookings")
+    assert cache.version("bookings") == 1 and cache.version("ai_insights") == 0
+    assert cache.key("bookings", ["2026-10-01"]).startswith("bookings:v1:")
+    assert cache.get_or_compute("bookings", ["2026-10-01"], 60, compute("bookings")) != first
+    assert cache.get_or_compute("ai_insights", [], 60, compute("insights")) == insights
+    assert calls == ["bookings", "insights", "bookings"]
+
+
+def test_lease_expires_and_can_be_taken_again(backend):
+    assert backend.acquire_lease("k", 0.1)
+    assert not backend.acquire_lease("k", 0.1)
+    time.sleep(0.15)
+    assert backend.acquire_lease("k", 0.1)
+    backend.release_lease("k")
+    assert backend.acquire_lease("k", 0.1)
+
+
+def test_claim_window_expires(backend):
+    cache = shared_cache.SharedCache(backend)
+    assert cache.claim("dispatch", ["req-1"], 0.1)
+    assert not cache.claim("dispatch", ["req-1"], 0.1)
+    time.sleep(0.15)
+    assert cache.claim("dispatch", ["req-1"], 0.1)
+    assert cache.stats()["duplicates"] == 1
+
+
+def test_memory_backend_drops_expired_claims():
+    backend = shared_cache.MemoryCacheBackend()
+    cache = shared_cache.SharedCache(backend)
+    for n in range(100):
+        cache.claim("dispatch", [f"req-{n}"], 0.05)
+    time.sleep(0.1)
+    cache.claim("dispatch", ["req-new"], 60)
+    assert len(backend._leases) == 1
+
+
+def test_relative_sqlite_path_resolves_against_app_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(shared_cache, "APP_DIR", str(tmp_path))
+    monkeypatch.chdir("/")
+    backend = shared_cache.SQLiteCacheBackend(".cache/shared.sqlite3")
+    assert backend.path == str(tmp_path / ".cache" / "shared.sqlite3")
+    assert (tmp_path / ".cache" / "shared.sqlite3").exists()
+
+
+def test_unwritable_sqlite_path_fails_loudly(tmp_path):
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    with pytest.raises(shared_cache.CacheConfigError):
+        shared_cache.backend_from_url(f"sqlite:///{blocker / 'cache.sqlite3'}")
+
+
+def test_one_change_is_advanced_by_exactly_one_replica(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    replicas = [shared_cache.SharedCache(shared_cache.SQLiteCacheBackend(path)) for _ in range(4)]
+    assert replicas[0].advance_marker("bookings", ["2026-10-18T10:00:00+00:00"]) is None  # first publication
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda c=c: results.append(c.advance_marker("bookings", ["2026-10-18T10:05:00+00:00"])))
+        for c in replicas
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert [r for r in results if r is not None] == [["2026-10-18T10:00:00+00:00"]]
+
+    # A replica whose probe lags behind never moves the marker back
+    assert replicas[1].advance_marker("bookings", ["2026-10-18T10:00:00+00:00"]) is None
+    assert replicas[2].backend.get_marker("bookings") == ["2026-10-18T10:05:00+00:00"]
+
+
+def test_changed_since_unions_scoped_bumps(backend):
+    cache = shared_cache.SharedCache(backend)
+    cache.invalidate("bookings", changed={"2026-10-01"})
+    cache.invalidate("bookings", changed={"2026-10-03", "2026-10-01"})
+    assert cache.changed_since("bookings", 0, 2) == {"2026-10-01", "2026-10-03"}
+    assert cache.changed_since("bookings", 1, 2) == {"2026-10-03", "2026-10-01"}
+    cache.invalidate("bookings")  # unscoped: everything may have changed
+    assert cache.changed_since("bookings", 1, 3) is None
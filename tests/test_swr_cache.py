@@ -0,0 +1,92 @@
+"""Stale-while-revalidate behaviour of ``SWRCache``."""
+import threading
+import time
+
+import pytest
+
+import swr_cache
+
+
+def _wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_stale_hit_serves_old_value_and_refreshes_once():
+    cache = swr_cache.SWRCache("test")
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(5)
+        return len(calls)
+
+    assert cache.get("k", loader, ttl=0.05) == 1
+    time.sleep(0.1)
+    # Every caller during the refresh gets the stale value without blocking.
+    assert [cache.get("k", loader, ttl=0.05) for _ in range(5)] == [1] * 5
+    assert cache.is_refreshing("k")
+    release.set()
+    _wait_until(lambda: not cache.is_refreshing("k"))
+    assert len(calls) == 2
+    assert cache.get("k", loader, ttl=60) == 2
+    assert cache.stats()["refreshes"] == 1 and cache.stats()["stale_hits"] == 5
+
+
+def test_version_bump_forces_refresh_before_ttl():
+    cache = swr_cache.SWRCache("test")
+    release = threading.Event()
+    values = iter(["v1 data", "v2 data"])
+
+    def loader():
+        value = next(values)
+        if value == "v2 data":
+            release.wait(5)
+        return value
+
+    assert cache.get("k", loader, ttl=60, version=1) == "v1 data"
+    assert cache.get("k", loader, ttl=60, version=1) == "v1 data"
+    assert cache.stats()["refreshes"] == 0
+
+    assert cache.get("k", loader, ttl=60, version=2) == "v1 data"  # served stale
+    release.set()
+    _wait_until(lambda: not cache.is_refreshing("k"))
+    assert cache.get("k", loader, ttl=60, version=2) == "v2 data"
+    assert cache.stats()["refreshes"] == 1
+
+
+def test_failed_refresh_keeps_serving_stale_value():
+    cache = swr_cache.SWRCache("test")
+    fail = threading.Event()
+
+    def loader():
+        if fail.is_set():
+            raise ConnectionError("supabase down")
+        return ["lead-1"]
+
+    assert cache.get("k", loader, ttl=0.05) == ["lead-1"]
+    fail.set()
+    time.sleep(0.1)
+    assert cache.get("k", loader, ttl=0.05) == ["lead-1"]
+    _wait_until(lambda: cache.stats()["refresh_failures"] == 1)
+    assert cache.get("k", loader, ttl=0.05) == ["lead-1"]
+    assert "supabase down" in cache.last_error("k")
+
+
+def test_cold_load_failure_raises_and_is_retried():
+    cache = swr_cache.SWRCache("test")
+    attempts = []
+
+    def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("supabase down")
+        return "ok"
+
+    with pytest.raises(ConnectionError):
+        cache.get("k", loader, ttl=60)
+    assert cache.get("k", loader, ttl=60) == "ok"
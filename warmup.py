@@ -0,0 +1,232 @@
+"""Cache warm-up and predictive prefetch of the views reps open most.
+
+The first rep after a restart, or the first one after midnight when the
+default "today" view gets new dates, used to pay for every cold cache: the
+bookings for the view, the insights for those leads and each analytics
+answer. ``Warmer`` fetches those ahead of time on a background thread, once
+when the process starts serving and then every ``WARMUP_INTERVAL_SECONDS``:
+
+* configured views - by default the sidebar's default range (today to
+  tomorrow) for "All Locations" and for every location;
+* learned views - the ones sessions actually switched to recently, counted
+  by ``UsageTracker`` with exponential decay so last week's habits fade;
+* analytics questions - the standard intents plus the most asked ones.
+
+Views are stored as day offsets from today, so a learned "last 7 days"
+stays the last seven days tomorrow. After the first cycle, a cycle is
+skipped when no session was active since the previous one, so an idle
+process does not keep paying for LLM-backed analytics answers around the
+clock. The warmer only calls the loaders it is given; nothing here imports
+Streamlit. Settings:
+
+``WARMUP_ENABLED`` (default 1), ``WARMUP_INTERVAL_SECONDS`` (600, 0 = once),
+``WARMUP_VIEWS`` (JSON ``[[location, start_offset, end_offset], ...]``),
+``WARMUP_ANALYTICS`` (JSON list of questions), ``WARMUP_LEARNED`` (how many
+learned views/questions to add, default 5).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+DEFAULT_INTERVAL_SECONDS = 600
+INTERVAL_SECONDS = float(os.getenv("WARMUP_INTERVAL_SECONDS", str(DEFAULT_INTERVAL_SECONDS)))
+DEFAULT_LEARNED = 5
+DEFAULT_VIEW_OFFSETS = (0, 1)  # the sidebar defaults: today .. tomorrow
+STANDARD_QUESTIONS = (
+    "total leads", "hot leads", "converted leads", "lead score distribution",
+    "trend conversions", "leads by status", "who should I call",
+)
+USAGE_DECAY = 0.8  # applied to usage counts once per warm-up cycle
+MAX_TRACKED = 200
+
+
+def normalize_question(question) -> str:
+    """Analytics questions compare case- and whitespace-insensitively."""
+    return " ".join((question or "").lower().split())
+
+
+class View(namedtuple("View", "location start_offset end_offset")):
+    """A sidebar filter as day offsets from today."""
+
+    @classmethod
+    def from_dates(cls, location, start, end, today=None):
+        today = today or date.today()
+        return cls(location, (start - today).days, (end - today).days)
+
+    def dates(self, today=None):
+        today = today or date.today()
+        return today + timedelta(days=self.start_offset), today + timedelta(days=self.end_offset)
+
+
+class UsageTracker:
+    """Decayed counts of the views and analytics questions sessions use."""
+
+    def __init__(self, decay=USAGE_DECAY, max_tracked=MAX_TRACKED):
+        self.decay = decay
+        self.max_tracked = max_tracked
+        self._lock = threading.Lock()
+        self._counts = {"view": {}, "question": {}}
+        self.last_active = None  # time.time() of the latest session rerun
+
+    def touch(self):
+        """Note that a session is active; idle periods skip warm-up cycles."""
+        self.last_active = time.time()
+
+    def record(self, kind, key, weight=1.0):
+        with self._lock:
+            counts = self._counts[kind]
+            counts[key] = counts.get(key, 0.0) + weight
+            if len(counts) > self.max_tracked:
+                del counts[min(counts, key=counts.get)]
+
+    def record_view(self, location, start, end):
+        self.record("view", View.from_dates(location, start, end))
+
+    def record_question(self, question, start, end):
+        question = normalize_question(question)
+        if question:
+            view = View.from_dates(None, start, end)
+            self.record("question", (question, view.start_offset, view.end_offset))
+
+    def top(self, kind, n):
+        with self._lock:
+            counts = self._counts[kind]
+            return sorted(counts, key=counts.get, reverse=True)[:n]
+
+    def age(self):
+        """Decay every count; entries that fade out are dropped."""
+        with self._lock:
+            for counts in self._counts.values():
+                for key in list(counts):
+                    counts[key] *= self.decay
+                    if counts[key] < 0.05:
+                        del counts[key]
+
+
+def _json_setting(name, default):
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        return json.loads(raw)
+    except ValueError:
+        logging.error(f"Ignoring invalid {name}: {raw!r}")
+        return default
+
+
+class Warmer:
+    def __init__(self, warm_view, warm_question, locations, usage,
+                 views=None, questions=None, interval=DEFAULT_INTERVAL_SECONDS, learned=DEFAULT_LEARNED):
+        """``warm_view(location, start, end)`` and ``warm_question(question, start, end)`` load and cache.
+
+        ``warm_question`` may be None when there is no analytics service.
+        """
+        self.warm_view = warm_view
+        self.warm_question = warm_question
+        self.usage = usage
+        if views is None:
+            views = [View(location, *DEFAULT_VIEW_OFFSETS) for location in locations]
+        self.views = [View(*v) for v in views]
+        self.questions = list(STANDARD_QUESTIONS if questions is None else questions)
+        self.interval = interval
+        self.learned = learned
+        self.running = False
+        self.last_run = None  # dict report of the last cycle
+        self.skipped = 0  # cycles skipped because no session was active
+
+    def plan(self):
+        """(views, questions) for the next cycle, configured first, learned ones appended."""
+        views = list(dict.fromkeys(self.views + self.usage.top("view", self.learned)))
+        if self.warm_question is None:
+            return views, []
+        questions = [(normalize_question(q),) + DEFAULT_VIEW_OFFSETS for q in self.questions]
+        questions = list(dict.fromkeys(questions + self.usage.top("question", self.learned)))
+        return views, questions
+
+    def run_once(self) -> dict:
+        started = time.monotonic()
+        today = date.today()
+        views, questions = self.plan()
+        report = {"views": 0, "questions": 0, "failed": 0}
+        for view in views:
+            try:
+                self.warm_view(view.location, *view.dates(today))
+                report["views"] += 1
+            except Exception as e:
+                report["failed"] += 1
+                logging.warning(f"Warm-up of {view} failed: {e}")
+        for question, start_offset, end_offset in questions:
+            try:
+                self.warm_question(question, *View(None, start_offset, end_offset).dates(today))
+                report["questions"] += 1
+            except Exception as e:
+                report["failed"] += 1
+                logging.warning(f"Warm-up of analytics question {question!r} failed: {e}")
+        self.usage.age()
+        report["seconds"] = time.monotonic() - started
+        report["finished_at"] = time.time()
+        self.last_run = report
+        logging.info(
+            f"Warm-up: {report['views']} view(s), {report['questions']} question(s), "
+            f"{report['failed']} failed ({report['seconds']:.1f}s)"
+        )
+        return report
+
+    def idle_since(self, started) -> bool:
+        last_active = self.usage.last_active
+        return last_active is None or last_active < started
+
+    def _loop(self):
+        previous_start = None
+        while True:
+            started = time.time()
+            try:
+                if previous_start is not None and self.idle_since(previous_start):
+                    self.skipped += 1
+                    logging.info("Warm-up skipped: no session activity since the last cycle.")
+                else:
+                    self.run_once()
+            except Exception as e:
+                logging.error(f"Warm-up cycle failed: {e}", exc_info=True)
+            previous_start = started
+            if self.interval <= 0:
+                break
+            time.sleep(self.interval)
+        self.running = False
+
+
+_usage = UsageTracker()
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def get_usage() -> UsageTracker:
+    """Process-wide usage counts fed by every session."""
+    return _usage
+
+
+def current():
+    return _warmer
+
+
+def start(warm_view, warm_question, locations):
+    """Start the process's warm-up thread (once) and return its ``Warmer``; None when disabled."""
+    global _warmer
+    if os.getenv("WARMUP_ENABLED", "1").lower() in ("0", "false", "no", "off"):
+        return None
+    with _warmer_lock:
+        if _warmer is None:
+            _warmer = Warmer(
+                warm_view, warm_question, locations, _usage,
+                views=_json_setting("WARMUP_VIEWS", None),
+                questions=_json_setting("WARMUP_ANALYTICS", None),
+                interval=INTERVAL_SECONDS,
+                learned=int(os.getenv("WARMUP_LEARNED", str(DEFAULT_LEARNED))),
+            )
+            _warmer.running = True
+            threading.Thread(target=_warmer._loop, name="warmup", daemon=True).start()
+        return _warmer